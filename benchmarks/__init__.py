@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+Benchmarks
+**********
+
+Benchmarks for DjangoPages hot paths.  Run a benchmark from the project directory as a module, ex.
+
+    python -m benchmarks.bench_render
+
+Each benchmark compares the current implementation against the one it replaced and checks that both
+produce the same output.
+
+10/17/26 - Initial creation
+
+"""
+
+from __future__ import unicode_literals, print_function
+import logging
+import os
+import time
+
+log = logging.getLogger(__name__)
+
+__author__ = 'rbell01824'
+__date__ = '10/17/26'
+__copyright__ = "Copyright 2014, Richard Bell"
+__credits__ = ['rbell01824']
+__license__ = 'All rights reserved'
+__version__ = '0.1'
+__maintainer__ = 'rbell01824'
+__email__ = 'rbell01824@gmail.com'
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "djangopages_demo.settings")
+
+from django.conf import settings
+settings.DEBUG                          # force settings, and so logging, to be configured
+logging.disable(logging.DEBUG)          # widget debug logging would swamp the timings
+
+
+def bench(label, setup, func, repeat=5):
+    """ Time func(setup()) repeat times and print the best time.  Setup is not timed.
+
+    .. sourcecode:: python
+
+        bench('render', build_tree, render_tree)
+
+    :param label: label for the output line
+    :type label: unicode
+    :param setup: callable returning the argument for func
+    :type setup: callable
+    :param func: callable to time
+    :type func: callable
+    :param repeat: number of timed runs
+    :type repeat: int
+    :return: best time in seconds and the result of the last run
+    :rtype: tuple
+    """
+    best = None
+    result = None
+    for _ in range(repeat):
+        arg = setup()
+        start = time.time()
+        result = func(arg)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print('{:<50} {:>10.4f}s'.format(label, best))
+    return best, result
+
+
+def report_speedup(old, new):
+    """ Print the speedup of new over old. """
+    print('{:<50} {:>10.1f}x'.format('speedup', old / new if new else float('inf')))
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+Graph benchmark
+***************
+
+Renders 30 GraphCK graphs with the direct chartkick emitter and with the chartkick template tag path it
+replaced.  The direct emitter also serializes the data as is, rather than having the render engine walk it.
+
+    python -m benchmarks.bench_graph
+
+Chartkick numbers its charts in render order, so chart ids are normalized before the outputs are compared.
+
+10/17/26 - Initial creation
+
+"""
+
+from __future__ import unicode_literals, print_function
+import logging
+
+log = logging.getLogger(__name__)
+
+__author__ = 'rbell01824'
+__date__ = '10/17/26'
+__copyright__ = "Copyright 2014, Richard Bell"
+__credits__ = ['rbell01824']
+__license__ = 'All rights reserved'
+__version__ = '0.1'
+__maintainer__ = 'rbell01824'
+__email__ = 'rbell01824@gmail.com'
+
+import re
+import sys
+
+from django.template import Context, Template
+
+from benchmarks import bench, report_speedup
+from djangopages.widgets.graph import GraphCK
+from djangopages.widgets.widgets import DWidget
+
+GRAPHS = 30
+POINTS = 50
+
+
+class LegacyGraphCK(GraphCK):
+    """ GraphCK as it was: the render engine walks the data, generate builds and renders a chartkick template
+    per graph.
+    """
+    render = DWidget.render
+
+    def generate(self):
+        graph_type, data, options = self.args
+        template = '{{% {chart} %}}'
+        if options:
+            options = self.set_options(dict(options))
+            chart = '{gtype}_chart data with {options}'.format(gtype=graph_type, options=options)
+        else:
+            chart = '{gtype}_chart data'.format(gtype=graph_type)
+        t = Template('{% load chartkick %}' + template.format(chart=chart))
+        return t.render(Context({'data': data}))
+
+
+def graphs(cls=GraphCK):
+    rtn = []
+    for n in range(GRAPHS):
+        graph_type = ('line', 'pie', 'column', 'bar', 'area')[n % 5]
+        data = [['2014-05-{:02d}'.format(d % 28 + 1), (n * d) % 97] for d in range(POINTS)]
+        rtn.append(cls(graph_type, data, options={'height': '400px',
+                                                  'title.text': 'Graph {}'.format(n),
+                                                  'subtitle.text': 'Syslog records by type'}))
+    return rtn
+
+
+def render(widgets):
+    return re.sub(r'chart-\d+', 'chart-n', ''.join(w.render() for w in widgets))
+
+
+def main():
+    print('Render {} graphs of {} points'.format(GRAPHS, POINTS))
+    old, old_out = bench('chartkick template per graph', lambda: graphs(LegacyGraphCK), render)
+    new, new_out = bench('direct emitter', graphs, render)
+    assert old_out == new_out, 'direct emitter output differs from template output'
+    report_speedup(old, new)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
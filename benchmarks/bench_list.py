@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+List rendering benchmark
+************************
+
+Renders Text and LI widgets over 5k element lists with the vectorized list path and with the widget per
+element path it replaced.
+
+    python -m benchmarks.bench_list
+
+10/17/26 - Initial creation
+
+"""
+
+from __future__ import unicode_literals, print_function
+import logging
+
+log = logging.getLogger(__name__)
+
+__author__ = 'rbell01824'
+__date__ = '10/17/26'
+__copyright__ = "Copyright 2014, Richard Bell"
+__credits__ = ['rbell01824']
+__license__ = 'All rights reserved'
+__version__ = '0.1'
+__maintainer__ = 'rbell01824'
+__email__ = 'rbell01824@gmail.com'
+
+import random
+import sys
+
+import loremipsum
+
+from benchmarks import bench, report_speedup
+from djangopages.widgets.texthtml import Text, LI
+
+ITEMS = 5000
+
+
+def legacy_generate(widget):
+    """ The DWidget.generate list path replaced by DTemplate.fill_each: one widget per element. """
+    content_name, template, xargs = widget.args
+    rtn = ''
+    content = xargs.pop(content_name)
+    for c in content:
+        xargs[content_name] = c
+        rtn += widget.__class__(**xargs).render()
+    return rtn
+
+
+def legacy_li(widget):
+    """ The LI.generate list path replaced by DTemplate.fill_each. """
+    line_count, para, classes, style = widget.args
+    rtn = ''
+    for lc in line_count:
+        rtn += LI(lc, para, classes, style)
+    return rtn
+
+
+def text_list():
+    return Text(['item {}'.format(i) for i in range(ITEMS)], para=True, classes='item')
+
+
+def li_list():
+    random.seed(0)
+    return LI([1] * ITEMS)
+
+
+def main():
+    print('Render {} element lists'.format(ITEMS))
+    old, old_out = bench('Text, widget per element', text_list, legacy_generate)
+    new, new_out = bench('Text, vectorized', text_list, lambda w: w.render())
+    assert old_out == new_out, 'vectorized output differs from widget per element output'
+    report_speedup(old, new)
+
+    # loremipsum draws from random, so both paths are seeded the same way and the sentence cost is
+    # reported separately
+    bench('LI, loremipsum sentences only', lambda: random.seed(0),
+          lambda _: [loremipsum.get_sentences(1) for _ in range(ITEMS)])
+    old, old_out = bench('LI, widget per element', li_list, legacy_li)
+    new, new_out = bench('LI, vectorized', li_list, lambda w: w.render())
+    assert old_out == new_out, 'vectorized output differs from widget per element output'
+    report_speedup(old, new)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+Parallel render benchmark
+*************************
+
+Renders a page of 24 graph panels and 24 markdown panels sequentially and with parallel=True.  Each graph's
+data comes from a Data query that waits LATENCY seconds, standing in for a database round trip.  The page is
+also rendered without latency: Python threads overlap waiting, not computation, so there the parallel render
+only adds overhead.
+
+    python -m benchmarks.bench_parallel
+
+Chartkick numbers its charts in render order, so chart ids are normalized before the outputs are compared.
+
+10/17/26 - Initial creation
+
+"""
+
+from __future__ import unicode_literals, print_function
+import logging
+
+log = logging.getLogger(__name__)
+
+__author__ = 'rbell01824'
+__date__ = '10/17/26'
+__copyright__ = "Copyright 2014, Richard Bell"
+__credits__ = ['rbell01824']
+__license__ = 'All rights reserved'
+__version__ = '0.1'
+__maintainer__ = 'rbell01824'
+__email__ = 'rbell01824@gmail.com'
+
+import re
+import sys
+import time
+
+from benchmarks import bench, report_speedup
+from djangopages.widgets.bootstrap import Panel
+from djangopages.widgets.data import Data
+from djangopages.widgets.graph import GraphCK
+from djangopages.widgets.layout import WList
+from djangopages.widgets.texthtml import Markdown
+from djangopages.widgets.widgets import render_budget
+
+GRAPHS = 24
+LATENCY = 0.02
+BUDGET = 8
+MARKDOWN = '### Analysis {}\n\n' + 'Here is where the *analysis* can go. ' * 40 + '\n\n* one\n* two\n'
+
+
+def query(n, latency):
+    """ Stand in for a syslog count by type query. """
+    time.sleep(latency)
+    return [['type {}'.format(t), (n * 7 + t * 13) % 50] for t in range(6)]
+
+
+def page(parallel, latency=LATENCY):
+    panels = []
+    for n in range(GRAPHS):
+        panels.append(Panel(GraphCK('column', Data(query, n, latency), options={'height': '400px'}),
+                            heading='Graph {}'.format(n)))
+        panels.append(Panel(Markdown(MARKDOWN.format(n))))
+    return WList(*panels, parallel=parallel)
+
+
+def render(widget):
+    with render_budget(BUDGET):
+        return re.sub(r'chart-\d+', 'chart-n', widget.render())
+
+
+def main():
+    print('Render {} graph and {} markdown panels, budget {}'.format(GRAPHS, GRAPHS, BUDGET))
+    for latency in (LATENCY, 0):
+        print('query latency {}s'.format(latency))
+        old, old_out = bench('sequential', lambda: page(False, latency), render)
+        new, new_out = bench('parallel', lambda: page(True, latency), render)
+        assert old_out == new_out, 'parallel output differs from sequential output'
+        report_speedup(old, new)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+Pivot benchmark
+***************
+
+Pivots syslog style count rows, one row per host and message type, into one series per host with the legacy
+xgraphck_multiple_series, which scans the rows once per series, and with pivot, which groups them in one pass.
+The filled pivot is then timed in pure Python and with NumPy on a larger input.  Both build the same Python
+result lists and that dominates, so NumPy does not pay for itself here.
+
+    python -m benchmarks.bench_pivot
+
+10/17/26 - Initial creation
+
+"""
+
+from __future__ import unicode_literals, print_function
+import logging
+
+log = logging.getLogger(__name__)
+
+__author__ = 'rbell01824'
+__date__ = '10/17/26'
+__copyright__ = "Copyright 2014, Richard Bell"
+__credits__ = ['rbell01824']
+__license__ = 'All rights reserved'
+__version__ = '0.1'
+__maintainer__ = 'rbell01824'
+__email__ = 'rbell01824@gmail.com'
+
+import random
+import sys
+
+from benchmarks import bench, report_speedup
+from graphpages.utilities import numpy, pivot
+
+HOSTS = 500
+TYPES = 10
+FILL_HOSTS = 5000
+FILL_TYPES = 40
+
+
+def legacy_multiple_series(list_of_dicts, name, data_label, data_value):
+    """ xgraphck_multiple_series before pivot. """
+    names = list(set([x[name] for x in list_of_dicts]))
+    data = []
+    for a_name in names:
+        z = {'name': a_name, 'data': [[x[data_label], x[data_value]] for x in list_of_dicts if x[name] == a_name]}
+        data.append(z)
+    return data
+
+
+def rows(hosts, types, density=0.8):
+    """ Return count rows for about density of the host, type combinations in random order. """
+    rnd = random.Random(0)
+    result = [{'node__host_name': 'A0040CnB{:05d}'.format(h), 'message_type': 'type {}'.format(t),
+               'num_results': rnd.randint(1, 5000)}
+              for h in range(hosts) for t in range(types) if rnd.random() < density]
+    rnd.shuffle(result)
+    return result
+
+
+def by_name(series):
+    return sorted(series, key=lambda s: s['name'])
+
+
+def main():
+    data = rows(HOSTS, TYPES)
+    print('Pivot {} rows into {} series'.format(len(data), HOSTS))
+    old, old_out = bench('xgraphck_multiple_series (legacy)', lambda: data,
+                         lambda d: legacy_multiple_series(d, 'node__host_name', 'message_type', 'num_results'))
+    new, new_out = bench('pivot', lambda: data,
+                         lambda d: pivot(d, 'node__host_name', 'message_type', 'num_results'))
+    assert by_name(old_out) == by_name(new_out), 'pivot output differs from legacy output'
+    report_speedup(old, new)
+
+    data = rows(FILL_HOSTS, FILL_TYPES)
+    print('Pivot {} rows into {} filled series'.format(len(data), FILL_TYPES))
+    old, old_out = bench('pivot fill=0', lambda: data,
+                         lambda d: pivot(d, 'message_type', 'node__host_name', 'num_results', fill=0, sort=True,
+                                         use_numpy=False))
+    if numpy is None:
+        print('NumPy is not installed')
+        return 0
+    new, new_out = bench('pivot fill=0 NumPy', lambda: data,
+                         lambda d: pivot(d, 'message_type', 'node__host_name', 'num_results', fill=0, sort=True,
+                                         use_numpy=True))
+    assert old_out == new_out, 'NumPy pivot output differs from Python pivot output'
+    report_speedup(old, new)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
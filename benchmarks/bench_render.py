@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+Render engine benchmark
+***********************
+
+Renders 10k node widget trees with the iterative render engine and with the recursive render it replaced.
+
+    python -m benchmarks.bench_render
+
+10/17/26 - Initial creation
+
+"""
+
+from __future__ import unicode_literals, print_function
+import logging
+
+log = logging.getLogger(__name__)
+
+__author__ = 'rbell01824'
+__date__ = '10/17/26'
+__copyright__ = "Copyright 2014, Richard Bell"
+__credits__ = ['rbell01824']
+__license__ = 'All rights reserved'
+__version__ = '0.1'
+__maintainer__ = 'rbell01824'
+__email__ = 'rbell01824@gmail.com'
+
+import sys
+
+from benchmarks import bench, report_speedup
+from djangopages.widgets.widgets import DWidget
+from djangopages.widgets.layout import WList, Row, Column
+from djangopages.widgets.bootstrap import Panel
+from djangopages.widgets.texthtml import Text
+
+NODES = 10000
+
+
+def legacy_render(content):
+    """ The recursive render replaced by the render engine. """
+    if isinstance(content, basestring):
+        return content
+    if isinstance(content, DWidget) and type(content).render == DWidget.render:
+        args = tuple()
+        for a in content.args:
+            args += (legacy_render(a),)
+        content.args = args
+        return content.generate()
+    if hasattr(content, 'render'):
+        return content.render()
+    if isinstance(content, tuple):
+        tpl = tuple()
+        for con in content:
+            tpl += (legacy_render(con),)
+        return tpl
+    if isinstance(content, list):
+        return [legacy_render(con) for con in content]
+    return content
+
+
+def wide_tree(nodes=NODES):
+    """ Dashboard like tree, a WList of rows each holding two panels. Nine widgets per row. """
+    rows = []
+    for i in range(nodes // 9):
+        rows.append(Row((Column(Panel(Text('body {}'.format(i)), heading='panel {}'.format(i)), width=6),
+                         Column(Panel(Text('body {}'.format(i), para=True), heading='panel {}'.format(i)), width=6))))
+    return WList(*rows)
+
+
+def flat_tree(nodes=NODES):
+    """ One WList holding nodes - 1 Text widgets. """
+    return WList(*[Text('item {}'.format(i)) for i in range(nodes - 1)])
+
+
+def deep_tree(nodes=NODES):
+    """ Rows nested nodes deep. """
+    tree = Text('leaf')
+    for i in range(nodes - 1):
+        tree = Row(tree, classes='r{}'.format(i % 7))
+    return tree
+
+
+def main():
+    print('Render {} node trees'.format(NODES))
+    old, old_out = bench('wide tree, recursive render', wide_tree, legacy_render)
+    new, new_out = bench('wide tree, render engine', wide_tree, lambda w: w.render())
+    assert old_out == new_out, 'render engine output differs from recursive render'
+    report_speedup(old, new)
+
+    old, old_out = bench('flat tree, recursive render', flat_tree, legacy_render)
+    new, new_out = bench('flat tree, render engine', flat_tree, lambda w: w.render())
+    assert old_out == new_out, 'render engine output differs from recursive render'
+    report_speedup(old, new)
+
+    bench('deep tree, render engine', deep_tree, lambda w: w.render())
+    try:
+        bench('deep tree, recursive render', deep_tree, legacy_render, repeat=1)
+    except RuntimeError as e:
+        print('{:<50} {:>11}'.format('deep tree, recursive render', 'fails'))
+        print('    {}'.format(e))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+Syslog query benchmark
+**********************
+
+Generates a SQLite database of ROWS syslog records, 10 companies of 100 nodes over a year, with the VSyslog
+schema and its single column indexes.  Then it shows the query plan and time of dashboard queries built by
+syslog_query and of the last page of a node's records, first with only the single column indexes and then with
+the (node, time) and (node, message_type, time) indexes of VSyslog.Meta.index_together.  The last page is read
+with an offset before and with syslog_query_keyset after.
+
+    python -m benchmarks.bench_syslog_query                 # 10M rows, about 1.6GB in /tmp
+    python -m benchmarks.bench_syslog_query 1000000 /tmp/syslog.sqlite3
+
+The database is kept and reused when it already has the requested number of rows.
+
+10/17/26 - Initial creation
+
+"""
+
+from __future__ import unicode_literals, print_function
+import logging
+
+log = logging.getLogger(__name__)
+
+__author__ = 'rbell01824'
+__date__ = '10/17/26'
+__copyright__ = "Copyright 2014, Richard Bell"
+__credits__ = ['rbell01824']
+__license__ = 'All rights reserved'
+__version__ = '0.1'
+__maintainer__ = 'rbell01824'
+__email__ = 'rbell01824@gmail.com'
+
+import datetime
+import os
+import random
+import sqlite3
+import sys
+import time
+
+import benchmarks                               # configures Django
+
+from django.core.management.color import no_style
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+
+from test_data.models import VCompany, VNode, VSyslog, syslog_query, syslog_query_keyset
+
+ROWS = 10000000
+PATH = '/tmp/bench_syslog_query.sqlite3'
+COMPANIES = 10
+NODES = 100                                     # per company
+TYPES = ('critical', 'error', 'warning', 'notice', 'info', 'trace')
+START = datetime.datetime(2014, 1, 1, tzinfo=timezone.utc)
+SECONDS = 365 * 24 * 3600
+COMPANY = 3
+NODE = 250                                      # a node of COMPANY
+PAGE = 1000
+
+
+def schema():
+    """ Return the CREATE TABLE statements, the single column CREATE INDEX statements, and the index_together
+    CREATE INDEX statements.
+    """
+    style = no_style()
+    tables, indexes, composite = [], [], []
+    for model in (VCompany, VNode, VSyslog):
+        tables.extend(connection.creation.sql_create_model(model, style)[0])
+        for field in model._meta.local_fields:
+            indexes.extend(connection.creation.sql_indexes_for_field(model, field, style))
+    for names in VSyslog._meta.index_together:
+        fields = [VSyslog._meta.get_field_by_name(name)[0] for name in names]
+        composite.extend(connection.creation.sql_indexes_for_fields(VSyslog, fields, style))
+    return tables, indexes, composite
+
+
+def generate(db, rows):
+    """ Create and fill the tables in time order, as ingestion would, with the single column indexes. """
+    tables, indexes, composite = schema()
+    for statement in tables:
+        db.execute(statement)
+    db.executemany('INSERT INTO test_data_vcompany (id, company_name) VALUES (?, ?)',
+                   [(c, 'company_{}'.format(c)) for c in range(1, COMPANIES + 1)])
+    db.executemany('INSERT INTO test_data_vnode (id, company_id, host_name, node_ip, is_active, has_syslog_records) '
+                   'VALUES (?, ?, ?, NULL, 1, 1)',
+                   [(n, (n - 1) // NODES + 1, 'node_{}'.format(n)) for n in range(1, COMPANIES * NODES + 1)])
+    rnd = random.Random(0)
+    step = float(SECONDS) / rows
+
+    def records():
+        for n in xrange(rows):
+            t = START + datetime.timedelta(seconds=int(n * step))
+            yield (rnd.randint(1, COMPANIES * NODES), t.strftime('%Y-%m-%d %H:%M:%S'), 'cli {}'.format(n % 50000),
+                   TYPES[min(int(rnd.expovariate(1.0)), len(TYPES) - 1)], '', '')
+    db.executemany('INSERT INTO test_data_vsyslog (node_id, time, message_text, message_type, message_error, line) '
+                   'VALUES (?, ?, ?, ?, ?, ?)', records())
+    for statement in indexes:
+        db.execute(statement)
+    db.commit()
+    return
+
+
+def open_db(path, rows):
+    """ Return a connection to the benchmark database, generating it if needed. """
+    if os.path.exists(path):
+        db = sqlite3.connect(path)
+        try:
+            if db.execute('SELECT count(*) FROM test_data_vsyslog').fetchone()[0] == rows:
+                return db
+        except sqlite3.Error:
+            pass
+        db.close()
+        os.remove(path)
+    db = sqlite3.connect(path)
+    start = time.time()
+    generate(db, rows)
+    print('generated {} rows in {:.1f}s'.format(rows, time.time() - start))
+    return db
+
+
+def sql(qs):
+    """ Return the SQL and parameters of a QuerySet for the sqlite3 module. """
+    query, params = qs.query.sql_with_params()
+    return query.replace('%s', '?'), params
+
+
+def queries():
+    """ Return (label, QuerySet) for the dashboard queries. """
+    company = VCompany(id=COMPANY, company_name='company_{}'.format(COMPANY))
+    node = VNode(id=NODE, company=company, host_name='node_{}'.format(NODE))
+    day = START + datetime.timedelta(days=180)
+    week = day + datetime.timedelta(days=7)
+    by_type = lambda qs: qs.values('message_type').annotate(num_results=Count('id')).order_by('message_type')
+    return [('node, week, count by type', by_type(syslog_query(company, node, day, week))),
+            ('node, type, week, count', syslog_query(company, node, day, week).filter(message_type='critical').
+             values('node').annotate(num_results=Count('id'))),
+            ('company, day, count by type', by_type(syslog_query(company, None, day,
+                                                                 day + datetime.timedelta(days=1))))]
+
+
+def run(db, label, qs, repeat=3):
+    """ Print the query plan and best time of qs, return the time. """
+    query, params = sql(qs)
+    plan = [row[-1] for row in db.execute('EXPLAIN QUERY PLAN ' + query, params)]
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        db.execute(query, params).fetchall()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print('{:<50} {:>10.4f}s'.format(label, best))
+    for step in plan:
+        print('    {}'.format(step))
+    return best
+
+
+def main(argv):
+    rows = int(argv[1]) if len(argv) > 1 else ROWS
+    path = argv[2] if len(argv) > 2 else PATH
+    db = open_db(path, rows)
+    tables, indexes, composite = schema()
+    for statement in composite:
+        db.execute('DROP INDEX IF EXISTS ' + statement.split()[2])
+    db.execute('ANALYZE')
+    print('Syslog queries on {} rows'.format(rows))
+
+    # the last page of the node's records, its keyset is the last record of the page before
+    node = VNode(id=NODE)
+    offset = max(0, db.execute('SELECT count(*) FROM test_data_vsyslog WHERE node_id = ? AND time IS NOT NULL',
+                               (NODE,)).fetchone()[0] - PAGE)
+    last_time, last_id = db.execute('SELECT time, id FROM test_data_vsyslog WHERE node_id = ? AND time IS NOT NULL '
+                                    'ORDER BY time, id LIMIT 1 OFFSET ?', (NODE, max(0, offset - 1))).fetchone()
+    last_time = datetime.datetime.strptime(last_time, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    by_offset = syslog_query(None, node).filter(time__isnull=False).order_by('time', 'id')[offset:offset + PAGE]
+    by_keyset = syslog_query_keyset(None, node, after=(last_time, last_id), limit=PAGE)
+
+    print('single column indexes')
+    before = [run(db, label, qs) for label, qs in queries() + [('node, last page by offset', by_offset)]]
+
+    start = time.time()
+    for statement in composite:
+        db.execute(statement)
+    db.execute('ANALYZE')
+    print('composite indexes, created in {:.1f}s'.format(time.time() - start))
+    after = [run(db, label, qs) for label, qs in queries() + [('node, last page by keyset', by_keyset)]]
+
+    print('speedup')
+    for (label, qs), old, new in zip(queries() + [('node, last page', None)], before, after):
+        print('{:<50} {:>10.1f}x'.format(label, old / new if new else float('inf')))
+    db.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
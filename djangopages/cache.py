@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+
+Cache
+*****
+
+.. module:: cache
+    :synopsis: caches for DjangoPages
+
+.. moduleauthor:: Richard Bell <rbell01824@gmail.com>
+
+DjangoPages caches rendered HTML and other values in named caches.  A named cache stores to a Django cache
+backend when one is configured for it, otherwise to a bounded in-process LRUCache.  Every named cache counts
+hits, misses, and evictions.
+
+.. sourcecode:: python
+
+    cache = named_cache('fragment', alias=None, max_entries=1000, timeout=300)
+    html = cache.get(key)
+    if html is None:
+        html = expensive_render()
+        cache.set(key, html)
+
+    cache_stats()       # {'fragment': {'hits': 0, 'misses': 1, 'evictions': 0, 'entries': 1, ...}}
+
+10/17/26 - Initial creation
+
+"""
+
+from __future__ import unicode_literals
+import logging
+
+log = logging.getLogger(__name__)
+
+__author__ = 'rbell01824'
+__date__ = '10/17/26'
+__copyright__ = "Copyright 2014, Richard Bell"
+__credits__ = ['rbell01824']
+__license__ = 'All rights reserved'
+__version__ = '0.1'
+__maintainer__ = 'rbell01824'
+__email__ = 'rbell01824@gmail.com'
+
+import threading
+import time
+
+from collections import OrderedDict
+
+from django.core.cache import get_cache
+
+DEFAULT_TIMEOUT = object()          # use the cache's default timeout; a timeout of None never expires
+_MISSING = object()
+
+########################################################################################################################
+#
+# In-process LRU cache
+#
+########################################################################################################################
+
+
+class LRUCache(object):
+    """ Bounded in-process cache.  Entries expire after their timeout and, when the cache is full, the least
+    recently used entry is evicted.
+
+    .. sourcecode:: python
+
+        cache = LRUCache(max_entries=100, timeout=60)
+        cache.set('key', 'value')
+        cache.get('key')                # 'value'
+
+    .. note:: Eviction is pluggable.  Subclasses override evict to choose a different victim when the
+        cache is full.
+
+    :param max_entries: maximum number of entries, None for no limit
+    :type max_entries: int or None
+    :param timeout: default entry lifetime in seconds, None for entries that never expire
+    :type timeout: int or None
+    """
+    def __init__(self, max_entries=1000, timeout=300):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()          # key -> (expires, value), least recently used first
+        self._lock = threading.RLock()
+        return
+
+    def get(self, key, default=None):
+        """ Return the value for key, or default if key is missing or expired. """
+        with self._lock:
+            try:
+                expires, value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires is not None and expires <= time.time():
+                self.evictions += 1
+                self.misses += 1
+                return default
+            self._data[key] = (expires, value)          # now the most recently used
+            self.hits += 1
+            return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        """ Set the value for key.  Evicts entries while the cache is over max_entries. """
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.timeout
+        expires = None if timeout is None else time.time() + timeout
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (expires, value)
+            while self.max_entries is not None and len(self._data) > self.max_entries:
+                self.evict()
+                self.evictions += 1
+        return
+
+    def evict(self):
+        """ Remove one entry from the full cache.  The default removes the least recently used entry. """
+        self._data.popitem(last=False)
+        return
+
+    def delete(self, key):
+        """ Remove key from the cache if present. """
+        with self._lock:
+            self._data.pop(key, None)
+        return
+
+    def clear(self):
+        """ Remove all entries. """
+        with self._lock:
+            self._data.clear()
+        return
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """ Return the cache's counters.
+
+        :rtype: dict
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'entries': len(self._data), 'max_entries': self.max_entries}
+
+########################################################################################################################
+#
+# Django cache backend adapter
+#
+########################################################################################################################
+
+
+class DjangoCache(object):
+    """ Adapts a Django cache backend to the LRUCache interface and counts hits and misses.  Keys are
+    prefixed with the cache's name and generation, kept in the backend, and clear starts a new generation so
+    only this cache's keys are dropped.  The backend does its own eviction, so evictions are not counted.
+
+    :param name: name of the cache, used as key prefix
+    :type name: unicode
+    :param alias: Django cache alias, see settings.CACHES
+    :type alias: unicode
+    :param timeout: default timeout in seconds
+    :type timeout: int or None
+    """
+    def __init__(self, name, alias, timeout=300):
+        self.name = name
+        self.backend = get_cache(alias)
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        return
+
+    def _generation(self):
+        """ Return the cache's generation, starting a new one if it was never set or was evicted. """
+        key = 'djangopages:{}:generation'.format(self.name)
+        generation = self.backend.get(key)
+        if generation is None:
+            self.backend.add(key, int(time.time() * 1000000), None)
+            generation = self.backend.get(key)
+        return generation
+
+    def _key(self, key):
+        return 'djangopages:{}:{}:{}'.format(self.name, self._generation(), key)
+
+    def get(self, key, default=None):
+        """ Return the value for key, or default if key is missing. """
+        value = self.backend.get(self._key(key), _MISSING)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        """ Set the value for key. """
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.timeout
+        self.backend.set(self._key(key), value, timeout)
+        return
+
+    def delete(self, key):
+        """ Remove key from the cache if present. """
+        self.backend.delete(self._key(key))
+        return
+
+    def clear(self):
+        """ Drop this cache's keys, by starting a new generation.  Other keys in the backend are kept and the
+        old keys are left for the backend to expire or evict.
+        """
+        key = 'djangopages:{}:generation'.format(self.name)
+        try:
+            self.backend.incr(key)
+        except ValueError:                      # never set or evicted
+            self.backend.set(key, int(time.time() * 1000000), None)
+        return
+
+    def stats(self):
+        """ Return the cache's counters.
+
+        :rtype: dict
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+########################################################################################################################
+#
+# Named caches
+#
+########################################################################################################################
+
+_named_caches = {}
+_named_caches_lock = threading.Lock()
+
+
+def named_cache(name, alias=None, max_entries=1000, timeout=300):
+    """ Return the process wide cache called name, creating it on first use.
+
+    .. sourcecode:: python
+
+        named_cache('fragment', alias='default')
+
+    :param name: name of the cache
+    :type name: unicode
+    :param alias: if set, the Django cache alias to store to, otherwise an in-process LRUCache is used
+    :type alias: unicode or None
+    :param max_entries: maximum entries for an in-process cache, None for no limit
+    :type max_entries: int or None
+    :param timeout: default timeout in seconds
+    :type timeout: int or None
+    :return: the cache
+    :rtype: LRUCache or DjangoCache
+    """
+    try:
+        return _named_caches[name]
+    except KeyError:
+        with _named_caches_lock:
+            if name not in _named_caches:
+                if alias:
+                    _named_caches[name] = DjangoCache(name, alias, timeout)
+                else:
+                    _named_caches[name] = LRUCache(max_entries, timeout)
+            return _named_caches[name]
+
+
+def set_named_cache(name, cache):
+    """ Install cache as the cache called name.  The cache must provide get, set, delete, clear, and stats
+    like LRUCache.  Installing None removes the cache so it is created anew on next use.
+    """
+    with _named_caches_lock:
+        if cache is None:
+            _named_caches.pop(name, None)
+        else:
+            _named_caches[name] = cache
+    return
+
+
+def cache_stats():
+    """ Return the counters of every named cache.
+
+    :return: dict of cache name -> stats dict
+    :rtype: dict
+    """
+    return dict((name, cache.stats()) for name, cache in _named_caches.items())
@@ -30,6 +30,8 @@ __version__ = "0.1"
 __maintainer__ = "rbell01824"
 __email__ = "rbell01824@gmail.com"
 
+import threading
+
 from django.contrib.admin import SimpleListFilter
 from django.utils.translation import ugettext_lazy as _
 from django.conf import settings
@@ -209,6 +211,8 @@ def ssw(value, lead_string):
 #
 ########################################################################################################################
 
+_unique_name_lock = threading.Lock()
+
 
 def unique_name(base_name='x'):
     """ Returns a unique name of the form 'base_name'_counter.
@@ -225,10 +229,12 @@ def unique_name(base_name='x'):
     :return: basename+n, ie. x0, x1, ...
     :rtype: str
     """
-    if not hasattr(unique_name, "counter"):
-        unique_name.counter = 0  # it doesn't exist yet, so initialize it
-    unique_name.counter += 1
-    return '{}_{}'.format(base_name, unique_name.counter)
+    with _unique_name_lock:             # widgets may render on several threads, see parallel render
+        if not hasattr(unique_name, "counter"):
+            unique_name.counter = 0  # it doesn't exist yet, so initialize it
+        unique_name.counter += 1
+        counter = unique_name.counter
+    return '{}_{}'.format(base_name, counter)
 
 
 def add_classes(html_str, *classes):
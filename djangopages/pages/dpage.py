@@ -46,6 +46,73 @@ DPage(s) typically define:
 * A longer description for the page.
 * Zero or more tages that are useful for organizing and querying pages.
 
+Page caching
+============
+
+A DPage whose content changes only when its data changes may cache its whole response.  Set cache_timeout
+and, if the page differs by user or query parameter, vary_on::
+
+    class SalesGraphs(DPage):
+        tags = ['graphs']
+        cache_timeout = 600                                 # seconds
+        vary_on = ('user', 'year')                          # per user and per ?year=
+
+Cached GET responses carry ETag and Last-Modified headers and conditional requests are answered with 304.
+Cached pages are invalidated by class name or tag::
+
+    DPage.invalidate(names='SalesGraphs')
+    DPage.invalidate(tags='graphs')                          # e.g. after reloading syslog data
+
+Streaming pages
+===============
+
+A DPage that produces a lot of HTML may stream its response.  Set stream = True and the page template's head
+is sent at once, followed by the content chunk by chunk, followed by the template's tail.  In streaming mode
+generate may also return widgets, lists, tuples, or a generator, which are rendered lazily element by element.
+Layout, Row, Column, WList, and Panel stream too: their markup around each child is sent before the child is
+rendered, so a page returning a single Layout is still sent row by row.  Other widgets, and containers with
+cache set, are sent whole once rendered::
+
+    class SyslogReport(DPage):
+        stream = True
+
+        def generate(self, request, *args, **kwargs):
+            return (Panel(Text(row)) for row in VSyslog.objects.iterator())
+
+.. note:: A streamed page's status and headers are sent before its content is rendered, so errors while
+    rendering the content can not change the response.
+
+Concurrent data
+===============
+
+AsyncDPage runs a page's independent queries concurrently on a thread pool.  Wrap each query in Data.  Data
+in the returned content is resolved concurrently before the page is rendered.  generate may also be a
+coroutine, a generator that yields Data, or a list, tuple, or dict of Data, and is sent back the results::
+
+    class SyslogGraphs(AsyncDPage):
+        def generate(self, request, *args, **kwargs):
+            qs = VSyslog.objects.filter(node__host_name=node)
+            count, by_type = yield Data(qs.count), Data(count_by_type, qs)        # run concurrently
+            yield Panel(Markdown('{} records'.format(count)), GraphCK('pie', by_type))
+
+Any other yielded value is the page's content.  Widgets, lists, and tuples of widgets may be returned as the
+content of an AsyncDPage.
+
+Lazy content
+============
+
+Content wrapped in Lazy is not rendered with the page.  The page holds a placeholder and the browser fetches
+the content, when the placeholder scrolls into view or, with prefetch=True, when the browser is idle, from the
+page's own URL with the query parameter dpage_fragment set to the Lazy's fragment id::
+
+    class SyslogDashboard(DPage):
+        def generate(self, request, *args, **kwargs):
+            return Layout(Row(summary), Lazy(Row(history_graphs)), Lazy(Panel(audit_table), name='audit'))
+
+    # GET /dpages/SyslogDashboard                          summary and two placeholders
+    # GET /dpages/SyslogDashboard?dpage_fragment=0         the history graphs
+    # GET /dpages/SyslogDashboard?dpage_fragment=audit     the audit table
+
 Details
 =======
 """
@@ -65,10 +132,27 @@ __version__ = "0.1"
 __maintainer__ = "rbell01824"
 __email__ = "rbell01824@gmail.com"
 
+import hashlib
+import itertools
+import time
+import types
+
 from django.conf import settings
 from django.shortcuts import render
+from django.template import RequestContext
+from django.template.loader import render_to_string
 from django.views.generic import View
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseNotFound, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.html import escape
+from django.utils.http import http_date, parse_http_date_safe, parse_etags, quote_etag
+
+from djangopages.cache import named_cache
+from djangopages.widgets.widgets import RenderIter, render_budget
+from djangopages.widgets.data import Data, find_data, gather
+from djangopages.widgets.layout import lazy_widgets
+
+FRAGMENT_PARAM = 'dpage_fragment'               # query parameter selecting a Lazy's content, see Lazy content
 
 # todo 3: add class to deal with file like objects and queryset objects
 # todo 3: add support for select2 https://github.com/applegrew/django-select2
@@ -82,6 +166,8 @@ from django.http import HttpResponse
 # for now just deal with actual text
 # todo 2: add markdown kwargs options here
 
+_STREAM_MARKER = '<!-- dpage stream content -->'        # splits the page template for streaming, see DPage._stream
+
 ########################################################################################################################
 #
 # DPage class
@@ -90,7 +176,13 @@ from django.http import HttpResponse
 
 
 class _DPageRegister(type):
-    """ Internal metaclass to register DPage child objects.  Do not mess with this! """
+    """ Internal metaclass to register DPage child objects.  Do not mess with this!
+
+    Besides pages_list and pages_dict the register keeps, so find/next/prev/siblings are constant time:
+
+    * pages_tags: tag -> list of pages_list entries with the tag, in registration order
+    * pages_index: None (for pages_list) or tag -> dict of DPage class -> position in the list
+    """
     # noinspection PyMissingConstructor,PyUnusedLocal
     def __init__(cls, name, base, attrs):
         if not hasattr(cls, 'pages_list'):
@@ -99,11 +191,49 @@ class _DPageRegister(type):
             # Insert pages_list and pages_dict into the class definition of the class using this metaclass
             cls.pages_list = []          # List of subclasses to allow listing
             cls.pages_dict = {}          # Dictionary of subclasses to allow quick name lookup
-        else:
+            cls.pages_tags = {}          # Dictionary of tag to list of subclasses with the tag
+            cls.pages_index = {}         # Dictionary of None or tag to dictionary of subclass to list position
+        elif not attrs.get('abstract'):
             # This is a plugin implementation of this class that needs to be registered.
             # Save the class name and cls object.
-            cls.pages_list.append({'cls': cls, 'name': name})       # Put in list
-            cls.pages_dict[name] = cls                              # Put in dict
+            # Base classes for other DPage(s), like AsyncDPage, set abstract = True and are not registered.
+            cls._register_page({'cls': cls, 'name': name})
+
+    def _register_page(cls, page):
+        """ Add page, a {'cls': ..., 'name': ...} dict, to the register and its indexes. """
+        cls.pages_dict[page['name']] = page['cls']                 # Put in dict
+        cls._index_page(None, cls.pages_list, page)                # Put in list
+        for tag in getattr(page['cls'], 'tags', None) or ():
+            cls._index_page(tag, cls.pages_tags.setdefault(tag, []), page)
+
+    def _index_page(cls, key, pages, page):
+        """ Append page to pages and record its position, the first if the class is registered twice. """
+        cls.pages_index.setdefault(key, {}).setdefault(page['cls'], len(pages))
+        pages.append(page)
+
+    def unregister(cls, page):
+        """ Remove a DPage class from the register.
+
+        .. sourcecode:: python
+
+            DPage.unregister('SomePage')
+
+        :param page: DPage class or class name
+        :type page: DPage or unicode
+        """
+        page_cls = cls.pages_dict.get(page) if isinstance(page, basestring) else page
+        if page_cls is None:
+            return
+        if cls.pages_dict.get(page_cls.__name__) is page_cls:
+            del cls.pages_dict[page_cls.__name__]
+        pages = [p for p in cls.pages_list if p['cls'] is not page_cls]
+        del cls.pages_list[:]
+        cls.pages_tags.clear()
+        cls.pages_index.clear()
+        for p in pages:
+            cls._index_page(None, cls.pages_list, p)
+            for tag in getattr(p['cls'], 'tags', None) or ():
+                cls._index_page(tag, cls.pages_tags.setdefault(tag, []), p)
 
 
 class DPage(View):
@@ -126,6 +256,17 @@ class DPage(View):
     :param tags: list of tags for this DPage
     :type tags: list
 
+    Class attributes for page caching, see Page caching above:
+
+    * cache_timeout: seconds to cache the page's GET response, None to not cache
+    * vary_on: 'user' to cache per user, 'query' to cache per query string, any other name to cache per value
+      of that query parameter
+
+    Set the class attribute stream True to stream the page's response, see Streaming pages above.
+
+    Set the class attribute render_budget to limit how many children of parallel=True widgets are rendered
+    concurrently for a request, by default settings.DPAGE_RENDER_BUDGET.
+
     .. note:: It is legal and sometimes useful to define a DPage and render it as part of another DPage.
 
                 .. sourcecode:: python
@@ -134,6 +275,11 @@ class DPage(View):
     """
     __metaclass__ = _DPageRegister              # use DPageRegister to register child classes
 
+    stream = False                              # if True stream the response, see Streaming pages
+    render_budget = None                        # max widgets rendered concurrently, None for the default
+    cache_timeout = None                        # seconds to cache GET responses, None for no caching
+    vary_on = ()                                # 'user', 'query', or query parameter names
+
     def __init__(self, request=None, context=None, template=None,
                  title='', description='', tags=None, **kwargs):
         """
@@ -164,18 +310,67 @@ class DPage(View):
         """
         return render(request, self.template, {'content': content})
 
+    def _generate(self, request, *args, **kwargs):
+        """ Return the page's content, by default what generate returns, see _lazy. """
+        return self._lazy(request, self.generate(request, *args, **kwargs))
+
+    def _lazy(self, request, content):
+        """ Give the Lazy widgets in content their fragment URLs, see Lazy content.  For a fragment request
+        return the response with the requested Lazy's content instead of content.
+        """
+        if request is None or isinstance(content, (basestring, HttpResponse, types.GeneratorType)):
+            return content
+        fragment = request.GET.get(FRAGMENT_PARAM)
+        query = request.GET.copy()
+        found = None
+        for n, lazy in enumerate(lazy_widgets(self.content if isinstance(content, DPage) else content)):
+            fragment_id = lazy.name or '{}'.format(n)
+            query[FRAGMENT_PARAM] = fragment_id
+            lazy.url = '{}?{}'.format(request.path, query.urlencode())
+            if fragment_id == fragment:
+                found = lazy
+        if fragment is None:
+            return content
+        if found is None:
+            return HttpResponseNotFound('<h1>Fragment &lt;{}&gt; not found</h1>'.format(escape(fragment)))
+        return HttpResponse(self._render_fragment(found))
+
+    # noinspection PyMethodMayBeStatic
+    def _render_fragment(self, lazy):
+        """ Return the rendered content of a Lazy for a fragment request. """
+        return lazy.render_content()
+
     def _get_post(self, request, *args, **kwargs):
         """ DPage shared default get/post processing """
-        content = self.generate(request, *args, **kwargs)
-        if isinstance(content, DPage):
-            content = self.content
-        elif isinstance(content, (str, unicode)):
-            pass
-        elif isinstance(content, HttpResponse):
-            return content
-        else:
-            raise ValueError("Generate returned illegal type {}.".format(type(content)))
-        return render(request, self.template, {'content': content})
+        with render_budget(self.render_budget):
+            content = self._generate(request, *args, **kwargs)
+            if isinstance(content, DPage):
+                content = self.content
+            elif isinstance(content, (str, unicode)):
+                pass
+            elif isinstance(content, HttpResponse):
+                return content
+            elif not self.stream:
+                raise ValueError("Generate returned illegal type {}.".format(type(content)))
+            if self.stream:
+                return self._stream(request, content)
+            return render(request, self.template, {'content': content})
+
+    def _stream(self, request, content):
+        """ Streaming response with the template's head, the content rendered chunk by chunk, and the
+        template's tail.
+
+        :param request: request object
+        :param content: content, see RenderIter
+        :return: response object
+        :rtype: StreamingHttpResponse
+        """
+        html = render_to_string(self.template, {'content': _STREAM_MARKER}, context_instance=RequestContext(request))
+        head, marker, tail = html.partition(_STREAM_MARKER)
+        if not marker:
+            raise ValueError("Template {} does not output content.".format(self.template))
+        chunks = _budgeted(RenderIter(content), self.render_budget)
+        return StreamingHttpResponse(itertools.chain((head,), chunks, (tail,)))
 
     def get(self, request, *args, **kwargs):
         """ Base class default get method
@@ -183,11 +378,82 @@ class DPage(View):
         Invokes self.generate(...).  If generate returns str/unicode renders with returned
         value.  If generate returns DPage, renders self.content.  If generate returns HTTPResponse, returns response.
 
+        If the page sets cache_timeout the response is served from the page cache when possible.
+
         .. note:: Child classes may, and sometimes need to, override get.
             If so they **must** return a response object!
         """
+        if self.cache_timeout:
+            return self._get_cached(request, *args, **kwargs)
         return self._get_post(request, *args, **kwargs)
 
+    def _get_cached(self, request, *args, **kwargs):
+        """ DPage get with page caching.  Only 200 responses that do not use the CSRF token are cached. """
+        cache = page_cache()
+        key = self._page_cache_key(request, args, kwargs)
+        entry = cache.get(key)
+        if entry is None:
+            response = self._get_post(request, *args, **kwargs)
+            if response.status_code != 200 or response.streaming or request.META.get('CSRF_COOKIE_USED'):
+                return response
+            entry = {'content': response.content,
+                     'content_type': response['Content-Type'],
+                     'etag': quote_etag(hashlib.md5(response.content).hexdigest()),
+                     'last_modified': int(time.time())}
+            cache.set(key, entry, self.cache_timeout)
+        elif _not_modified(request, entry):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(entry['content'], content_type=entry['content_type'])
+        response['ETag'] = entry['etag']
+        response['Last-Modified'] = http_date(entry['last_modified'])
+        if 'user' in self.vary_on:
+            patch_vary_headers(response, ('Cookie',))
+        return response
+
+    def _page_cache_key(self, request, args, kwargs):
+        """ Page cache key for this page and request.  The key includes the class and tag versions, so
+        invalidate makes existing entries unreachable.
+        """
+        name = self.__class__.__name__
+        versions = [_page_cache_version('name', name)]
+        versions.extend(_page_cache_version('tag', tag) for tag in self.tags or ())
+        parts = [request.path, repr(args), repr(sorted(kwargs.items()))]
+        if FRAGMENT_PARAM in request.GET:
+            parts.append('fragment={}'.format(request.GET[FRAGMENT_PARAM]))
+        for vary in self.vary_on:
+            if vary == 'user':
+                user = getattr(request, 'user', None)
+                parts.append('user={}'.format(user.pk if user is not None and user.is_authenticated() else ''))
+            elif vary == 'query':
+                parts.append('query={}'.format(sorted(request.GET.lists())))
+            else:
+                parts.append('{}={}'.format(vary, request.GET.getlist(vary)))
+        digest = hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()
+        return 'page:{}:{}:{}'.format(name, '.'.join(versions), digest)
+
+    @staticmethod
+    def invalidate(names=None, tags=None):
+        """ Invalidate cached pages by DPage class name and/or tag.
+
+        .. sourcecode:: python
+
+            DPage.invalidate(names=['SalesGraphs', 'SalesTable'])
+            DPage.invalidate(tags='graphs')
+
+        :param names: DPage class name(s)
+        :type names: unicode or list
+        :param tags: tag(s)
+        :type tags: unicode or list
+        """
+        versions = page_cache_versions()
+        for kind, values in (('name', names), ('tag', tags)):
+            if isinstance(values, basestring):
+                values = [values]
+            for value in values or ():
+                versions.set(_page_cache_version_key(kind, value), _new_page_cache_version(), None)
+        return
+
     def post(self, request, *args, **kwargs):
         """ Base class default post method
 
@@ -245,15 +511,27 @@ class DPage(View):
         :type tag: unicode
         :return: List of DPage(s) with this tag.
         :rtype: list
+
+        .. note:: The list is the register's index, do not modify it.
         """
         # noinspection PyUnresolvedReferences
-        pages = DPage.pages_list
-        lst = []
-        for p in pages:
-            cls = p['cls']
-            if tag in cls.tags:
-                lst.append(p)
-        return lst
+        return DPage.pages_tags.get(tag, [])
+
+    def _neighbor(self, tag, obj, step):
+        """ Return the DPage step positions from this DPage in the DPage list or the tag's list, wrapping
+        around at the ends.  None if this DPage is not in the list.
+        """
+        # noinspection PyUnresolvedReferences
+        pl = DPage.pages_list if not tag else DPage.find(tag)
+        # noinspection PyUnresolvedReferences
+        pi = DPage.pages_index.get(tag or None, {}).get(self.__class__)
+        if pi is None:
+            return None
+        page = pl[(pi + step) % len(pl)]
+        if obj:
+            return page
+        else:
+            return page['name']
 
     def next(self, tag=None, obj=False):
         """ Return DPage after this DPage in the DPage list.
@@ -268,22 +546,7 @@ class DPage(View):
         :return: Next dpage in the list
         :rtype: str or DPage object
         """
-        if not tag:
-            # noinspection PyUnresolvedReferences
-            pl = DPage.pages_list
-        else:
-            pl = DPage.find(tag)
-        # noinspection PyBroadException
-        try:
-            pi = pl.index({'name': self.__class__.__name__, 'cls': self.__class__}) + 1
-            if pi == len(pl):
-                pi = 0
-            if obj:
-                return pl[pi]
-            else:
-                return pl[pi]['name']
-        except:
-            return None
+        return self._neighbor(tag, obj, 1)
 
     def prev(self, tag=None, obj=False):
         """Return DPage before this DPage in the DPage list.
@@ -298,22 +561,7 @@ class DPage(View):
         :return: Previous page in the list
         :rtype: str or DPage object
         """
-        if not tag:
-            # noinspection PyUnresolvedReferences
-            pl = DPage.pages_list
-        else:
-            pl = DPage.find(tag)
-        # noinspection PyBroadException
-        try:
-            pi = pl.index({'name': self.__class__.__name__, 'cls': self.__class__}) - 1
-            if pi < 0:
-                pi = len(pl) - 1
-            if obj:
-                return pl[pi]
-            else:
-                return pl[pi]['name']
-        except:
-            return None
+        return self._neighbor(tag, obj, -1)
 
     def siblings(self, tag=None, obj=False):
         """ Return DPage(s) before and after this DPage in the list.
@@ -329,3 +577,126 @@ class DPage(View):
         :rtype: tuple
         """
         return self.prev(tag, obj), self.next(tag, obj)
+
+
+class AsyncDPage(DPage):
+    """ DPage that resolves its Data concurrently, see Concurrent data above.
+
+    .. note:: Data functions run on pool threads, each with its own database connection.
+    """
+    abstract = True                             # not itself a page, see _DPageRegister
+
+    def _generate(self, request, *args, **kwargs):
+        """ Return the page's content with all Data in it resolved.  Drives generate if it is a coroutine. """
+        content = self.generate(request, *args, **kwargs)
+        if isinstance(content, types.GeneratorType):
+            content = _drive(content, self)
+        content = self._lazy(request, content)
+        if isinstance(content, (basestring, HttpResponse)):
+            return content
+        gather(find_data(self.content if isinstance(content, DPage) else content))
+        if isinstance(content, DPage) or self.stream:
+            return content
+        return ''.join(RenderIter(content))
+
+    def _render_fragment(self, lazy):
+        """ Return the rendered content of a Lazy with its Data resolved concurrently. """
+        gather(find_data(lazy.args))
+        return lazy.render_content()
+
+
+def _drive(coroutine, page):
+    """ Run a generate coroutine.  Yielded Data, or list, tuple, or dict of Data, are resolved concurrently
+    and sent back.  The first other value yielded is the content.  A coroutine that finishes without yielding
+    content returns page, ie. the content is page.content.
+    """
+    try:
+        value = next(coroutine)
+        while True:
+            if isinstance(value, Data):
+                value = coroutine.send(gather([value])[0])
+            elif isinstance(value, (list, tuple)) and value and all(isinstance(v, Data) for v in value):
+                value = coroutine.send(type(value)(gather(value)))
+            elif isinstance(value, dict) and value and all(isinstance(v, Data) for v in value.values()):
+                keys = list(value)
+                value = coroutine.send(dict(zip(keys, gather([value[k] for k in keys]))))
+            else:
+                coroutine.close()
+                return value
+    except StopIteration:
+        return page
+
+
+########################################################################################################################
+#
+# Page cache
+#
+########################################################################################################################
+
+
+def _budgeted(chunks, budget):
+    """ Yield chunks, each rendered within budget, see render_budget.  Streamed content is rendered while the
+    server sends the response, after get has returned.
+    """
+    chunks = iter(chunks)
+    while True:
+        with render_budget(budget):
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+        yield chunk
+
+
+def page_cache():
+    """ Return the cache holding DPage responses.  If settings.DPAGE_PAGE_CACHE names a Django cache alias
+    the pages are stored there, otherwise in an in-process LRU cache of at most settings.DPAGE_PAGE_CACHE_SIZE
+    entries.
+
+    :rtype: djangopages.cache.LRUCache or djangopages.cache.DjangoCache
+    """
+    return named_cache('page',
+                       alias=getattr(settings, 'DPAGE_PAGE_CACHE', None),
+                       max_entries=getattr(settings, 'DPAGE_PAGE_CACHE_SIZE', 100))
+
+
+def page_cache_versions():
+    """ Return the cache holding the versions of page class names and tags, see DPage.invalidate.  The versions
+    are kept apart from the pages, in the same Django cache alias if settings.DPAGE_PAGE_CACHE is set, otherwise
+    in an unbounded in-process cache, so evicting pages never drops a version.
+
+    :rtype: djangopages.cache.LRUCache or djangopages.cache.DjangoCache
+    """
+    return named_cache('page_version', alias=getattr(settings, 'DPAGE_PAGE_CACHE', None), max_entries=None,
+                       timeout=None)
+
+
+def _page_cache_version_key(kind, value):
+    return 'version:{}:{}'.format(kind, value)
+
+
+def _new_page_cache_version():
+    return '{:x}'.format(int(time.time() * 1000000))
+
+
+def _page_cache_version(kind, value):
+    """ Current version of a page class name or tag.  A missing version, never set or evicted from a Django
+    cache, is replaced by a new one so entries cached under an older version can not be served again.
+    """
+    versions = page_cache_versions()
+    key = _page_cache_version_key(kind, value)
+    version = versions.get(key)
+    if version is None:
+        version = _new_page_cache_version()
+        versions.set(key, version, None)
+    return version
+
+
+def _not_modified(request, entry):
+    """ True if the request's conditional headers match the cached entry. """
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        return '*' in etags or entry['etag'] in [quote_etag(etag) for etag in etags]
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return if_modified_since is not None and entry['last_modified'] <= if_modified_since
@@ -33,10 +33,16 @@ from djangopages.pages.dpage import *
 from djangopages.widgets.layout import *
 from djangopages.widgets.bootstrap import *
 from djangopages.widgets.texthtml import *
-from djangopages.widgets.graph import GraphCK
+from djangopages.pages.dpage import _not_modified
+from djangopages.widgets.graph import GraphCK, chart_data
 from djangopages.widgets.form import *
 
-from django.http import HttpResponseNotFound
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotFound, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date
+from django.views.decorators.gzip import gzip_page
 from django.views.generic import View
 from django import forms
 from django.forms.extras import SelectDateWidget
@@ -101,6 +107,45 @@ class DPageView(View):
             return HttpResponseNotFound('<h1>Page &lt;{}&gt; not found</h1>'.format(name))
 
 
+class ChartDataView(View):
+    """ ChartDataView serves the data of deferred graphs, see GraphCK.  The response is JSON with an ETag,
+    Last-Modified, and Cache-Control max-age of settings.DPAGE_CHART_DATA_MAX_AGE seconds, gzipped when the
+    client accepts it.  Deferred graphs find the view by the URL name dpage_chart_data:
+
+    .. sourcecode:: python
+
+        urlpatterns = patterns('',
+                       url(r'^dpages/chart_data/([0-9a-f]+)$', ChartDataView.as_view(), name='dpage_chart_data'),
+                       url(r'^dpages/(.*$)', DPageView.as_view(), name='dpagesview'),
+                       )
+    """
+    @method_decorator(gzip_page)
+    def dispatch(self, request, *args, **kwargs):
+        return super(ChartDataView, self).dispatch(request, *args, **kwargs)
+
+    @staticmethod
+    def get(request, key, *args, **kwargs):
+        """ get the chart data registered under key
+
+        :param request: the request object
+        :type request: WSGIRequest
+        :param key: chart data key, see register_chart_data
+        :type key: str
+        """
+        entry = chart_data(key)
+        if entry is None:
+            return HttpResponseNotFound('Chart data {} not found, reload the page'.format(key))
+        # gzip_page appends ;gzip to the ETag of compressed responses
+        if _not_modified(request, entry) or _not_modified(request, dict(entry, etag=entry['etag'][:-1] + ';gzip"')):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(entry['content'], content_type='application/json')
+        response['ETag'] = entry['etag']
+        response['Last-Modified'] = http_date(entry['last_modified'])
+        patch_cache_control(response, public=True, max_age=getattr(settings, 'DPAGE_CHART_DATA_MAX_AGE', 60))
+        return response
+
+
 ########################################################################################################################
 #
 # Dpage that list the available DPage tests.
@@ -0,0 +1,373 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+Sandbox
+*******
+
+.. module:: sandbox
+   :synopsis: Run user scripts in a pool of worker processes with time and memory limits
+
+.. moduleauthor:: Richard Bell <rbell01824@gmail.com>
+
+Graphpage queries and DUserPage scripts are Python written by users.  Run in the web process, a script that
+loops or grows without bound holds a web worker, and every request queued behind it, until it ends.  The
+sandbox runs scripts in a pool of worker processes forked from the web process, so Django is already set up
+in them.  Each worker is a small single threaded process that forks a runner process to run the scripts.  A
+script that runs longer than its timeout is killed with its runner, which the worker replaces.  A runner's
+address space is limited, so a script that allocates too much gets a MemoryError.
+
+Forking a process that has other threads running can leave the child holding locks, e.g. logging's, that no
+thread will release.  So the web process forks the workers once, when the pool starts, and never again while
+serving, unless a worker itself dies.  The pool starts on first use.  Each web process gets a pool of its own:
+a process forked from one with a pool, e.g. by gunicorn --preload or a uwsgi master, starts a new pool rather
+than share the parent's pipes.  To start the pool before the request threads, call sandbox_pool from the
+server's post fork hook, e.g. in gunicorn's config::
+
+    def post_fork(server, worker):
+        from djangopages.sandbox import sandbox_pool
+        sandbox_pool()
+
+.. sourcecode:: python
+
+    pool = sandbox_pool()               # None unless settings.DPAGE_SANDBOX_WORKERS is set
+    names = pool.run(compile(text, '<query>', 'exec'), {'number': '10'},
+                     namespace='graphpages.query.query_namespace', timeout=10)
+
+The names the script defines are pickled back to the caller.  Names whose values do not pickle, e.g. modules
+and functions, are dropped.  Errors in the script are raised as SandboxError with the worker's traceback.
+
+Settings:
+
+    * DPAGE_SANDBOX_WORKERS, worker processes, default 0 for no sandbox
+    * DPAGE_SANDBOX_TIMEOUT, default seconds a call may take, including waiting for a free worker, default 30
+    * DPAGE_SANDBOX_MEMORY, default address space limit of a runner in MB, default 1024
+
+Scripts may use the ORM, a runner opens its own database connections.  An in-memory SQLite database is not
+shared with the runners, so they see an empty database.
+
+.. note:: Runners are started with os.fork and the address space limit needs the resource module, so the
+    sandbox does not run on Windows.
+
+10/17/26 - Initial creation
+
+"""
+
+from __future__ import unicode_literals
+import logging
+
+log = logging.getLogger(__name__)
+
+__author__ = 'rbell01824'
+__date__ = '10/17/26'
+__copyright__ = "Copyright 2014, Richard Bell"
+__credits__ = ['rbell01824']
+__license__ = 'All rights reserved'
+__version__ = '0.1'
+__maintainer__ = 'rbell01824'
+__email__ = 'rbell01824@gmail.com'
+
+import cPickle as pickle
+import marshal
+import multiprocessing
+import os
+import Queue
+import signal
+import threading
+import time
+import traceback
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.utils.module_loading import import_by_path
+
+########################################################################################################################
+#
+# Errors
+#
+########################################################################################################################
+
+
+class SandboxError(Exception):
+    """ A script failed in the sandbox.
+
+    :param message: error message
+    :type message: unicode
+    :param error_type: name of the exception raised by the script, e.g. 'NameError'
+    :type error_type: unicode
+    :param remote_traceback: traceback text from the worker
+    :type remote_traceback: unicode
+    """
+    def __init__(self, message, error_type=None, remote_traceback=''):
+        super(SandboxError, self).__init__(message)
+        self.error_type = error_type
+        self.remote_traceback = remote_traceback
+        return
+
+
+class SandboxTimeout(SandboxError):
+    """ A script ran longer than its timeout, or no worker was free in time. """
+    pass
+
+########################################################################################################################
+#
+# Worker process
+#
+########################################################################################################################
+
+
+def _limit_memory(memory):
+    """ Limit this process's address space to memory MB. """
+    if resource is not None and memory:
+        hard = resource.getrlimit(resource.RLIMIT_AS)[1]
+        soft = memory * 1024 * 1024
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+    return
+
+
+def _pickled(names):
+    """ Return the picklable values of names, pickled. """
+    result = {}
+    for name, value in names.items():
+        try:
+            result[name] = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            log.debug('sandbox dropped %s, it does not pickle', name)
+    return result
+
+
+_GRACE = 5                  # seconds the pool waits for a worker after a call's timeout, see SandboxPool.run
+
+
+def _runner_main(conn):
+    """ Run scripts sent on conn until it closes.  Each request is (marshalled code, namespace function path,
+    local names, memory MB), each reply ('ok', pickled names) or ('error', type name, message, traceback).
+    """
+    while True:
+        try:
+            code, namespace, local_context, memory = conn.recv()
+        except EOFError:
+            break
+        try:
+            _limit_memory(memory)
+            global_context = import_by_path(namespace)() if namespace else {}
+            exec (marshal.loads(code), global_context, local_context)
+            reply = ('ok', _pickled(local_context))
+        except (Exception, SystemExit) as e:
+            reply = ('error', type(e).__name__, '{}: {}'.format(type(e).__name__, e), traceback.format_exc())
+        finally:
+            close_old_connections()
+        conn.send(reply)
+    return
+
+
+class _Runner(object):
+    """ A runner process forked from a worker and the worker's end of its pipe. """
+    def __init__(self):
+        self.conn, child = multiprocessing.Pipe()
+        self.pid = os.fork()
+        if not self.pid:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            self.conn.close()
+            try:
+                _runner_main(child)
+            finally:
+                os._exit(0)
+        child.close()
+        return
+
+    def kill(self):
+        """ Stop the runner, whatever it is doing, and return its exit status. """
+        self.conn.close()
+        try:
+            os.kill(self.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        return os.waitpid(self.pid, 0)[1]
+
+
+def _terminated(signum, frame):
+    """ Exit a worker on SIGTERM, killing its runner on the way out. """
+    raise SystemExit(1)
+
+
+def _worker_main(conn):
+    """ Serve calls sent on conn until it closes.  Each request is a runner request followed by the timeout
+    in seconds, each reply a runner reply, ('timeout',), or ('died', exit status).  The runner is replaced
+    after a timeout, a MemoryError, or its death.
+    """
+    signal.signal(signal.SIGTERM, _terminated)
+    for connection in connections.all():       # the parent's database connections are not ours to use
+        connection.connection = None
+    runner = None
+    try:
+        while True:
+            try:
+                request = conn.recv()
+            except EOFError:
+                break
+            if runner is None:
+                runner = _Runner()
+            try:
+                runner.conn.send(request[:-1])
+                reply = runner.conn.recv() if runner.conn.poll(request[-1]) else ('timeout',)
+            except (EOFError, IOError):
+                reply = ('died', runner.kill())
+                runner = None
+            if reply[0] == 'timeout' or reply[1] == 'MemoryError':
+                runner.kill()
+                runner = None
+            conn.send(reply)
+    finally:
+        if runner is not None:
+            runner.kill()
+    return
+
+
+class _Worker(object):
+    """ A sandbox worker process and the parent's end of its pipe. """
+    def __init__(self):
+        self.conn, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_worker_main, args=(child,), name='dpage-sandbox')
+        self.process.daemon = True
+        self.process.start()
+        child.close()
+        return
+
+    def kill(self):
+        """ Stop the worker, whatever it is doing. """
+        self.conn.close()
+        self.process.terminate()
+        self.process.join(1)
+        return
+
+########################################################################################################################
+#
+# Pool
+#
+########################################################################################################################
+
+
+class SandboxPool(object):
+    """ Pool of sandbox worker processes.  The workers are started with the pool and each runs one script at
+    a time.  Create the pool before the process starts other threads, see the module notes.
+
+    .. sourcecode:: python
+
+        pool = SandboxPool(4, timeout=10, memory=512)
+        pool.run(code, {'company': 'BMC_1'})
+
+    :param workers: number of worker processes
+    :type workers: int
+    :param timeout: default seconds a call may take
+    :type timeout: float
+    :param memory: default address space limit of a worker in MB, None for no limit
+    :type memory: int or None
+    """
+    def __init__(self, workers, timeout=30, memory=1024):
+        self.pid = os.getpid()
+        self.timeout = timeout
+        self.memory = memory
+        self._idle = Queue.Queue()
+        for _ in range(workers):
+            self._idle.put(_Worker())
+        return
+
+    def run(self, code, local_context, namespace=None, timeout=None, memory=None):
+        """ Run code in a worker.
+
+        :param code: compiled script
+        :type code: code
+        :param local_context: names given to the script, must pickle
+        :type local_context: dict
+        :param namespace: dotted path of a function returning the script's globals, default empty globals
+        :type namespace: unicode or None
+        :param timeout: seconds the call may take, default the pool's
+        :type timeout: float
+        :param memory: address space limit of the worker in MB, default the pool's
+        :type memory: int
+        :return: the picklable names the script defined or was given
+        :rtype: dict
+        :raises SandboxTimeout: if the call took too long
+        :raises SandboxError: if the script raised an exception or its worker died
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.time() + timeout
+        try:
+            worker = self._idle.get(timeout=timeout)
+        except Queue.Empty:
+            raise SandboxTimeout('No sandbox worker free in {}s'.format(timeout))
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            self._idle.put(worker)
+            raise SandboxTimeout('No sandbox worker free in {}s'.format(timeout))
+        reply = None
+        try:
+            worker.conn.send((marshal.dumps(code), namespace, local_context, memory or self.memory, remaining))
+            if not worker.conn.poll(remaining + _GRACE):
+                raise SandboxTimeout('Script ran longer than {}s'.format(timeout))
+            reply = worker.conn.recv()
+        except (EOFError, IOError):
+            raise SandboxError('Sandbox worker died, exit code {}'.format(worker.process.exitcode))
+        finally:
+            if reply is None:                   # the worker itself failed, it is replaced from this thread
+                log.error('sandbox worker %s failed, replacing it', worker.process.pid)
+                worker.kill()
+                worker = _Worker()
+            self._idle.put(worker)
+        if reply[0] == 'ok':
+            return dict((name, pickle.loads(value)) for name, value in reply[1].items())
+        if reply[0] == 'timeout':
+            raise SandboxTimeout('Script ran longer than {}s'.format(timeout))
+        if reply[0] == 'died':
+            raise SandboxError('Sandbox runner died, exit status {}'.format(reply[1]))
+        raise SandboxError(reply[2], reply[1], reply[3])
+
+    def shutdown(self):
+        """ Stop the idle workers.  Workers busy running a call are stopped when the call returns. """
+        while True:
+            try:
+                self._idle.get_nowait().kill()
+            except Queue.Empty:
+                break
+        return
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def sandbox_pool():
+    """ Return the process wide pool of settings.DPAGE_SANDBOX_WORKERS workers, None if the setting is 0 or
+    not set.  The first call in a process starts its pool, see the module notes.
+
+    :rtype: SandboxPool or None
+    """
+    global _pool
+    workers = getattr(settings, 'DPAGE_SANDBOX_WORKERS', 0)
+    if not workers:
+        return None
+    if _pool is None or _pool.pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool.pid != os.getpid():       # the parent's pool is not ours to use
+                _pool = SandboxPool(workers, getattr(settings, 'DPAGE_SANDBOX_TIMEOUT', 30),
+                                    getattr(settings, 'DPAGE_SANDBOX_MEMORY', 1024))
+    return _pool
+
+
+def set_sandbox_pool(pool):
+    """ Install pool as the process wide pool, None to have sandbox_pool start a new one on next use.  The
+    previous pool is shut down.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool is not pool and _pool.pid == os.getpid():
+            _pool.shutdown()
+        _pool = pool
+    return
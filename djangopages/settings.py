@@ -24,3 +24,11 @@ __email__ = "rbell01824@gmail.com"
 
 DPAGE_DEFAULT_TEMPLATE = 'dpage_default_template.html'
 DPAGE_DEFAULT_CONTENT = 'Congradulations: Now put some content here!'
+DPAGE_FRAGMENT_CACHE = None                 # Django cache alias for rendered widget fragments, None for in-process
+DPAGE_FRAGMENT_CACHE_SIZE = 1000            # max fragments held in-process
+DPAGE_FRAGMENT_CACHE_TIMEOUT = 300          # default fragment lifetime in seconds
+DPAGE_PAGE_CACHE = None                     # Django cache alias for DPage responses, None for in-process
+DPAGE_PAGE_CACHE_SIZE = 100                 # max pages held in-process
+DPAGE_DATA_WORKERS = 8                      # threads resolving AsyncDPage Data concurrently
+DPAGE_RENDER_WORKERS = 8                    # threads rendering the children of parallel=True widgets
+DPAGE_RENDER_BUDGET = 4                     # default max children of a request rendered concurrently
@@ -0,0 +1,755 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+""" DjangoPages tests
+
+10/17/26 - Initial creation
+
+"""
+
+from __future__ import unicode_literals
+import logging
+
+log = logging.getLogger(__name__)
+
+__author__ = 'rbell01824'
+__date__ = '10/17/26'
+__copyright__ = "Copyright 2014, Richard Bell"
+__credits__ = ['rbell01824']
+__license__ = 'All rights reserved'
+__version__ = '0.1'
+__maintainer__ = 'rbell01824'
+__email__ = 'rbell01824@gmail.com'
+
+import gzip
+import json
+import os
+import random
+import re
+import sqlite3
+import StringIO
+import tempfile
+import threading
+import time
+import unittest
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.template import Context, Template
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.test.client import RequestFactory
+
+from djangopages.cache import DjangoCache, LRUCache
+from djangopages.pages.dpage import DPage, AsyncDPage, page_cache, page_cache_versions
+from djangopages.sandbox import SandboxPool, SandboxError, SandboxTimeout, sandbox_pool, set_sandbox_pool
+from djangopages.userpages.dpageuser import DUserPage
+from djangopages.widgets.widgets import DWidget, DTemplate, Render, RenderIter, flatten, fragment_cache, render_budget
+from djangopages.widgets.data import Data, find_data, gather
+from djangopages.widgets import graph, widgets
+from djangopages.widgets.graph import GraphCK, chart_data_cache, downsample
+from djangopages.widgets.layout import Lazy, Layout, WList, Row, Column, lazy_widgets
+from djangopages.widgets.bootstrap import Panel
+from djangopages.widgets.texthtml import Text
+
+
+class RenderEngineTest(TestCase):
+    """ The iterative render engine produces the same HTML as the recursive render it replaced. """
+
+    def test_row_column(self):
+        out = Row(Column(Text('x'), width=6)).render()
+        self.assertEqual(out, '\n<!-- DWidget row -->\n<div class="row "  >\n    \n'
+                              '<!-- DWidget col -->\n<div class="col-md-6 "  >\n    x\n</div>\n'
+                              '<!-- / DWidget col -->\n\n</div>\n<!-- / DWidget row -->\n')
+
+    def test_list_and_panel(self):
+        out = WList(Text(['a', 'b'], para=True), Panel(Text('body'), heading='head')).render()
+        self.assertEqual(out, '<p class="" style="">a</p><p class="" style="">b</p>\n'
+                              '<div class="panel panel-default" >\n     '
+                              '<div class="panel-heading " style="" >\n    <h3 class="panel-title" >\n'
+                              '        head\n    </h3></div>\n\n    <div class="panel-body">\n'
+                              '        body    </div>\n     \n</div>')
+
+    def test_containers(self):
+        self.assertEqual(Render((Text('a'), [Text('b'), 1], 'c')), ('a', ['b', 1], 'c'))
+
+    def test_deep_tree(self):
+        tree = Text('leaf')
+        for _ in range(2000):
+            tree = Row(tree)
+        out = tree.render()
+        self.assertEqual(out.count('<!-- DWidget row -->'), 2000)
+        self.assertIn('leaf', out)
+
+    def test_overridden_render(self):
+        class Upper(DWidget):
+            def render(self):
+                return 'UPPER'
+        self.assertEqual(WList(Text('a'), Upper()).render(), 'a\nUPPER')
+
+
+class DTemplateTest(TestCase):
+    """ Compiled templates fill their slots exactly as str.format does. """
+
+    def test_same_as_format(self):
+        text = '<p class="{classes}" style="{{x}} 100%">{content} {n} {content}</p>'
+        xargs = {'classes': 'c', 'content': Text('t'), 'n': 3}
+        self.assertEqual(DTemplate(text).fill(xargs), text.format(**xargs))
+
+    def test_not_simple(self):
+        text = '{a!r} {b:>3} {c[0]}'
+        tpl = DTemplate(text)
+        self.assertFalse(tpl.simple)
+        self.assertEqual(tpl.format(a='a', b='b', c='c'), text.format(a='a', b='b', c='c'))
+
+    def test_missing_field(self):
+        self.assertRaises(KeyError, DTemplate('{a}{b}').fill, {'a': 1})
+
+    def test_registry(self):
+        self.assertIs(DTemplate.get('{registry_test}'), DTemplate.get('{registry_test}'))
+
+
+class ListRenderTest(TestCase):
+    """ Widgets over lists fill their shared template once per element. """
+
+    def test_text_list(self):
+        out = Text(['a', ['b', ('c',)], Text('d', para=True)], classes='x').render()
+        self.assertEqual(out, '<span class="x" style="">a</span><span class="x" style="">b</span>'
+                              '<span class="x" style="">c</span>'
+                              '<span class="x" style=""><p class="" style="">d</p></span>')
+
+    def test_render_twice(self):
+        widget = Text(['a', 'b'])
+        self.assertEqual(widget.render(), 'ab')
+        self.assertEqual(widget.render(), 'ab')
+
+    def test_flatten(self):
+        self.assertEqual(flatten(('a', ['b', ('c',)], 'd')), ['a', 'b', 'c', 'd'])
+
+
+class Counted(DWidget):
+    """ Widget that counts how often it generates. """
+    generated = 0
+
+    def generate(self):
+        Counted.generated += 1
+        return 'counted:' + ''.join(self.args)
+
+
+class FragmentCacheTest(TestCase):
+    """ Cached widgets render their children once and are keyed by their arguments. """
+
+    def setUp(self):
+        fragment_cache().clear()
+        Counted.generated = 0
+
+    def test_hit_skips_children(self):
+        self.assertEqual(Row(Column(Counted('a'), cache=True)).render(), Row(Column(Counted('a'))).render())
+        self.assertEqual(Counted.generated, 2)
+        Row(Column(Counted('a'), cache=True)).render()
+        self.assertEqual(Counted.generated, 2)
+        self.assertEqual(Column(Counted('b'), cache=True).render(), Column(Counted('b')).render())
+        self.assertEqual(Counted.generated, 4)
+
+    def test_cache_key(self):
+        self.assertEqual(Counted('a', cache_key='k').render(), 'counted:a')
+        self.assertEqual(Counted('b', cache_key='k').render(), 'counted:a')
+
+    def test_graph(self):
+        hits = fragment_cache().stats()['hits']
+        html = GraphCK('pie', [['a', 1]], cache_key='graph').render()
+        self.assertIn('[["a", 1]]', html)
+        self.assertEqual(GraphCK('pie', [['zzz', 2]], cache_key='graph').render(), html)
+        self.assertEqual(Row(GraphCK('pie', [['zzz', 2]], cache_key='graph')).render(), Row(html).render())
+        auto = GraphCK('bar', [['b', 3]], cache=True).render()
+        self.assertEqual(GraphCK('bar', [['b', 3]], cache=True).render(), auto)
+        self.assertEqual(fragment_cache().stats()['hits'] - hits, 3)
+
+    def test_uncacheable(self):
+        for _ in range(2):
+            widget = Counted('a', cache=True)
+            widget.extra = object()
+            self.assertEqual(widget.render(), 'counted:a')
+        self.assertEqual(Counted.generated, 2)
+
+
+class LRUCacheTest(TestCase):
+    """ The in-process cache evicts the least recently used and expired entries. """
+
+    def test_lru(self):
+        cache = LRUCache(max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), (1, None, 3))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_timeout(self):
+        cache = LRUCache(timeout=0.01)
+        cache.set('a', 1)
+        cache.set('b', 2, None)
+        time.sleep(0.02)
+        self.assertEqual((cache.get('a'), cache.get('b')), (None, 2))
+        self.assertEqual(cache.stats()['hits'], 1)
+
+
+class DjangoCacheTest(TestCase):
+    """ A cache kept in a Django cache backend clears only its own keys. """
+
+    def test_clear(self):
+        cache = DjangoCache('cleartest', 'default')
+        cache.backend.set('other', 1)
+        cache.set('a', 2)
+        self.assertEqual(cache.get('a'), 2)
+        cache.clear()
+        self.assertEqual((cache.get('a'), cache.backend.get('other')), (None, 1))
+        cache.set('a', 3)
+        self.assertEqual(cache.get('a'), 3)
+
+
+class CachedPage(DPage):
+    """ Cached page that counts how often it generates. """
+    title = 'Cached page'
+    description = 'Page cache test page'
+    tags = ['cachetest']
+    cache_timeout = 60
+    vary_on = ('q',)
+    generated = 0
+
+    def generate(self, request, *args, **kwargs):
+        CachedPage.generated += 1
+        return 'generated {} {}'.format(CachedPage.generated, request.GET.get('q', ''))
+
+
+class PageCacheTest(TestCase):
+    """ Cached DPage(s) generate once, answer conditional requests, and are invalidated by name and tag. """
+
+    def setUp(self):
+        page_cache().clear()
+        CachedPage.generated = 0
+        self.factory = RequestFactory()
+
+    def get(self, path='/dpages/CachedPage', **extra):
+        return CachedPage().get(self.factory.get(path, **extra))
+
+    def test_cached(self):
+        first = self.get()
+        self.assertEqual(first.content, self.get().content)
+        self.assertEqual(CachedPage.generated, 1)
+        self.assertIn('ETag', first)
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 304)
+
+    def test_vary_on(self):
+        self.assertIn('generated 1 a', self.get('/dpages/CachedPage?q=a').content)
+        self.assertIn('generated 2 b', self.get('/dpages/CachedPage?q=b').content)
+        self.assertIn('generated 1 a', self.get('/dpages/CachedPage?q=a&other=1').content)
+
+    def test_invalidate(self):
+        self.get()
+        DPage.invalidate(tags='cachetest')
+        self.get()
+        DPage.invalidate(names=['CachedPage'])
+        self.assertIn('generated 3', self.get().content)
+        DPage.invalidate(tags='othertag')
+        self.assertIn('generated 3', self.get().content)
+
+    def test_versions_kept(self):
+        self.get()
+        version = page_cache_versions().get('version:tag:cachetest')
+        cache = page_cache()
+        for n in range(cache.max_entries):                  # evicts every page, but no version
+            cache.set('filler {}'.format(n), n)
+        self.assertEqual(page_cache_versions().get('version:tag:cachetest'), version)
+
+    def test_no_tags(self):
+        page = CachedPage()
+        page.tags = None
+        self.assertIn('generated 1', page.get(self.factory.get('/dpages/CachedPage')).content)
+
+
+class StreamedPage(DPage):
+    """ Streamed page returning a generator of widgets. """
+    title = 'Streamed page'
+    description = 'Streaming test page'
+    tags = ['streamtest']
+    stream = True
+
+    def generate(self, request, *args, **kwargs):
+        return (Text('row {} '.format(n)) for n in range(3))
+
+
+class BudgetSeen(DWidget):
+    """ Widget that records the render budget it is rendered with. """
+    seen = []
+
+    def generate(self):
+        BudgetSeen.seen.append(widgets._render_state.budget)
+        return 'budget'
+
+
+class BudgetedPage(StreamedPage):
+    """ Streamed page with a render budget. """
+    render_budget = 3
+
+    def generate(self, request, *args, **kwargs):
+        return (BudgetSeen() for n in range(2))
+
+
+class StreamTest(TestCase):
+    """ Streamed pages send the template's head, the content chunk by chunk, and the template's tail. """
+
+    def test_render_iter(self):
+        chunks = list(RenderIter(('a', [Text('b'), (Text(c) for c in 'cd')], 1)))
+        self.assertEqual(chunks, ['a', 'b', 'c', 'd', '1'])
+
+    @staticmethod
+    def layout():
+        return Layout(Row((Column(Counted('a')), Column(Counted('b'), width=6))),
+                      (Text('x'), Panel(Counted('c'), heading='h')),
+                      Row(Column(Panel((Counted('d'), 'e'))), classes='r', cache=True))
+
+    def test_containers(self):
+        Counted.generated = 0
+        chunks = list(RenderIter(self.layout()))
+        self.assertEqual(Counted.generated, 4)
+        self.assertIn('counted:a', chunks)              # each child is a chunk of its own
+        self.assertIn('counted:c', chunks)
+        self.assertEqual(''.join(chunks), self.layout().render())
+        Counted.generated = 0
+        chunks = RenderIter(self.layout())
+        self.assertIn('<div class="row', next(chunks))
+        self.assertEqual(Counted.generated, 0)          # sent before any child is rendered
+
+    def test_budget(self):
+        BudgetSeen.seen = []
+        response = BudgetedPage().get(RequestFactory().get('/dpages/BudgetedPage'))
+        self.assertEqual(BudgetSeen.seen, [])           # rendered while the response is sent
+        self.assertEqual(b''.join(response.streaming_content).count(b'budget'), 2)
+        self.assertEqual(BudgetSeen.seen, [3, 3])
+
+    def test_stream(self):
+        request = RequestFactory().get('/dpages/StreamedPage')
+        response = StreamedPage().get(request)
+        self.assertTrue(response.streaming)
+        streamed = b''.join(response.streaming_content)
+
+        class Whole(StreamedPage):
+            stream = False
+
+            def generate(self, request, *args, **kwargs):
+                return 'row 0 row 1 row 2 '
+        self.assertEqual(streamed, Whole().get(request).content)
+
+
+class RegistryTest(TestCase):
+    """ The DPage register's tag index and positions follow pages as they are added and removed. """
+
+    def setUp(self):
+        attrs = {'title': 'Registry page', 'description': 'Registry test page', 'tags': ['registrytest'],
+                 'generate': lambda self, request, *args, **kwargs: ''}
+        self.pages = [type(str('RegistryPage{}'.format(n)), (DPage,), dict(attrs)) for n in range(3)]
+
+    def tearDown(self):
+        for page in self.pages:
+            DPage.unregister(page)
+
+    def test_find(self):
+        self.assertEqual([p['cls'] for p in DPage.find('registrytest')], self.pages)
+        self.assertEqual(DPage.find('no such tag'), [])
+
+    def test_next_prev(self):
+        first, second, third = [page() for page in self.pages]
+        self.assertEqual(first.next('registrytest'), 'RegistryPage1')
+        self.assertEqual(first.prev('registrytest'), 'RegistryPage2')
+        self.assertEqual(third.siblings('registrytest', obj=True),
+                         ({'cls': self.pages[1], 'name': 'RegistryPage1'},
+                          {'cls': self.pages[0], 'name': 'RegistryPage0'}))
+        self.assertIsNone(first.next('test'))
+
+    def test_unregister(self):
+        DPage.unregister('RegistryPage1')
+        self.assertNotIn('RegistryPage1', DPage.pages_dict)
+        self.assertEqual(self.pages[0]().next('registrytest'), 'RegistryPage2')
+        self.assertIsNone(self.pages[1]().next('registrytest'))
+        self.assertEqual(DPage.pages_list[-1]['name'], 'RegistryPage2')
+
+
+class Overlap(object):
+    """ Counts the calls of slow running at the same time.  Each call waits, up to wait seconds, until expect
+    calls have run together, so concurrency is checked without depending on timing.
+    """
+    condition = threading.Condition()
+    running = most = 0
+    expect = 1
+    wait = 5
+
+    @classmethod
+    def reset(cls, expect=1, wait=5):
+        cls.running = cls.most = 0
+        cls.expect, cls.wait = expect, wait
+
+
+def slow(value, seconds=None):
+    with Overlap.condition:
+        Overlap.running += 1
+        Overlap.most = max(Overlap.most, Overlap.running)
+        Overlap.condition.notify_all()
+        deadline = time.time() + (Overlap.wait if seconds is None else seconds)
+        while Overlap.most < Overlap.expect and time.time() < deadline:
+            Overlap.condition.wait(deadline - time.time())
+        Overlap.running -= 1
+    return value
+
+
+class ConcurrentPage(AsyncDPage):
+    """ Page whose coroutine generate yields Data twice. """
+    title = 'Concurrent page'
+    description = 'AsyncDPage test page'
+    tags = ['asynctest']
+
+    def generate(self, request, *args, **kwargs):
+        a, b = yield Data(slow, 'a'), Data(slow, 'b')
+        values = yield {'c': Data(slow, 'c')}
+        yield Row(Text(a + b + values['c']), Text(Data(slow, 'd')))
+
+
+class DataTest(TestCase):
+    """ Data is resolved lazily when rendered and concurrently by AsyncDPage. """
+
+    def setUp(self):
+        Overlap.reset(expect=2)
+
+    def test_render(self):
+        data = Data(lambda: Text('x'))
+        self.assertEqual(Row(data).render(), Row(Text('x')).render())
+        self.assertTrue(data.resolved)
+
+    def test_find_and_gather(self):
+        a, b = Data(slow, 1), Data(slow, 2)
+        self.assertItemsEqual(find_data(Panel(Row(a), heading=b)), [a, b])
+        self.assertEqual(gather([a, b]), [1, 2])
+        self.assertEqual(Overlap.most, 2)
+
+    def test_async_page(self):
+        response = ConcurrentPage().get(RequestFactory().get('/dpages/ConcurrentPage'))
+        self.assertEqual(Overlap.most, 2)                # a and b together
+        self.assertIn(Row(Text('abc'), Text('d')).render(), response.content.decode('utf8'))
+
+
+class Failing(DWidget):
+    def generate(self):
+        raise ValueError('failing widget')
+
+
+class ParallelRenderTest(TestCase):
+    """ Parallel widgets render their children concurrently, in order, within the render budget. """
+
+    def setUp(self):
+        Overlap.reset()
+
+    def content(self):
+        return (Text(Data(slow, 'a')), Row((Column(Data(slow, 'b')), Column('c'))), Text(Data(slow, 'd')))
+
+    def test_same_output(self):
+        Overlap.reset(expect=2)
+        with render_budget(4):
+            parallel = WList(*self.content(), parallel=True).render()
+        self.assertGreaterEqual(Overlap.most, 2)
+        Overlap.reset(expect=2, wait=0.1)
+        self.assertEqual(parallel, WList(*self.content()).render())
+        self.assertEqual(Overlap.most, 1)               # sequential
+
+    def test_budget(self):
+        for budget in (1, 2):
+            Overlap.reset(expect=budget + 1, wait=0.1)      # each call waits for company beyond the budget
+            with render_budget(budget):
+                WList(*self.content(), parallel=True).render()
+            self.assertLessEqual(Overlap.most, budget)
+
+    def test_nested_and_errors(self):
+        inner = Row((Column('a'), Column('b')), parallel=True)
+        self.assertEqual(WList(inner, 'x', parallel=True).render(),
+                         WList(Row((Column('a'), Column('b'))), 'x').render())
+        self.assertRaises(ValueError, WList(Text('a'), Failing(), parallel=True).render)
+
+
+class GraphTest(TestCase):
+    """ GraphCK emits exactly what the chartkick template tags emit. """
+
+    def template_html(self, tag, data):
+        html = Template('{% load chartkick %}{% ' + tag + ' %}').render(Context({'data': data}))
+        return re.sub(r'chart-\d+', 'chart-n', html)
+
+    def graph_html(self, *args):
+        return re.sub(r'chart-\d+', 'chart-n', GraphCK(*args).render())
+
+    def test_same_as_template(self):
+        data = [['a', 1], ['b', 2.5]]
+        self.assertEqual(self.graph_html('pie', data), self.template_html('pie_chart data', data))
+        self.assertEqual(self.graph_html('line', data, {'height': '400px', 'min': 1, 'title.text': 'T'}),
+                         self.template_html("line_chart data with height='400px' min='1' "
+                                            "library={'title': {'text': 'T'}}", data))
+
+    def test_options_unchanged(self):
+        options = {'height': '400px', 'title.text': 'T'}
+        graph = GraphCK('bar', Data(lambda: [['a', 1]]), options)
+        self.assertEqual(self.graph_html('bar', [['a', 1]], options), re.sub(r'chart-\d+', 'chart-n', graph.render()))
+        self.assertEqual(options, {'height': '400px', 'title.text': 'T'})
+
+
+class DownsampleTest(TestCase):
+    """ Downsampling keeps at most max_points points per series, NumPy and Python select the same points. """
+
+    def setUp(self):
+        rnd = random.Random(0)
+        self.points = [[x, rnd.randint(0, 1000)] for x in range(5000)]
+
+    def test_forms(self):
+        lttb = downsample(self.points, 100)
+        self.assertEqual(len(lttb), 100)
+        self.assertEqual((lttb[0], lttb[-1]), (self.points[0], self.points[-1]))
+        self.assertLessEqual(len(downsample(dict(self.points), 100, 'minmax')), 100)
+        series = downsample([{'name': 'a', 'data': self.points}, {'name': 'b', 'data': self.points[:50]}], 100)
+        self.assertEqual([(s['name'], len(s['data'])) for s in series], [('a', 100), ('b', 50)])
+        self.assertRaises(ValueError, downsample, self.points, 100, 'median')
+
+    def test_minmax_keeps_extremes(self):
+        self.points[1234][1] = 5000
+        self.assertIn([1234, 5000], downsample(self.points, 10, 'minmax'))
+
+    @unittest.skipIf(graph.numpy is None, 'NumPy is not installed')
+    def test_numpy_same_as_python(self):
+        xs, ys = zip(*self.points)
+        self.assertEqual(graph._lttb_numpy(xs, ys, 100), graph._lttb_python(xs, ys, 100))
+        self.assertEqual(graph._minmax_numpy(xs, ys, 100), graph._minmax_python(xs, ys, 100))
+
+    def test_graph_option(self):
+        html = GraphCK('line', self.points, {'max_points': 100, 'downsample': 'minmax'}).render()
+        self.assertEqual(html.count('], ['), 99)
+        self.assertNotIn('max_points', html)
+        self.assertEqual(GraphCK('pie', self.points, {'max_points': 100}).render().count('], ['), 4999)
+
+
+_point_calls = []
+
+
+def points(n):
+    """ Module level chart data function, so deferred graphs of it have a stable URL. """
+    _point_calls.append(n)
+    return [[x, x % 7] for x in range(n)]
+
+
+class DeferredGraphTest(TestCase):
+    """ Deferred graphs render a placeholder, ChartDataView serves their data. """
+
+    def setUp(self):
+        chart_data_cache().clear()
+        del _point_calls[:]
+
+    def url(self, graph):
+        return re.search(r'"(/dpages/chart_data/[0-9a-f]+)"', graph.render()).group(1)
+
+    def test_placeholder(self):
+        graph = GraphCK('line', Data(points, 50), {'height': '400px', 'max_points': 10}, defer=True)
+        self.assertEqual(find_data(Row(Column(graph))), [])
+        url = self.url(graph)
+        self.assertEqual(_point_calls, [])
+        self.assertEqual(self.url(GraphCK('line', Data(points, 50), {'max_points': 10}, defer=True)), url)
+        self.assertNotEqual(self.url(GraphCK('line', Data(points, 60), {'max_points': 10}, defer=True)), url)
+        self.assertNotEqual(self.url(GraphCK('line', Data(lambda: points(50)), defer=True)),
+                            self.url(GraphCK('line', Data(lambda: points(50)), defer=True)))
+
+    def test_endpoint(self):
+        url = self.url(GraphCK('line', Data(points, 50), {'max_points': 10}, defer=True))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), downsample(points(50), 10))
+        self.assertEqual(set(response['Cache-Control'].split(', ')), set(['max-age=60', 'public']))
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(_point_calls, [50, 50])                # once by the endpoint, once above
+
+        self.assertEqual(self.url(GraphCK('bar', points(500), defer=True)),
+                         self.url(GraphCK('bar', points(500), defer=True)))
+        url = self.url(GraphCK('bar', points(500), defer=True))
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.GzipFile(fileobj=StringIO.StringIO(response.content)).read()), points(500))
+        self.assertEqual(self.client.get(url, HTTP_ACCEPT_ENCODING='gzip',
+                                         HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get('/dpages/chart_data/0123abcd').status_code, 404)
+
+
+class LazyPage(AsyncDPage):
+    """ Page with Lazy content, the second Lazy is within the first. """
+    title = 'Lazy page'
+    description = 'Lazy content test page'
+    tags = ['lazytest']
+
+    def generate(self, request, *args, **kwargs):
+        return WList(Text('top'), Lazy(WList(Counted('below'), Lazy(Text(Data(slow, 'nested', 0)))), height='50px'),
+                     Lazy(Text('audit'), name='audit', prefetch=True))
+
+
+class LazyTest(TestCase):
+    """ Lazy content is not rendered with the page, the page serves it as a fragment. """
+
+    def setUp(self):
+        Counted.generated = 0
+
+    def get(self, path):
+        return LazyPage().get(RequestFactory().get(path)).content.decode('utf8')
+
+    def test_page(self):
+        html = self.get('/dpages/LazyPage?q=1')
+        self.assertIn('top', html)
+        self.assertNotIn('below', html)
+        self.assertNotIn('nested', html)
+        self.assertEqual(Counted.generated, 0)
+        self.assertIn('data-url="/dpages/LazyPage?q=1&amp;dpage_fragment=0"', html)
+        self.assertIn('data-url="/dpages/LazyPage?q=1&amp;dpage_fragment=audit"', html)
+        self.assertIn('min-height: 50px;', html)
+        self.assertIn('if (true)', html)                # prefetch of audit
+
+    def test_fragments(self):
+        html = self.get('/dpages/LazyPage?dpage_fragment=0')
+        self.assertIn('counted:below', html)
+        self.assertIn('data-url="/dpages/LazyPage?dpage_fragment=1"', html)
+        self.assertNotIn('top', html)
+        self.assertNotIn('<html', html)
+        self.assertEqual(self.get('/dpages/LazyPage?dpage_fragment=1'), Text('nested').render())
+        self.assertEqual(self.get('/dpages/LazyPage?dpage_fragment=audit'), Text('audit').render())
+        response = LazyPage().get(RequestFactory().get('/dpages/LazyPage?dpage_fragment=9'))
+        self.assertEqual(response.status_code, 404)
+
+    def test_outside_page(self):
+        lazy = Lazy(Row(Text('x')))
+        self.assertEqual(lazy_widgets(Panel(Row(lazy), heading='h')), [lazy])
+        self.assertEqual(lazy.render(), Row(Text('x')).render())
+
+
+USER_PAGE = """
+import os
+from djangopages.pages.dpage import DPage
+
+
+class SandboxedPage(DPage):
+    title = 'Sandboxed page'
+    description = 'Sandbox test page'
+    tags = ['sandboxtest']
+
+    def generate(self, request, *args, **kwargs):
+        return 'pid {} n {}'.format(os.getpid(), request.GET['n'])
+"""
+
+
+class SandboxTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = SandboxPool(1, timeout=5, memory=1024)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.shutdown()
+
+    def run_code(self, text, local_context=None, **kwargs):
+        return self.pool.run(compile(text, '<test>', 'exec'), local_context or {}, **kwargs)
+
+    def test_run(self):
+        names = self.run_code('import os\nn = int(number) * 2\npid = os.getpid()', {'number': '4'})
+        self.assertEqual((names['n'], names['number']), (8, '4'))
+        self.assertNotIn('os', names)                   # modules do not pickle
+        self.assertNotEqual(names['pid'], os.getpid())
+        names = self.run_code('title = GraphPage.__name__', namespace='graphpages.query.query_namespace')
+        self.assertEqual(names['title'], 'GraphPage')
+
+    def test_error(self):
+        with self.assertRaises(SandboxError) as error:
+            self.run_code('x = 1\nundefined_name')
+        self.assertEqual(error.exception.error_type, 'NameError')
+        self.assertIn('<test>', error.exception.remote_traceback)
+
+    def test_timeout(self):
+        start = time.time()
+        self.assertRaises(SandboxTimeout, self.run_code, 'while True: pass', timeout=0.5)
+        self.assertLess(time.time() - start, 3)
+        self.assertEqual(self.run_code('n = 1')['n'], 1)  # the worker was replaced
+
+    def test_wait_counts(self):
+        busy = threading.Thread(target=self.run_code, args=('import time\ntime.sleep(1)',))
+        busy.start()
+        while not self.pool._idle.empty():
+            time.sleep(0.01)
+        # waits about 1s for the worker, leaving about 1.5s of the 2.5s for a 2s script
+        self.assertRaises(SandboxTimeout, self.run_code, 'import time\ntime.sleep(2)', timeout=2.5)
+        busy.join()
+
+    def test_memory(self):
+        with self.assertRaises(SandboxError) as error:
+            self.run_code('x = " " * (2 ** 31)', memory=512)
+        self.assertEqual(error.exception.error_type, 'MemoryError')
+        self.assertEqual(self.run_code('x = len(" " * (2 ** 20))')['x'], 2 ** 20)
+
+    @override_settings(DPAGE_SANDBOX_WORKERS=1)
+    def test_user_page(self):
+        set_sandbox_pool(SandboxPool(1, timeout=2))
+        try:
+            self.assertEqual(DUserPage.xexec('x = 1\nclass P(object): pass')[0], {'x': 1})   # classes stay there
+            objs, errors = DUserPage.xexec('import time\nwhile True: time.sleep(0.1)')
+            self.assertIsNone(objs)
+            self.assertIn('sandbox error', errors)
+            html, errors = DUserPage.render(USER_PAGE, 'SandboxedPage', '/dpages/SandboxedPage', {'n': '7'})
+            self.assertIsNone(errors)
+            self.assertIn('</html>', html)
+            pid, n = re.search(r'pid (\d+) n (\d+)', html).groups()
+            self.assertNotEqual(int(pid), os.getpid())  # generated in the worker
+            self.assertEqual(n, '7')
+            runaway = USER_PAGE.replace('return', 'while True:\n            pass\n        return')
+            html, errors = DUserPage.render(runaway, 'SandboxedPage')
+            self.assertIsNone(html)
+            self.assertIn('ran longer', errors)
+        finally:
+            set_sandbox_pool(None)
+
+    @override_settings(DPAGE_SANDBOX_WORKERS=1)
+    def test_forked_process(self):
+        inherited = SandboxPool(0)
+        inherited.pid = -1                              # as if created by the process this one was forked from
+        set_sandbox_pool(inherited)
+        try:
+            pool = sandbox_pool()
+            self.assertIsNot(pool, inherited)
+            self.assertEqual(pool.pid, os.getpid())
+            self.assertIs(sandbox_pool(), pool)
+        finally:
+            set_sandbox_pool(None)
+
+
+class SandboxDatabaseTest(TestCase):
+    """ Scripts in sandbox workers query the database through their own connections.  The in-memory test
+    database is not shared with the workers, so the test copies it to a file the workers open.
+    """
+
+    def test_query(self):
+        User.objects.create(username='sandboxed')
+        handle, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        copy = sqlite3.connect(path)
+        copy.executescript('\n'.join(connection.connection.iterdump()))
+        copy.close()
+        name = connection.settings_dict['NAME']
+        connection.settings_dict['NAME'] = path         # the workers are forked with the file's name
+        try:
+            pool = SandboxPool(1, timeout=5)
+        finally:
+            connection.settings_dict['NAME'] = name
+        try:
+            names = pool.run(compile('from django.contrib.auth.models import User\n'
+                                     'users = list(User.objects.values_list("username", flat=True))',
+                                     '<test>', 'exec'), {})
+        finally:
+            pool.shutdown()
+            os.remove(path)
+        self.assertEqual(names['users'], ['sandboxed'])
@@ -24,6 +24,11 @@ __email__ = 'rbell01824@gmail.com'
 
 import sys
 
+from django.conf import settings
+from django.test.client import RequestFactory
+
+from djangopages.sandbox import sandbox_pool, SandboxError
+
 
 # class Singleton(type):
 #     _instances = {}
@@ -52,6 +57,15 @@ class DUserPage(object):
     saved as attributes of DUserPage and DUserPage.errors set to None.  Otherwise,
     DUserPage.errors is set to error text hopefully useful for finding the error in the source_code.
 
+    When settings.DPAGE_SANDBOX_WORKERS is set user code is never exec(ed) in this process.  It runs in a
+    djangopages.sandbox worker, with the sandbox's time and memory limits, and only the objects that pickle come
+    back, so classes do not.  Use DUserPage.render to get the HTML of a DPage the code defines, its generate
+    then runs in the worker too.
+
+    .. sourcecode:: python
+
+        html, errors = DUserPage.render(source_code, 'SalesPage', '/dpages/sales', {'region': 'east'})
+
     :param code: DPage and other class code
     :type code: str or unicode
     :return: None, sets DUserPage.objs to objects created.  Sets DUserPage.errors to error text.
@@ -110,11 +124,45 @@ class DUserPage(object):
         compile_obj, errors = cls.compile(code)
         if not compile_obj:
             return compile_obj, errors
+        pool = sandbox_pool()
+        if pool is not None:
+            try:
+                return pool.run(compile_obj, {}), errors
+            except SandboxError as e:
+                return None, 'sandbox error: {}\n{}'.format(e, e.remote_traceback)
         global_dict = dict()
         local_dict = dict()
         exec(compile_obj, global_dict, local_dict)
         return local_dict, errors
 
+    @classmethod
+    def render(cls, code, page, path='/', query=None):
+        """ Compile code and return the HTML of its DPage class named page for a GET of path, and error string.
+        If the sandbox is enabled the page is generated and rendered in a sandbox worker.
+
+        :param code: code
+        :type code: str or unicode
+        :param page: name of the DPage class the code defines
+        :type page: unicode
+        :param path: request path
+        :type path: unicode
+        :param query: request query parameters
+        :type query: dict or None
+        :return: tuple of html, error_string.  html is None if there were errors.
+        :rtype: tuple
+        """
+        compile_obj, errors = cls.compile(code)
+        if not compile_obj:
+            return None, errors
+        pool = sandbox_pool()
+        if pool is None:
+            return render_page(code, page, path, query), None
+        try:
+            names = pool.run(_render_script, {'code': code, 'page': page, 'path': path, 'query': query or {}})
+        except SandboxError as e:
+            return None, 'sandbox error: {}\n{}'.format(e, e.remote_traceback)
+        return names['html'], None
+
     @classmethod
     def xglobal(cls, code):
         """ Compile code and return dict of compiled objects and error string.
@@ -131,3 +179,27 @@ class DUserPage(object):
             setattr(cls, key, value)
         return objs_dict, errors
 DUP = DUserPage
+
+_render_script = compile('from djangopages.userpages.dpageuser import render_page\n'
+                         'html = render_page(code, page, path, query)\n', '<duserpage render>', 'exec')
+
+
+def render_page(code, page, path='/', query=None):
+    """ Exec code and return the HTML of its DPage class named page for a GET of path.  DUserPage.render runs
+    this in a sandbox worker.
+
+    :param code: code
+    :type code: str or unicode
+    :param page: name of the DPage class the code defines
+    :type page: unicode
+    :param path: request path
+    :type path: unicode
+    :param query: request query parameters
+    :type query: dict or None
+    :rtype: unicode
+    """
+    namespace = dict()
+    exec(compile(code, '<string>', 'exec'), namespace)
+    response = namespace[page]().get(RequestFactory().get(path, query or {}))
+    content = b''.join(response.streaming_content) if response.streaming else response.content
+    return content.decode(settings.DEFAULT_CHARSET)
@@ -37,7 +37,7 @@ import functools
 
 # noinspection PyProtectedMember
 from djangopages.libs import unique_name, ssw
-from djangopages.widgets.widgets import DWidget, DWidgetT
+from djangopages.widgets.widgets import DWidget, DWidgetT, DTemplate
 
 ########################################################################################################################
 #
@@ -280,6 +280,8 @@ class Glyphicon(DWidget):
     :return: Glyphicon html
     :rtype: unicode
     """
+    template = DTemplate('<span class="glyphicon {glyph} {classes}" style="{style}"></span>')
+
     def __init__(self, glyph, classes='', style=''):
         super(Glyphicon, self).__init__(glyph, classes, style)
         return
@@ -293,9 +295,8 @@ class Glyphicon(DWidget):
             for g in glyph:
                 rtn += Glyphicon(g, classes, style)
             return rtn
-        template = '<span class="glyphicon {glyph} {classes}" style="{style}"></span>'
         glyph = ssw(glyph, 'glyphicon-')
-        rtn = template.format(glyph=glyph, classes=classes, style=style)
+        rtn = self.template.format(glyph=glyph, classes=classes, style=style)
         return rtn
 GL = functools.partial(Glyphicon)
 
@@ -329,11 +330,12 @@ class Hn(DWidget):
     :return: HTML H html
     :rtype: unicode
     """
+    template = DTemplate('<h{level} {classes} {style}>\n'
+                         '    {heading}\n'
+                         '</h{level}>')
+
     def __init__(self, heading, level=3, classes='', style=''):
-        template = '<h{level} {classes} {style}>\n' \
-                   '    {heading}\n' \
-                   '</h{level}>'
-        super(Hn, self).__init__('heading', template,
+        super(Hn, self).__init__('heading', self.template,
                                  {'heading': heading, 'level': str(level), 'classes': classes, 'style': style})
         return
 H1 = functools.partial(Hn, level=1)
@@ -363,13 +365,15 @@ class Header(DWidget):
 
     .. note:: The heading argument is typically an Hn widget.
     """
+    template = DTemplate('<!-- header start -->\n'
+                         '    <div class="page-header {classes}" style="{style}">\n'
+                         '        {heading}\n'
+                         '    </div>'
+                         '<!-- header end -->\n')
+
     def __init__(self, heading='', classes='', style=''):
-        template = '<!-- header start -->\n' \
-                   '    <div class="page-header {classes}" style="{style}">\n' \
-                   '        {heading}\n' \
-                   '    </div>' \
-                   '<!-- header end -->\n'
-        super(Header, self).__init__('heading', template, {'heading': heading, 'classes': classes, 'style': style})
+        super(Header, self).__init__('heading', self.template,
+                                     {'heading': heading, 'classes': classes, 'style': style})
         return
 
 
@@ -390,13 +394,14 @@ class Jumbotron(DWidget):
     :return: Glyphicon html
     :rtype: unicode
     """
+    template = DTemplate('<!-- jumbotron start -->'
+                         '<div class="jumbotron">\n'
+                         '    {content}\n'
+                         '</div>\n'
+                         '<!-- jumbotron end -->')
+
     def __init__(self, content, classes='', style=''):
-        template = '<!-- jumbotron start -->' \
-                   '<div class="jumbotron">\n' \
-                   '    {content}\n' \
-                   '</div>\n' \
-                   '<!-- jumbotron end -->'
-        super(Jumbotron, self).__init__('content', template,
+        super(Jumbotron, self).__init__('content', self.template,
                                         {'content': content, 'classes': classes, 'style': style})
         return
 
@@ -420,9 +425,10 @@ class Label(DWidget):
     :return: label html
     :rtype: unicode
     """
+    template = DTemplate('<span class="label {label_type} {classes}" style="{style}">{content}</span>')
+
     def __init__(self, content, label_type='label-default', classes='', style=''):
-        template = '<span class="label {label_type} {classes}" style="{style}">{content}</span>'
-        super(Label, self).__init__('content', template,
+        super(Label, self).__init__('content', self.template,
                                     {'label_type': label_type, 'content': content,
                                      'classes': classes, 'style': style})
         return
@@ -480,9 +486,10 @@ class Link(DWidget):
     | LNKXSDanger = functools.partial(Link, button='btn-danger', size='btn-xs')    
     """
 
+    template = DTemplate('<a href="{href}" class="{classes}" style="{style}" '
+                         ' {disabled} {role}>{text}</a>')
+
     def __init__(self, href, text, button='btn-default', size='', disabled=False, classes='', style=''):
-        template = '<a href="{href}" class="{classes}" style="{style}" ' \
-                   ' {disabled} {role}>{text}</a>'
         if disabled:
             disabled = 'disabled="disabled" '
         else:
@@ -495,7 +502,7 @@ class Link(DWidget):
                 size = 'btn-' + size
             classes = 'btn {button} {size} {classes}'.format(button=button, size=size, classes=classes)
             role = 'role="button" '
-        super(Link, self).__init__('', template,
+        super(Link, self).__init__('', self.template,
                                    {'href': href, 'classes': classes, 'style': style,
                                     'disabled': disabled, 'role': role, 'text': text})
         return
@@ -543,6 +550,20 @@ class Modal(DWidgetT):
     :param modal_size: modal size per bootstrap
     :type modal_size: str or unicode
     """
+    template = DTemplate('<!-- Modal --> \n'
+                         '{button}\n'
+                         '<div class="modal fade" id={modal_id} tabindex="-1" role="dialog" '
+                         '    aria-labelledby="{modal_label}" aria-hidden="True">\n'
+                         '    <div class="modal-dialog {modal_size}">\n'
+                         '        <div class="modal-content">\n'
+                         '{header}\n'
+                         '{body}\n'
+                         '{footer}\n'
+                         '        </div>\n'
+                         '    </div>\n'
+                         '</div>\n'
+                         '<!-- / Modal --> \n')
+
     def __init__(self, header='', body='Body must be defined', footer='', button='Show', modal_size=''):
         modal_id = unique_name('id_m')
         modal_label = unique_name('lbl_m')
@@ -555,21 +576,8 @@ class Modal(DWidgetT):
             body = ModalBody(body)
         if footer and not isinstance(footer, ModalFooter):
             footer = ModalFooter(footer)
-        template = '<!-- Modal --> \n' \
-                   '{button}\n' \
-                   '<div class="modal fade" id={modal_id} tabindex="-1" role="dialog" ' \
-                   '    aria-labelledby="{modal_label}" aria-hidden="True">\n' \
-                   '    <div class="modal-dialog {modal_size}">\n' \
-                   '        <div class="modal-content">\n' \
-                   '{header}\n' \
-                   '{body}\n' \
-                   '{footer}\n' \
-                   '        </div>\n' \
-                   '    </div>\n' \
-                   '</div>\n' \
-                   '<!-- / Modal --> \n'
         modal_size = ssw(modal_size, 'modal-')
-        super(Modal, self).__init__(template,
+        super(Modal, self).__init__(self.template,
                                     {'header': header, 'body': body, 'footer': footer, 'button': button,
                                      'modal_size': modal_size, 'modal_id': modal_id, 'modal_label': modal_label})
         return
@@ -582,12 +590,13 @@ class ModalBody(DWidgetT):
     :return: body HTML
     :rtype: unicode
     """
+    template = DTemplate('<div class="modal-body">\n'
+                         '    {body}\n'
+                         '</div>\n')
+
     # noinspection PyMethodOverriding
     def __init__(self, body):
-        template = '<div class="modal-body">\n' \
-                   '    {body}\n' \
-                   '</div>\n'
-        super(ModalBody, self).__init__(template, {'body': body})
+        super(ModalBody, self).__init__(self.template, {'body': body})
         return
 
 
@@ -611,19 +620,20 @@ class ModalButton(DWidgetT):
     :param style: styles to add to output
     :type style: str or unicode
     """
+    template = DTemplate('<button class="btn {button} {size} {classes}" style="{style}" '
+                         '    {disabled} data-toggle="modal" data-target="#{modal_id}">\n'
+                         '    {text}\n'
+                         '</button>\n')
+
     def __init__(self, text='Show', button='btn-default', size='',
                  disabled=False, classes='', style=''):
-        template = '<button class="btn {button} {size} {classes}" style="{style}" ' \
-                   '    {disabled} data-toggle="modal" data-target="#{modal_id}">\n' \
-                   '    {text}\n' \
-                   '</button>\n'
         button = ssw(button, 'btn-')
         size = ssw(size, 'btn-')
         disabled = 'disabled="disabled"' if disabled else ''
         modal_id = None
-        super(ModalButton, self).__init__(template, {'modal_id': modal_id, 'text': text,
-                                                     'button': button, 'size': size, 'disabled': disabled,
-                                                     'classes': classes, 'style': style})
+        super(ModalButton, self).__init__(self.template, {'modal_id': modal_id, 'text': text,
+                                                          'button': button, 'size': size, 'disabled': disabled,
+                                                          'classes': classes, 'style': style})
         return
 
     def set_modal_id(self, modal_id):
@@ -639,15 +649,16 @@ class ModalHeader(DWidgetT):
     :return: HTML for modal header
     :rtype: unicode
     """
+    template = DTemplate('<div class="modal-header"> \n'
+                         '    <button type="button" class="close" data-dismiss="modal">'
+                         '        <span aria-hidden="true">&times;</span><span class="sr-only">Close</span>'
+                         '    </button>\n'
+                         '    {header}\n'
+                         '</div>\n')
+
     # noinspection PyMethodOverriding
     def __init__(self, header):
-        template = '<div class="modal-header"> \n' \
-                   '    <button type="button" class="close" data-dismiss="modal">' \
-                   '        <span aria-hidden="true">&times;</span><span class="sr-only">Close</span>' \
-                   '    </button>\n' \
-                   '    {header}\n' \
-                   '</div>\n'
-        super(ModalHeader, self).__init__(template, {'header': header})
+        super(ModalHeader, self).__init__(self.template, {'header': header})
         return
 
 
@@ -659,12 +670,13 @@ class ModalFooter(DWidgetT):
     :return: HTML for modal footer
     :rtype: unicode
     """
+    template = DTemplate('<div class="modal-footer"> \n'
+                         '    {footer}\n'
+                         '</div>\n')
+
     # noinspection PyMethodOverriding
     def __init__(self, footer):
-        template = '<div class="modal-footer"> \n' \
-                   '    {footer}\n' \
-                   '</div>\n'
-        super(ModalFooter, self).__init__(template, {'footer': footer})
+        super(ModalFooter, self).__init__(self.template, {'footer': footer})
         return
 
 
@@ -698,23 +710,25 @@ class Panel(DWidgetT):
     | PanelDanger = functools.partial(Panel, panel_type='panel-danger')
     """
 
+    template = DTemplate('<div class="panel {panel_type}" >\n '
+                         '    {heading}\n'
+                         '    <div class="panel-body">\n'
+                         '        {body}'
+                         '    </div>\n '
+                         '    {footer}\n'
+                         '</div>')
+    _stream_args = ((1, 'body'),)
+
     def __init__(self, body='', heading='', footer='', panel_type='panel-default'):
         """ Bootstrap panel """
-        template = '<div class="panel {panel_type}" >\n ' \
-                   '    {heading}\n' \
-                   '    <div class="panel-body">\n' \
-                   '        {body}' \
-                   '    </div>\n ' \
-                   '    {footer}\n' \
-                   '</div>'
         if heading and not isinstance(heading, PanelHeading):
             heading = PanelHeading(heading)
         if footer and not isinstance(footer, PanelFooter):
             footer = PanelFooter(footer)
-        super(Panel, self).__init__(template, {'panel_type': panel_type,
-                                               'heading': heading,
-                                               'body': body,
-                                               'footer': footer})
+        super(Panel, self).__init__(self.template, {'panel_type': panel_type,
+                                                    'heading': heading,
+                                                    'body': body,
+                                                    'footer': footer})
         return
 PanelDefault = functools.partial(Panel, panel_type='panel-default')
 PanelPrimary = functools.partial(Panel, panel_type='panel-primary')
@@ -740,12 +754,13 @@ class PanelFooter(DWidgetT):
     :return: HTML for panel footer
     :rtype: unicode
     """
+    template = DTemplate('<div class="panel-footer {classes}" style="{style}">\n'
+                         '    {footer}\n'
+                         '</div>\n')
+
     def __init__(self, footer='', classes='', style=''):
         """ Bootstrap Panel footer """
-        template = '<div class="panel-footer {classes}" style="{style}">\n' \
-                   '    {footer}\n' \
-                   '</div>\n'
-        super(PanelFooter, self).__init__(template, {'classes': classes, 'style': style, 'footer': footer})
+        super(PanelFooter, self).__init__(self.template, {'classes': classes, 'style': style, 'footer': footer})
         return
 
 
@@ -767,19 +782,22 @@ class PanelHeading(DWidgetT):
     :return: HTML for panel heading
     :rtype: unicode
     """
+    template_title = DTemplate('<div class="panel-heading {classes}" style="{style}" >\n'
+                               '    <h{level} class="panel-title" >\n'
+                               '        {heading}\n'
+                               '    </h{level}>'
+                               '</div>\n')
+    template = DTemplate('<div class="panel-heading {classes}" style="{style}" >\n'
+                         '    {heading}\n'
+                         '</div>\n')
+
     def __init__(self, heading='', level=3, classes='', style=''):
         """ Bootstrap Panel heading """
         if level > 0:
-            template = '<div class="panel-heading {classes}" style="{style}" >\n' \
-                       '    <h{level} class="panel-title" >\n' \
-                       '        {heading}\n' \
-                       '    </h{level}>' \
-                       '</div>\n'
+            template = self.template_title
             args = {'classes': classes, 'style': style, 'level': level, 'heading': heading}
         else:
-            template = '<div class="panel-heading {classes}" style="{style}" >\n' \
-                       '    {heading}\n' \
-                       '</div>\n'
+            template = self.template
             args = {'classes': classes, 'style': style, 'heading': heading}
         super(PanelHeading, self).__init__(template, args)
         return
@@ -866,6 +884,10 @@ class Small(DWidget):
     :return: small html
     :rtype: unicode
     """
+    template = DTemplate('<small class="{classes}" style="{style}">\n'
+                         '    {text}\n'
+                         '</small>\n')
+
     # todo 1: rewrite to use DWidget generate
     def __init__(self, text, classes='', style=''):
         super(Small, self).__init__(text, classes, style)
@@ -880,10 +902,7 @@ class Small(DWidget):
             for t in text:
                 rtn += Small(t, classes, style)
             return rtn
-        template = '<small class="{classes}" style="{style}">\n' \
-                   '    {text}\n' \
-                   '</small>\n'
-        rtn = template.format(classes=classes, style=style, text=text)
+        rtn = self.template.format(classes=classes, style=style, text=text)
         return rtn
 
 
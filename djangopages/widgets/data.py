@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+Data
+****
+
+.. module:: data
+   :synopsis: Provides lazy data for DjangoPage widgets
+
+.. moduleauthor:: Richard Bell <rbell01824@gmail.com>
+
+Data wraps a query, or any other function, whose result a widget needs.  The function runs when the data is
+first needed.  AsyncDPage finds the Data in a page's content and runs their functions concurrently on a thread
+pool before the page is rendered, so a page's latency is that of its slowest query rather than the sum of its
+queries.
+
+.. sourcecode:: python
+
+    qs = VSyslog.objects.filter(node__host_name=node)
+    count_by_type = Data(lambda: list(qs.values_list('message_type').annotate(Count('id'))))
+    content = Row(Column(GraphCK('column', count_by_type)), Column(GraphCK('pie', count_by_type)))
+
+10/17/26 - Initial creation
+
+"""
+
+from __future__ import unicode_literals
+# noinspection PyUnresolvedReferences
+import logging
+
+log = logging.getLogger(__name__)
+
+__author__ = 'rbell01824'
+__date__ = '10/17/26'
+__copyright__ = "Copyright 2014, Richard Bell"
+__credits__ = ['rbell01824']
+__license__ = 'All rights reserved'
+__version__ = '0.1'
+__maintainer__ = 'rbell01824'
+__email__ = 'rbell01824@gmail.com'
+
+import threading
+
+from multiprocessing.pool import ThreadPool
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from djangopages.widgets.widgets import DWidget, Render
+
+########################################################################################################################
+#
+# Lazy data
+#
+########################################################################################################################
+
+
+class Data(object):
+    """ Lazy data for widgets.  Data(func, \*args, \*\*kwargs) is replaced by func(\*args, \*\*kwargs) when
+    the widget holding it is rendered.  The function runs at most once.
+
+    .. sourcecode:: python
+
+        Data(qs.count)
+        Data(syslog_query, company, node)
+
+    :param func: function returning the data
+    :type func: callable
+    """
+    def __init__(self, func, *args, **kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.resolved = False
+        self.value = None
+        return
+
+    def resolve(self):
+        """ Run the function if it has not run yet.
+
+        :return: the function's result
+        """
+        if not self.resolved:
+            self.value = self.func(*self.args, **self.kwargs)
+            self.resolved = True
+        return self.value
+
+    def render(self):
+        """ Render the function's result, see Render. """
+        return Render(self.resolve())
+
+    def __unicode__(self):
+        return unicode(self.render())
+
+    def __str__(self):
+        return unicode(self).encode('utf8')
+
+
+def find_data(content):
+    """ Return the unresolved Data in content.  Widget arguments, lists, tuples, and dict values are searched.
+    The arguments of deferred widgets, whose data the browser loads later, are not.
+
+    .. sourcecode:: python
+
+        find_data(Row(Column(GraphCK('pie', Data(get_counts)))))
+
+    :param content: content to search
+    :type content: varies
+    :return: unresolved Data in content, each once
+    :rtype: list
+    """
+    found = []
+    seen = set()
+    stack = [content]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, Data):
+            if not obj.resolved and id(obj) not in seen:
+                seen.add(id(obj))
+                found.append(obj)
+        elif isinstance(obj, DWidget):
+            if not obj._deferred:
+                stack.extend(getattr(obj, 'args', ()))
+        elif isinstance(obj, (list, tuple)):
+            stack.extend(obj)
+        elif isinstance(obj, dict):
+            stack.extend(obj.values())
+    return found
+
+########################################################################################################################
+#
+# Concurrent resolution
+#
+########################################################################################################################
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _thread_pool():
+    """ Return the process wide thread pool of settings.DPAGE_DATA_WORKERS threads. """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPool(getattr(settings, 'DPAGE_DATA_WORKERS', 8))
+    return _pool
+
+
+def _resolve(data):
+    """ Resolve data in a pool thread.  The thread's database connection is closed if it has expired. """
+    try:
+        return data.resolve()
+    finally:
+        close_old_connections()
+
+
+def gather(data):
+    """ Resolve Data concurrently on the thread pool.  The first exception raised by any function is
+    re-raised.
+
+    .. sourcecode:: python
+
+        gather([Data(qs1.count), Data(qs2.count)])
+
+    :param data: Data to resolve
+    :type data: list
+    :return: the results, in the order of data
+    :rtype: list
+    """
+    pending = [d for d in data if not d.resolved]
+    if len(pending) > 1:
+        _thread_pool().map(_resolve, pending, chunksize=1)
+    else:
+        for d in pending:
+            d.resolve()
+    return [d.value for d in data]
@@ -12,6 +12,15 @@ Graph Widgets
 
 DjangoPages provides a number of widgets to create various chartkick graphs.
 
+A graph created with defer=True does not put its data in the page.  The page holds a placeholder whose data is
+the URL of the chart data endpoint, ChartDataView, and chartkick fetches the data once the page is shown.  The
+page renders without running the graph's query, and the data is served with ETag, max-age, and gzip so browsers
+and proxies cache it independently of the page.
+
+.. sourcecode:: python
+
+    GraphCK('line', Data(syslog_histogram, 'BMC_1', bucket='hour'), options={'height': '400px'}, defer=True)
+
 8/4/14 - Initial creation
 
 Widgets
@@ -34,10 +43,32 @@ __maintainer__ = 'rbell01824'
 __email__ = 'rbell01824@gmail.com'
 
 
-from django.template import Context, Template
+import calendar
+import datetime
+import hashlib
+import json
+import operator
+import sys
+import time
+import types
+import uuid
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
+from chartkick.template import CHART_HTML
+from chartkick.templatetags.chartkick import ChartNode
+from django.conf import settings
+from django.core.urlresolvers import reverse
+from django.db.models import Model
+from django.utils.http import quote_etag
+
+from djangopages.cache import named_cache
 from djangopages.libs import dict_nested_set
-from djangopages.widgets.widgets import DWidget
+from djangopages.widgets.data import Data
+from djangopages.widgets.widgets import DWidget, Render, render_cached
 
 ########################################################################################################################
 #
@@ -87,35 +118,52 @@ class GraphCK(DWidget):
     :type data: unicode or list[dict] or list[list] or dict
     :param options: 'with' options for the chartkick graph.  See chartkick
     :type options: dict
+    :param defer: if True the data is not rendered into the page, the browser fetches it from ChartDataView,
+        see register_chart_data
+    :type defer: bool
+
+    .. note:: Line and area graphs with many points may be downsampled.  Set the option max_points, and
+        optionally downsample, 'lttb' (default) or 'minmax'.  See downsample.
+
+        .. sourcecode:: python
+
+            GraphCK('line', syslog_counts, options={'max_points': 1000, 'title.text': 'Syslog records'})
     """
     # noinspection PyShadowingBuiltins
-    def __init__(self, graph_type, data, options=''):
+    def __init__(self, graph_type, data, options='', defer=False):
         """ Create a graph object """
         if not graph_type in LEGAL_GRAPH_TYPES:
             raise ValueError('In Graph illegal graph type {}'.format(graph_type))
         super(GraphCK, self).__init__(graph_type, data, options,)
+        if defer:
+            self._deferred = True
         return
 
+    def render(self):
+        """ Render the graph.  The data is not walked by the render engine, it is serialized as is.  A Data
+        or widget given as the data is rendered first.  A deferred graph renders a placeholder that loads the
+        data from ChartDataView.  A graph created with cache or cache_key is kept in the fragment cache.
+        """
+        return render_cached(self, self._render)
+
+    def _render(self):
+        """ Render the graph, see render. """
+        graph_type, data, options = self.args
+        if self._deferred:
+            url = reverse('dpage_chart_data', args=[register_chart_data(graph_type, data, options)])
+            if options:
+                options = dict((k, v) for k, v in options.items() if k not in ('max_points', 'downsample'))
+            return chart_html(graph_type, url, options)
+        if hasattr(data, 'render'):
+            self.args = (graph_type, data.render(), options)
+        return self.generate()
+
     def generate(self):
+        """ Emit the chart's HTML directly.  The output is the output of the chartkick template tag
+        {% <graph_type>_chart data with <set_options(options)> %}, without building and rendering a template.
+        """
         graph_type, data, options = self.args
-        # log.debug('+++++ in Graph generate')
-        # log.debug('      graph_type <<{}>>'.format(graph_type))
-        # log.debug('      data <<{}>>'.format(data))
-        # log.debug('      options <<{}>>'.format(options))
-        template = '{{% {chart} %}}'
-        if options:
-            options = self.set_options(options)
-            chart = '{gtype}_chart data with {options}'.format(gtype=graph_type, options=options)
-            pass
-        else:
-            chart = '{gtype}_chart data'.format(gtype=graph_type)
-            pass
-        out_chart = template.format(chart=chart)
-        t = Template('{% load chartkick %}' + out_chart)
-        c = Context({'data': data})
-        out = t.render(c)
-        # log.debug('+++++ out <<{}>>'.format(out))
-        return out
+        return chart_html(graph_type, data, options)
 
     @staticmethod
     def set_options(options):
@@ -123,6 +171,8 @@ class GraphCK(DWidget):
         Set chartkick & highchart options
             options = "height='500px' library=" + str(library)
 
+        .. note:: Returns the options as chartkick template tag options.  GraphCK no longer uses template tags,
+            see chart_options.
         """
         out = ''
 
@@ -148,3 +198,354 @@ class GraphCK(DWidget):
         out += " library={}".format(str(library))
 
         return out
+
+
+def chart_options(options):
+    """ Chartkick tag options for GraphCK options.  height, max, and min are chartkick options, all other
+    options are dotted highcharts library options.  options is not changed.
+
+    .. sourcecode:: python
+
+        chart_options({'height': '400px', 'title.text': 'Browser Stats'})
+        # {'height': '400px', 'library': {'title': {'text': 'Browser Stats'}}}
+
+    :param options: GraphCK options
+    :type options: dict
+    :return: chartkick options
+    :rtype: dict
+    """
+    out = {}
+    options = dict(options)
+    for key in ('height', 'max', 'min'):
+        value = options.pop(key, None)
+        if value:
+            out[key] = '{}'.format(value)
+    if options:
+        library = {}
+        for key, value in options.iteritems():
+            dict_nested_set(library, key, value)
+        out['library'] = library
+    return out
+
+
+def chart_html(graph_type, data, options=None):
+    """ Return the chartkick HTML for a chart, exactly as the chartkick template tags do.  Charts share the
+    template tags' id counter and chartkick.json library options.
+
+    .. sourcecode:: python
+
+        chart_html('pie', [['Chrome', 52.9], ['Firefox', 27.7]], {'height': '400px'})
+
+    :param graph_type: 'line', 'pie', 'column', 'bar', or 'area'
+    :type graph_type: unicode
+    :param data: chart data, serialized with json
+    :type data: list or dict
+    :param options: GraphCK options, see chart_options, and max_points and downsample, see downsample
+    :type options: dict
+    :return: chart HTML
+    :rtype: unicode
+    """
+    if callable(data) and not getattr(data, 'do_not_call_in_templates', False):
+        data = data()                           # as the template variable lookup does
+    if options and ('max_points' in options or 'downsample' in options):
+        options = dict(options)
+        max_points = options.pop('max_points', None)
+        method = options.pop('downsample', 'lttb')
+        if max_points and graph_type in ('line', 'area'):
+            data = downsample(data, max_points, method)
+    chart_id = 'chart-%s' % ChartNode.id.next()
+    tag_options = chart_options(options) if options else {}
+    out = dict(id=chart_id, height='300px')
+    out.update(library=ChartNode.library(chart_id))
+    out.update(tag_options)
+    return CHART_HTML.format(name=_CHART_NAMES[graph_type], data=json.dumps(data), options=json.dumps(out), **out)
+
+_CHART_NAMES = dict((graph_type, '{}Chart'.format(graph_type.capitalize())) for graph_type in LEGAL_GRAPH_TYPES)
+
+########################################################################################################################
+#
+# Deferred chart data
+#
+# A deferred graph registers its data source in the chart data cache under a key and the page gets the key's URL.
+# The key is a digest of the graph type, options, and data source when the source is made of module level
+# functions and plain values, so every render of the page gives the same URL and browsers and proxies can cache
+# the data.  Other sources, ex. lambdas or querysets, are registered under a new random key on every render.
+#
+########################################################################################################################
+
+
+def chart_data_cache():
+    """ Return the cache holding deferred chart data sources and their JSON.  If settings.DPAGE_CHART_DATA_CACHE
+    names a Django cache alias they are stored there, otherwise in an in-process LRU cache of at most
+    settings.DPAGE_CHART_DATA_CACHE_SIZE entries.  Sources are kept settings.DPAGE_CHART_DATA_TIMEOUT seconds,
+    default 3600, the JSON settings.DPAGE_CHART_DATA_MAX_AGE seconds, default 60.
+
+    .. note:: With more than one server process the cache must be shared, and Data functions and arguments
+        must then be picklable.
+
+    :rtype: djangopages.cache.LRUCache or djangopages.cache.DjangoCache
+    """
+    return named_cache('chart_data',
+                       alias=getattr(settings, 'DPAGE_CHART_DATA_CACHE', None),
+                       max_entries=getattr(settings, 'DPAGE_CHART_DATA_CACHE_SIZE', 1000),
+                       timeout=getattr(settings, 'DPAGE_CHART_DATA_TIMEOUT', 3600))
+
+
+def register_chart_data(graph_type, data, options=None):
+    """ Register a deferred graph's data source and return its key, see ChartDataView.
+
+    .. sourcecode:: python
+
+        key = register_chart_data('line', Data(syslog_histogram, 'BMC_1', bucket='hour'), {'max_points': 500})
+        reverse('dpage_chart_data', args=[key])     # '/dpages/chart_data/3f0c...'
+
+    :param graph_type: 'line', 'pie', 'column', 'bar', or 'area'
+    :type graph_type: unicode
+    :param data: chart data, a Data or function returning it, or a widget rendering to it
+    :type data: varies
+    :param options: GraphCK options, only max_points and downsample apply to the data
+    :type options: dict
+    :return: the key
+    :rtype: unicode
+    """
+    if isinstance(data, Data):
+        data = Data(data.func, *data.args, **data.kwargs)       # unresolved, the endpoint calls it each time
+    elif callable(data) and not getattr(data, 'do_not_call_in_templates', False):
+        data = Data(data)
+    elif hasattr(data, 'render'):
+        data = data.render()
+    options = options or {}
+    sample = None
+    if options.get('max_points') and graph_type in ('line', 'area'):
+        sample = (options['max_points'], options.get('downsample', 'lttb'))
+    try:
+        key = hashlib.sha1(repr(_stable((sample, data))).encode('utf-8')).hexdigest()
+    except _Unstable:
+        key = uuid.uuid4().hex
+    cache = chart_data_cache()
+    if cache.get('source:' + key) is None:
+        cache.set('source:' + key, {'data': data, 'sample': sample})
+    return key
+
+
+def chart_data(key):
+    """ Return the JSON of the chart data registered under key, computing it at most once every
+    settings.DPAGE_CHART_DATA_MAX_AGE seconds.
+
+    :param key: key from register_chart_data
+    :type key: unicode
+    :return: None if key is unknown or expired, else {'content': JSON, 'etag': quoted ETag,
+        'last_modified': seconds since the epoch}
+    :rtype: dict or None
+    """
+    cache = chart_data_cache()
+    entry = cache.get('json:' + key)
+    if entry is None:
+        source = cache.get('source:' + key)
+        if source is None:
+            return None
+        data = source['data']
+        if isinstance(data, Data):
+            data = Render(data.func(*data.args, **data.kwargs))
+        if source['sample']:
+            data = downsample(data, *source['sample'])
+        content = json.dumps(data)
+        entry = {'content': content,
+                 'etag': quote_etag(hashlib.md5(content.encode('utf-8')).hexdigest()),
+                 'last_modified': int(time.time())}
+        cache.set('json:' + key, entry, getattr(settings, 'DPAGE_CHART_DATA_MAX_AGE', 60))
+    return entry
+
+
+class _Unstable(Exception):
+    """ Raised when a chart data source has no stable key. """
+    pass
+
+_STABLE_SCALARS = (basestring, bool, int, long, float, type(None), datetime.date, datetime.time, datetime.timedelta)
+
+
+def _stable(value):
+    """ Return value as nested tuples of plain values that identify it across renders and processes.  Functions
+    are identified by module and name, model instances by table and primary key.
+
+    :raises _Unstable: if value holds anything else, ex. a lambda, closure, or queryset
+    """
+    if isinstance(value, _STABLE_SCALARS):
+        return value
+    if isinstance(value, Data):
+        return 'Data', _stable(value.func), _stable(value.args), _stable(value.kwargs)
+    if isinstance(value, (list, tuple)):
+        return type(value).__name__, tuple(_stable(v) for v in value)
+    if isinstance(value, dict):
+        return 'dict', tuple(sorted((_stable(k), _stable(v)) for k, v in value.items()))
+    if isinstance(value, Model):
+        return 'Model', value._meta.db_table, value.pk
+    if isinstance(value, types.FunctionType) and not value.__closure__:
+        module = sys.modules.get(value.__module__)
+        if getattr(module, value.__name__, None) is value:
+            return 'function', value.__module__, value.__name__
+    raise _Unstable(type(value).__name__)
+
+########################################################################################################################
+#
+# Downsampling
+#
+# Line and area graphs over large query results are downsampled before they are serialized so the page size and
+# the browser's drawing time stay bounded.  Largest-Triangle-Three-Buckets keeps the points that best preserve
+# the shape of the series, min/max keeps the smallest and largest point of each bucket so spikes are never lost.
+# Both are vectorized with NumPy when it is installed and fall back to Python, selecting the same points.
+#
+########################################################################################################################
+
+
+def downsample(data, max_points, method='lttb'):
+    """ Downsample chartkick data to at most max_points points per series.  Series with at most max_points
+    points are returned unchanged.
+
+    .. sourcecode:: python
+
+        downsample([[x, y], ...], 1000)                             # single series
+        downsample({x: y, ...}, 1000, 'minmax')                     # single series as dict
+        downsample([{'name': 'A', 'data': [[x, y], ...]}, ...], 1000) # multiple series
+
+    .. note:: Points are ordered by x.  x may be numbers, dates, or datetimes.  Other x values, ex. date strings,
+        are taken to be equally spaced in the order given.  y must be numbers.
+
+    :param data: chartkick data
+    :type data: list[list] or dict or list[dict]
+    :param max_points: max points per series, at least 3
+    :type max_points: int
+    :param method: 'lttb' or 'minmax'
+    :type method: unicode
+    :return: downsampled data, of the same form as data
+    :rtype: list[list] or dict or list[dict]
+    """
+    if method not in _DOWNSAMPLERS:
+        raise ValueError('In downsample illegal method {}'.format(method))
+    if max_points < 3:
+        raise ValueError('In downsample max_points must be at least 3, not {}'.format(max_points))
+    if isinstance(data, dict):
+        if len(data) <= max_points:
+            return data
+        keys = sorted(data)
+        keep = _DOWNSAMPLERS[method](_numeric(keys), [data[k] for k in keys], max_points)
+        return dict((keys[i], data[keys[i]]) for i in keep)
+    if data and isinstance(data[0], dict):
+        return [dict(series, data=downsample(series['data'], max_points, method)) for series in data]
+    if len(data) <= max_points:
+        return data
+    points = sorted(data, key=operator.itemgetter(0))
+    keep = _DOWNSAMPLERS[method](_numeric([p[0] for p in points]), [p[1] for p in points], max_points)
+    return [points[i] for i in keep]
+
+
+def _numeric(xs):
+    """ x values as numbers.  Dates and datetimes are seconds since the epoch, other values are positions. """
+    if all(isinstance(x, (int, long, float)) for x in xs):
+        return xs
+    if all(isinstance(x, datetime.datetime) for x in xs):
+        return [calendar.timegm(x.utctimetuple()) + x.microsecond / 1e6 for x in xs]
+    if all(isinstance(x, datetime.date) for x in xs):
+        return [calendar.timegm(x.timetuple()) for x in xs]
+    return range(len(xs))
+
+
+def _lttb_bounds(n, threshold):
+    """ Bucket bounds for LTTB.  Bucket i, 0 <= i < threshold - 2, is [start[i], start[i + 1]) and the point
+    selected from it is compared to the average of the next bucket.  The last bucket's next bucket is the last
+    point.
+    """
+    every = (n - 2) / float(threshold - 2)
+    return [min(int(i * every) + 1, n - 1) for i in range(threshold - 1)] + [n]
+
+
+def _lttb_python(xs, ys, threshold):
+    """ Largest-Triangle-Three-Buckets in Python.  Returns the indices of the points to keep. """
+    n = len(xs)
+    if threshold >= n:
+        return range(n)
+    bounds = _lttb_bounds(n, threshold)
+    keep = [0]
+    a = 0
+    for i in range(threshold - 2):
+        start, end, next_end = bounds[i], bounds[i + 1], bounds[i + 2]
+        count = float(next_end - end)
+        avg_x = sum(xs[end:next_end]) / count
+        avg_y = sum(ys[end:next_end]) / count
+        xa, ya = xs[a], ys[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((xa - avg_x) * (ys[j] - ya) - (xa - xs[j]) * (avg_y - ya))
+            if area > best_area:
+                best, best_area = j, area
+        keep.append(best)
+        a = best
+    keep.append(n - 1)
+    return keep
+
+
+def _lttb_numpy(xs, ys, threshold):
+    """ Largest-Triangle-Three-Buckets with NumPy.  The bucket averages are computed at once from cumulative
+    sums, the triangle areas of each bucket in one vector operation.
+    """
+    n = len(xs)
+    if threshold >= n:
+        return range(n)
+    x = numpy.asarray(xs, dtype=float)
+    y = numpy.asarray(ys, dtype=float)
+    bounds = numpy.asarray(_lttb_bounds(n, threshold))
+    cx = numpy.concatenate(([0.0], numpy.cumsum(x)))
+    cy = numpy.concatenate(([0.0], numpy.cumsum(y)))
+    counts = bounds[2:] - bounds[1:-1]
+    avg_x = (cx[bounds[2:]] - cx[bounds[1:-1]]) / counts
+    avg_y = (cy[bounds[2:]] - cy[bounds[1:-1]]) / counts
+    keep = [0]
+    a = 0
+    for i in range(threshold - 2):
+        start, end = bounds[i], bounds[i + 1]
+        xa, ya = x[a], y[a]
+        areas = numpy.abs((xa - avg_x[i]) * (y[start:end] - ya) - (xa - x[start:end]) * (avg_y[i] - ya))
+        a = int(start + areas.argmax())
+        keep.append(a)
+    keep.append(n - 1)
+    return keep
+
+
+def _minmax_bounds(n, max_points):
+    """ Bucket bounds for min/max, max_points // 2 buckets of nearly equal size. """
+    buckets = max_points // 2
+    return [i * n // buckets for i in range(buckets + 1)]
+
+
+def _minmax_python(xs, ys, max_points):
+    """ Min/max buckets in Python.  Returns the indices of the points to keep. """
+    n = len(ys)
+    if max_points >= n:
+        return range(n)
+    bounds = _minmax_bounds(n, max_points)
+    keep = set()
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        bucket = range(start, end)
+        keep.add(min(bucket, key=ys.__getitem__))
+        keep.add(max(bucket, key=ys.__getitem__))
+    return sorted(keep)
+
+
+def _minmax_numpy(xs, ys, max_points):
+    """ Min/max buckets with NumPy.  Bucket minima and maxima by reduceat, then the first point of each
+    bucket equal to its minimum or maximum.
+    """
+    n = len(ys)
+    if max_points >= n:
+        return range(n)
+    y = numpy.asarray(ys, dtype=float)
+    bounds = numpy.asarray(_minmax_bounds(n, max_points))
+    bucket = numpy.repeat(numpy.arange(len(bounds) - 1), numpy.diff(bounds))
+    keep = []
+    for reduce_ in (numpy.minimum, numpy.maximum):
+        hits = numpy.flatnonzero(y == reduce_.reduceat(y, bounds[:-1])[bucket])
+        keep.append(hits[numpy.unique(bucket[hits], return_index=True)[1]])
+    return numpy.union1d(*keep).tolist()
+
+_DOWNSAMPLERS = {'lttb': _lttb_numpy if numpy is not None else _lttb_python,
+                 'minmax': _minmax_numpy if numpy is not None else _minmax_python}
@@ -35,7 +35,11 @@ __maintainer__ = 'rbell01824'
 __email__ = 'rbell01824@gmail.com'
 
 import functools
-from djangopages.widgets.widgets import DWidget
+import itertools
+
+from django.utils.html import escape
+
+from djangopages.widgets.widgets import DWidget, RenderIter
 
 ########################################################################################################################
 #
@@ -50,6 +54,7 @@ class WList(DWidget):
     .. sourcecode:: python
 
             WList(MD(...), T(...), ...)
+            WList(MD(...), T(...), ..., parallel=True)          # render the widgets concurrently
 
     | Shortcuts:
     | WL = functools.partial(WList)
@@ -57,6 +62,8 @@ class WList(DWidget):
     :param content: content to output
     :type content: list of DWidget(s)
     """
+    _stream_args = True
+
     def __init__(self, *content):
         super(WList, self).__init__(*content)
         return
@@ -74,24 +81,22 @@ class Layout(DWidget):
     .. sourcecode:: python
 
             Layout(row1, row2, ...)
+            Layout(row1, row2, ..., parallel=True)              # render the rows concurrently
 
     | Shortcuts:
 
     :param content: content to output
     :type content: list of DWidget(s)
     """
+    _stream_args = True
+
     def __init__(self, *content):
         super(Layout, self).__init__(*content)
         return
 
     def generate(self):
         content = self.args
-        rtn = ''
-        for r in content:
-            if isinstance(r, tuple):
-                rtn += Row('\n'.join(r))
-            else:
-                rtn += Row(r)
+        rtn = ''.join([Row('\n'.join(r) if isinstance(r, tuple) else r).render() for r in content])
         return rtn
 L = functools.partial(WList)
 
@@ -135,6 +140,8 @@ class Column(DWidget):
 
         Row(Column(MD("##Bootstrap row', '##Bootstrap column', 'Other text in row/column')))
     """
+    _stream_args = (0,)
+
     # todo 2: convert to use default generate
     def __init__(self, content, width=12, classes='', style=''):
         super(Column, self).__init__(content, width, classes, style)
@@ -145,9 +152,7 @@ class Column(DWidget):
         """ Outputs a bootstrap column """
         content, width, classes, style = self.args
         if isinstance(content, tuple):
-            rtn = ''
-            for c in content:
-                rtn += Column(c, width, classes, style)
+            rtn = ''.join([Column(c, width, classes, style).render() for c in content])
             return rtn
         classes = 'class="col-md-{width} {classes}" '.format(width=width, classes=classes)
         if style:
@@ -180,7 +185,7 @@ class Row(DWidget):
     .. sourcecode:: python
 
         Row(Column(MD(("##Bootstrap row', '##Bootstrap column', 'Other text in row/column'))))
-
+        Row((Column(...), Column(...)), parallel=True)          # render the columns concurrently
 
     | Shortcut: R(...), useful abbreviation
 
@@ -193,6 +198,8 @@ class Row(DWidget):
     :return: HTML for bootstrap row
     :rtype: unicode
     """
+    _stream_args = (0,)
+
     # todo 2: convert to use default generate
     def __init__(self, content, classes='', style=''):
         super(Row, self).__init__(content, classes, style)
@@ -203,9 +210,7 @@ class Row(DWidget):
         """ Outputs a bootstrap row """
         content, classes, style = self.args
         if isinstance(content, tuple):
-            rtn = ''
-            for c in content:
-                rtn += Row(c, classes, style)
+            rtn = ''.join([Row(c, classes, style).render() for c in content])
             return rtn
         classes = 'class="row {classes}" '.format(classes=classes)
         if style:
@@ -270,9 +275,7 @@ class RowColumn(DWidget):
                    '<!-- / DWidget RowColumn -->\n'
         content, width, classes, style = self.args
         if isinstance(content, tuple):
-            cols = ''
-            for c in content:
-                cols += Column(c, width, classes, style).render()
+            cols = ''.join([Column(c, width, classes, style).render() for c in content])
             rtn = Row(cols).render()
         else:
             rtn = Row(Column(content, width, classes, style)).render()
@@ -343,10 +346,7 @@ class RowRowColumn(DWidget):
                    '<!-- / DWidget RowRowColumn -->\n'
         content, width, classes, style = self.args
         if isinstance(content, tuple):
-            rtn = ''
-            for c in content:
-                col = Column(c, width, classes, style).render()
-                rtn += Row(col).render()
+            rtn = ''.join([Row(Column(c, width, classes, style).render()).render() for c in content])
         else:
             rtn = Row(Column(content, width, classes, style)).render()
         rtn = template.format(rrc=rtn)
@@ -364,3 +364,116 @@ RRC9 = functools.partial(RowRowColumn, width=9)
 RRC10 = functools.partial(RowRowColumn, width=10)
 RRC11 = functools.partial(RowRowColumn, width=11)
 RRC12 = functools.partial(RowRowColumn, width=12)
+
+
+########################################################################################################################
+#
+# Lazy loaded content
+#
+########################################################################################################################
+
+LAZY_TEMPLATE = '''
+<!-- DWidget Lazy -->
+<div id="{id}" class="dpage-lazy" style="min-height: {height};" data-url="{url}">{placeholder}</div>
+<script>
+//<![CDATA[
+(function () {{
+    var el = document.getElementById("{id}"), loaded = false;
+    function load() {{
+        if (!loaded) {{
+            loaded = true;
+            $.get(el.getAttribute("data-url"), function (html) {{ $(el).replaceWith(html); }});
+        }}
+    }}
+    if ({prefetch}) {{
+        (window.requestIdleCallback || function (f) {{ setTimeout(f, 1); }})(load);
+    }}
+    if (window.IntersectionObserver) {{
+        new IntersectionObserver(function (entries, observer) {{
+            if (entries[0].isIntersecting) {{ observer.disconnect(); load(); }}
+        }}, {{rootMargin: "200px"}}).observe(el);
+    }} else {{
+        $(load);
+    }}
+}})();
+//]]>
+</script>
+<!-- / DWidget Lazy -->
+'''
+
+_lazy_ids = itertools.count()
+
+
+class Lazy(DWidget):
+    """ Content loaded by the browser after the page.  In a DPage, Lazy renders a lightweight placeholder and
+    the browser fetches the rendered content from the page's URL with the query parameter dpage_fragment when
+    the placeholder scrolls into view, see DPage.  Nothing in the content, widgets or Data, is rendered or
+    resolved for the page itself.  Outside a DPage the content is rendered in place.
+
+    .. sourcecode:: python
+
+        Layout(Row(summary), Lazy(Row(expensive_panels)), Lazy(Panel(audit_table), name='audit', prefetch=True))
+
+    .. note:: The fragment request runs the page's generate again and renders only the Lazy's content, so
+        generate should be cheap and the expensive work done by widgets and Data inside the Lazy.  Fragments
+        are fetched with GET and the page's query string.
+
+    :param content: content to load lazily
+    :type content: str or unicode or tuple or DWidget
+    :param name: fragment id, default the Lazy's position among the page's Lazy widgets
+    :type name: unicode
+    :param prefetch: if True the browser fetches the content when it is idle, without waiting for the
+        placeholder to scroll into view
+    :type prefetch: bool
+    :param height: placeholder height
+    :type height: unicode
+    :param placeholder: placeholder content
+    :type placeholder: unicode
+    """
+    def __init__(self, content, name=None, prefetch=False, height='100px', placeholder='Loading...'):
+        super(Lazy, self).__init__(content)
+        self._deferred = True
+        self.name = name
+        self.prefetch = prefetch
+        self.height = height
+        self.placeholder = placeholder
+        self.url = None                 # fragment URL, set by the DPage
+        return
+
+    def render(self):
+        """ Render the placeholder, or the content if the Lazy has no fragment URL. """
+        if self.url is None:
+            return self.render_content()
+        return LAZY_TEMPLATE.format(id='dpage-lazy-{}'.format(next(_lazy_ids)), height=self.height,
+                                    url=escape(self.url), placeholder=self.placeholder,
+                                    prefetch='true' if self.prefetch else 'false')
+
+    def render_content(self):
+        """ Render the content.
+
+        :rtype: unicode
+        """
+        return ''.join(RenderIter(self.args[0]))
+
+
+def lazy_widgets(content):
+    """ Return the Lazy widgets in content in document order, including Lazy widgets within Lazy widgets.
+    Widget arguments, lists, tuples, and dict values in key order are searched, generators are not.
+
+    :param content: content to search
+    :type content: varies
+    :rtype: list of Lazy
+    """
+    found = []
+    stack = [content]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, Lazy):
+            found.append(obj)
+        if isinstance(obj, DWidget):
+            stack.extend(reversed(getattr(obj, 'args', ())))
+        elif isinstance(obj, (list, tuple)):
+            stack.extend(reversed(obj))
+        elif isinstance(obj, dict):
+            stack.extend(obj[k] for k in sorted(obj, reverse=True))
+    return found
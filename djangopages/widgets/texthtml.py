@@ -38,7 +38,7 @@ import loremipsum
 import functools
 
 from django.utils.encoding import force_unicode
-from djangopages.widgets.widgets import DWidget
+from djangopages.widgets.widgets import DWidget, DTemplate, flatten
 
 ########################################################################################################################
 #
@@ -70,13 +70,17 @@ class Text(DWidget):
     :return: HTML for content
     :rtype: unicode
     """
+    template_para = DTemplate('<p class="{classes}" style="{style}">{content}</p>')
+    template_span = DTemplate('<span class="{classes}" style="{style}">{content}</span>')
+    template = DTemplate('{content}')
+
     def __init__(self, content, para=False, classes='', style=''):
         if para:
-            template = '<p class="{classes}" style="{style}">{content}</p>'
+            template = self.template_para
         elif classes or style:
-            template = '<span class="{classes}" style="{style}">{content}</span>'
+            template = self.template_span
         else:
-            template = '{content}'
+            template = self.template
         super(Text, self).__init__('content', template,
                                    {'content': content, 'para': para, 'classes': classes, 'style': style})
         return
@@ -142,6 +146,10 @@ class LI(DWidget):
     :return: HTML for loremipsum
     :rtype: unicode
     """
+    template = DTemplate('<p {classes} {style}>'
+                         '{content}'
+                         '</p>')
+
     def __init__(self, line_count, para=True, classes='', style=''):
         super(LI, self).__init__(line_count, para, classes, style)
         return
@@ -150,22 +158,15 @@ class LI(DWidget):
     def generate(self):
         """ Generate loremipsum paragraphs with line_count sentences. """
         line_count, para, classes, style = self.args
-        if isinstance(line_count, (tuple, list)):
-            rtn = ''
-            for lc in line_count:
-                rtn += LI(lc, para, classes, style)
-            return rtn
-        content = ' '.join(loremipsum.get_sentences(line_count))
+        line_counts = flatten(line_count) if isinstance(line_count, (tuple, list)) else [line_count]
+        content = [' '.join(loremipsum.get_sentences(lc)) for lc in line_counts]
+        if not para:
+            return ''.join(content)
         if classes:
             classes = 'class="{}" '.format(classes)
         if style:
             style = 'style="{}" '.format(style)
-        template = '<p {classes} {style}>' \
-                   '{content}' \
-                   '</p>'
-        if para:
-            return template.format(content=content, classes=classes, style=style)
-        return content
+        return self.template.fill_each({'classes': classes, 'style': style}, 'content', content)
 
 
 class StringDup(DWidget):
@@ -56,7 +56,161 @@ __version__ = '0.1'
 __maintainer__ = 'rbell01824'
 __email__ = 'rbell01824@gmail.com'
 
+import collections
+import contextlib
 import functools
+import hashlib
+import operator
+import re
+import string
+import sys
+import threading
+import uuid
+
+from multiprocessing.pool import ApplyResult, ThreadPool
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from djangopages.cache import named_cache, DEFAULT_TIMEOUT
+
+########################################################################################################################
+#
+# Compiled templates
+#
+########################################################################################################################
+
+DTEMPLATE_REGISTRY_SIZE = 1000                      # max templates held by DTemplate.registry
+
+
+class DTemplate(object):
+    """ A widget template parsed once into literal chunks and field slots.
+
+    Widgets define their templates as class attributes so the template is parsed once, at import,
+    rather than by str.format on every generate.
+
+    .. sourcecode:: python
+
+        class ModalBody(DWidgetT):
+            template = DTemplate('<div class="modal-body">{body}</div>')
+
+            def __init__(self, body):
+                super(ModalBody, self).__init__(self.template, {'body': body})
+                return
+
+    DTemplate.format(**kwargs) returns what template.format(**kwargs) returns for the strings, numbers, and
+    widgets that are the arguments of widget templates.  Templates using
+    anything beyond simple named fields, ie. format specs, conversions, attribute or index lookups, or
+    positional fields, are passed through to str.format.
+
+    .. note:: The default DWidget and DWidgetT generate methods accept either a DTemplate or a template
+        string.  Strings are looked up in (or added to) DTemplate.registry so each distinct template string
+        is parsed once.
+
+    :param text: the template
+    :type text: unicode
+    """
+    registry = {}                                   # template text -> DTemplate
+    _formatter = string.Formatter()
+    _field_re = re.compile(r'^[A-Za-z_]\w*$')
+
+    def __init__(self, text):
+        self.text = text
+        self.chunks = []                            # literal text, None where a slot is filled
+        self.slots = []                             # (index into chunks, field name)
+        self.simple = isinstance(text, unicode)     # False -> use text.format
+        for literal, field, spec, conversion in self._formatter.parse(text):
+            if literal:
+                self.chunks.append(literal)
+            if field is None:
+                continue
+            if spec or conversion or not self._field_re.match(field):
+                self.simple = False
+            self.slots.append((len(self.chunks), field))
+            self.chunks.append(None)
+        # The chunks and slots are flattened into a positional % template and a getter returning the slot
+        # values in order, so filling the template is one C level operation.  For the types widgets use,
+        # '%s' % value and format(value, '') are the same.
+        self._pct = ''.join(['%s' if c is None else c.replace('%', '%%') for c in self.chunks])
+        names = [name for i, name in self.slots]
+        if len(names) == 1:
+            self._values = lambda xargs, name=names[0]: (xargs[name],)
+        else:
+            self._values = operator.itemgetter(*names) if names else lambda xargs: ()
+        return
+
+    @classmethod
+    def get(cls, template):
+        """ Return the DTemplate for template.
+
+        :param template: template text or DTemplate
+        :type template: unicode or DTemplate
+        :return: compiled template
+        :rtype: DTemplate
+        """
+        if isinstance(template, DTemplate):
+            return template
+        try:
+            return cls.registry[template]
+        except KeyError:
+            if len(cls.registry) >= DTEMPLATE_REGISTRY_SIZE:
+                cls.registry.clear()
+            rtn = cls.registry[template] = cls(template)
+            return rtn
+
+    def format(self, **kwargs):
+        """ Fill the template's slots.  Same result as str.format. """
+        return self.fill(kwargs)
+
+    def fill(self, xargs):
+        """ Fill the template's slots from the dict xargs.
+
+        :param xargs: field values
+        :type xargs: dict
+        :return: filled template
+        :rtype: unicode
+        """
+        if not self.simple:
+            return self.text.format(**xargs)
+        return self._pct % self._values(xargs)
+
+    def fill_each(self, xargs, name, items):
+        """ Fill the template once for each item with the item as the value of field name.  The other
+        fields are filled from xargs.  Equivalent to, but much faster than,
+
+        .. sourcecode:: python
+
+            ''.join([template.format(**dict(xargs, name=item)) for item in items])
+
+        :param xargs: field values shared by all items
+        :type xargs: dict
+        :param name: name of the field that takes each item's value
+        :type name: unicode
+        :param items: values for field name
+        :type items: list
+        :return: concatenated filled templates
+        :rtype: unicode
+        """
+        values = dict(xargs)
+        if not self.simple:
+            out = []
+            for item in items:
+                values[name] = item
+                out.append(self.text.format(**values))
+            return ''.join(out)
+        values[name] = None
+        row = list(self._values(values))
+        positions = [p for p, (i, n) in enumerate(self.slots) if n == name]
+        flat = []
+        for item in items:
+            for p in positions:
+                row[p] = item
+            flat.extend(row)
+        # one % operation over the template repeated for every item
+        return (self._pct * len(items)) % tuple(flat)
+
+    def __unicode__(self):
+        return self.text
 
 ########################################################################################################################
 #
@@ -65,6 +219,25 @@ import functools
 ########################################################################################################################
 
 
+class _DWidgetMeta(type):
+    """ Metaclass for DWidget.  Accepts the fragment cache arguments cache and cache_key, and the parallel
+    render argument parallel, for every widget so widget __init__ methods need not know about them.  See DWidget.
+    """
+    def __call__(cls, *args, **kwargs):
+        cache = kwargs.pop('cache', None) if kwargs else None
+        cache_key = kwargs.pop('cache_key', None) if kwargs else None
+        parallel = kwargs.pop('parallel', False) if kwargs else False
+        widget = super(_DWidgetMeta, cls).__call__(*args, **kwargs)
+        if cache or cache_key:
+            timeout = DEFAULT_TIMEOUT if cache is None or cache is True else cache
+            widget._cache = (timeout, cache_key)
+            widget._special = True
+        if parallel:
+            widget._parallel = True
+            widget._special = True
+        return widget
+
+
 class DWidget(object):
     """ DWidget(s) provide content & layout for DPage(s)
 
@@ -88,11 +261,39 @@ class DWidget(object):
     as a convenience.
 
     .. note:: add (+) and mul (*) force immediate rendering of the widget.
+
+    Any widget may cache its rendered HTML in the fragment cache, see fragment_cache.  Pass cache=True
+    (default timeout) or cache=seconds, and optionally cache_key='some key'.  Without a cache_key the key
+    is computed from the widget's class and arguments, including nested widgets.  On a hit the widget's
+    children are not rendered at all.
+
+    .. sourcecode:: python
+
+        Panel(heading, Graph(...), cache=600)                  # cached for 10 minutes
+        Column(expensive_widgets, cache_key='sales-summary')    # cached under an explicit key
+
+    .. note:: Widgets whose arguments include objects other than strings, numbers, lists, tuples, dicts,
+        and widgets (querysets, requests, ...) can only be cached with an explicit cache_key.
+
+    Any widget, typically a Layout, WList, or Row, may render its children in parallel.  Pass parallel=True.
+    See Parallel render below.
+
+    .. sourcecode:: python
+
+        WList(*[Panel(GraphCK('pie', Data(node_counts, node))) for node in nodes], parallel=True)
     """
+    __metaclass__ = _DWidgetMeta
+
+    _cache = None                   # (timeout, cache_key) if the widget is cached, see _DWidgetMeta
+    _parallel = False               # True if the widget's children render in parallel, see _DWidgetMeta
+    _special = False                # True if the widget is cached or parallel, checked by the render engine
+    _deferred = False               # True if the browser loads the widget's data later, ex. GraphCK(defer=True)
+    _stream_args = None             # arguments holding children streamed one by one, see RenderIter
+
     def __init__(self, *args):
-        log.debug('----- in dwidget init {}'.format(self.__class__.__name__))
+        log.debug('----- in dwidget init %s', self.__class__.__name__)
         self.args = args
-        log.debug('----- done dwidget init {}'.format(self.__class__.__name__))
+        log.debug('----- done dwidget init %s', self.__class__.__name__)
         return
 
     def render(self):
@@ -110,35 +311,27 @@ class DWidget(object):
         :rtype: str
 
         .. note:: Widgets may, though probably shouldn't, override the default render method.
-        """
 
-        # log.debug('##### DWidget render for {}'.format(self.__class__))
-        args = tuple()
-        try:
-            for a in self.args:
-                args += (_render(a),)
-        except AttributeError:
-            pass
-        self.args = args
-        out = self.generate()
-        # log.debug('##### DWidget out for {}'.format(self.__class__))
-        # log.debug('\n{}'.format(out))
-        # log.debug('##### DWidget render done for {}'.format(self.__class__))
-        return out
+        .. note:: Rendering is done by the render engine, see _render_tree.  The widget tree is walked
+            once, iteratively, so very deep or very wide trees do not recurse.
+        """
+        return _render_tree(self, root=True)
 
     # noinspection PyMethodOverriding
     def generate(self):
-        """ generate helper """
+        """ Default generate for widgets initialized with (content_name, template, xargs).  Returns the
+        template filled from the dict xargs.
+
+        If xargs[content_name] is a list or tuple the template is filled once per element, nested lists
+        and tuples are flattened, and the results are concatenated.  All elements share the widget's
+        template and other arguments so no widget is created per element.
+        """
         # log.debug('!!!!! in DWidget generate')
         content_name, template, xargs = self.args
         if content_name and isinstance(xargs[content_name], (list, tuple)):
-            rtn = ''
-            content = xargs.pop(content_name)
-            for c in content:
-                xargs[content_name] = c
-                rtn += self.__class__(**xargs).render()
+            rtn = DTemplate.get(template).fill_each(xargs, content_name, flatten(xargs[content_name]))
             return rtn
-        rtn = template.format(**xargs)
+        rtn = DTemplate.get(template).fill(xargs)
         return rtn
 
     def __add__(self, other):
@@ -166,17 +359,18 @@ class DWidgetT(DWidget):
     .. sourcecode:: python
 
         class ModalBody(DWidgetT):
+            template = DTemplate('<div class="modal-body">{body}</div>')
+
             # noinspection PyMethodOverriding
             def __init__(self, body):
-                template = '<div class="modal-body">{body}</div>'
-                super(ModalBody, self).__init__(template, {'body': body})
+                super(ModalBody, self).__init__(self.template, {'body': body})
                 return
 
     .. note:: DWidgetT classes take the widget's **template** and a **dict** of the widget's arguments.  The
         dict is used to generate the widget's HTML based on the template.
 
     :param template: template for output
-    :type template: str or unicode
+    :type template: str or unicode or DTemplate
     :param args: arguments for template
     :type args: dict
     :return: template formated with arguments
@@ -190,7 +384,7 @@ class DWidgetT(DWidget):
     def generate(self):
         """ Return template formatted with arguments """
         template, xargs = self.args
-        rtn = template.format(**xargs)
+        rtn = DTemplate.get(template).fill(xargs)
         return rtn
 
 ########################################################################################################################
@@ -215,25 +409,490 @@ def _render(content):
     :return: the rendered content
     :rtype: varies
     """
-    # log.debug('in _render with <<{}>> type {}'.format(content, type(content)))
+    return _render_tree(content)
+Render = functools.partial(_render)
+
+
+_STREAM_MARK = '<!-- dpage stream {} {} -->'
+
+
+def _stream_parts(widget):
+    """ Split a container widget into its HTML and its children, in output order, so RenderIter can yield the
+    HTML before each child and render the children one at a time.  The widget's _stream_args name the
+    arguments holding children: True for all of them, otherwise a tuple of argument indexes and (index, key)
+    pairs for a child in a dict argument.  A tuple or list in an indexed argument holds several children.
+
+    The widget is generated once with a marker in place of each child and the result is split at the markers.
+
+    :param widget: container widget
+    :type widget: DWidget
+    :return: HTML strings and children, or None if the widget can not be split
+    :rtype: list or None
+    """
+    token = uuid.uuid4().hex
+    children = []
+
+    def mark(value):
+        if isinstance(value, (tuple, list)):
+            return type(value)(mark(v) for v in value)
+        children.append(value)
+        return _STREAM_MARK.format(token, len(children) - 1)
+
+    args = list(widget.args)
+    paths = range(len(args)) if widget._stream_args is True else widget._stream_args
+    marked = set()
+    for path in paths:
+        if isinstance(path, tuple):
+            index, key = path
+            if isinstance(args[index][key], (tuple, list)):    # formatted whole by the template, not split
+                continue
+            args[index] = dict(args[index])
+            args[index][key] = mark(args[index][key])
+        else:
+            index = path
+            args[index] = mark(args[index])
+        marked.add(index)
+    if not children:
+        return None
+    clone = object.__new__(type(widget))
+    clone.__dict__.update(widget.__dict__)
+    clone.args = tuple(a if n in marked else _render_tree(a) for n, a in enumerate(args))
+    html = clone.generate()
+    if not isinstance(html, basestring):
+        return None
+    pieces = re.split(_STREAM_MARK.format(token, r'(\d+)'), html)
+    if [int(i) for i in pieces[1::2]] != range(len(children)):     # a child dropped, repeated, or reordered
+        return None
+    return [children[int(piece)] if n % 2 else piece for n, piece in enumerate(pieces) if n % 2 or piece]
+
+
+def _render_iter(content):
+    """ Render the content as a generator of HTML chunks.  Lists, tuples, and iterators, including
+    generators, are walked lazily element by element.  Each widget or string found is rendered and
+    yielded as one chunk, so content produced by a generator is never held in memory all at once.
+
+    Containers that set _stream_args, e.g. WList, Layout, Row, Column, and Panel, are not rendered whole.
+    Their HTML up to each child is yielded, then the child, so a page returning one Layout streams too.
+    Cached and parallel containers are rendered whole.
+
+    .. sourcecode:: python
+
+        for chunk in _render_iter((Row(...), (Panel(...) for n in range(1000)))):
+            response.write(chunk)
+
+    | Synonym: RenderIter
+
+    :param content: content to render
+    :type content: varies
+    :return: generator of rendered chunks
+    :rtype: generator
+    """
+    stack = [iter((content,))]
+    while stack:
+        for c in stack[-1]:
+            if isinstance(c, basestring):
+                yield c
+            elif hasattr(c, 'render'):
+                if getattr(c, '_stream_args', None) and not c._special and _expandable(c):
+                    parts = _stream_parts(c)
+                    if parts is not None:
+                        stack.append(iter(parts))
+                        break
+                rendered = _render_tree(c)
+                if isinstance(rendered, (list, tuple)):
+                    stack.append(iter(rendered))
+                    break
+                yield rendered if isinstance(rendered, basestring) else unicode(rendered)
+            elif isinstance(c, (list, tuple, collections.Iterator)):
+                stack.append(iter(c))
+                break
+            else:
+                yield unicode(c)
+        else:
+            stack.pop()
+RenderIter = functools.partial(_render_iter)
+
+
+def flatten(content):
+    """ Flatten nested lists and tuples into a list.
+
+    .. sourcecode:: python
+
+        flatten(('a', ['b', ('c',)], 'd'))      # ['a', 'b', 'c', 'd']
+
+    :param content: content to flatten
+    :type content: list or tuple
+    :return: elements of content that are not lists or tuples, in order
+    :rtype: list
+    """
+    items = []
+    stack = [iter(content)]
+    while stack:
+        for c in stack[-1]:
+            if isinstance(c, (list, tuple)):
+                stack.append(iter(c))
+                break
+            items.append(c)
+        else:
+            stack.pop()
+    return items
+
+########################################################################################################################
+#
+# Fragment cache
+#
+########################################################################################################################
+
+
+def fragment_cache():
+    """ Return the cache holding rendered widget HTML.  If settings.DPAGE_FRAGMENT_CACHE names a Django cache
+    alias the fragments are stored there, otherwise in an in-process LRU cache of at most
+    settings.DPAGE_FRAGMENT_CACHE_SIZE entries.  Fragments expire after settings.DPAGE_FRAGMENT_CACHE_TIMEOUT
+    seconds unless the widget gives its own timeout.
+
+    .. sourcecode:: python
+
+        fragment_cache().stats()            # {'hits': 12, 'misses': 3, 'evictions': 0, ...}
+        fragment_cache().clear()
+
+    :return: the fragment cache
+    :rtype: djangopages.cache.LRUCache or djangopages.cache.DjangoCache
+    """
+    return named_cache('fragment',
+                       alias=getattr(settings, 'DPAGE_FRAGMENT_CACHE', None),
+                       max_entries=getattr(settings, 'DPAGE_FRAGMENT_CACHE_SIZE', 1000),
+                       timeout=getattr(settings, 'DPAGE_FRAGMENT_CACHE_TIMEOUT', 300))
+
+
+class _Uncacheable(Exception):
+    """ Raised when a widget's arguments can not be hashed stably. """
+    pass
+
+_SCALARS = (bool, int, long, float, type(None))
+
+
+def _fragment_key(widget):
+    """ Return the fragment cache key for widget.  The key is the widget's cache_key if given, otherwise a
+    digest of the widget's class, arguments, and attributes, walking nested widgets, tuples, lists, and
+    dicts iteratively.
+
+    :param widget: widget to key
+    :type widget: DWidget
+    :return: cache key
+    :rtype: unicode
+    :raises _Uncacheable: if widget holds a value that can not be hashed stably
+    """
+    cache_key = widget._cache[1]
+    if cache_key:
+        return 'key:{}'.format(cache_key)
+    digest = hashlib.sha1()
+    update = digest.update
+    stack = [widget]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, basestring):
+            update(b'%s%d:' % (b's' if isinstance(obj, unicode) else b'b', len(obj)))
+            update(obj.encode('utf-8') if isinstance(obj, unicode) else obj)
+        elif isinstance(obj, _SCALARS):
+            update(b'%s:%r;' % (type(obj).__name__.encode('ascii'), obj))
+        elif isinstance(obj, DWidget):
+            cls = type(obj)
+            attrs = dict(vars(obj))
+            attrs.pop('_cache', None)
+            update(b'w:%s.%s;' % (cls.__module__.encode('ascii'), cls.__name__.encode('ascii')))
+            stack.append(attrs)
+        elif isinstance(obj, (tuple, list)):
+            update(b'%s%d;' % (b't' if isinstance(obj, tuple) else b'l', len(obj)))
+            stack.extend(reversed(obj))
+        elif isinstance(obj, dict):
+            update(b'd%d;' % len(obj))
+            for k in sorted(obj, reverse=True):
+                stack.append(obj[k])
+                stack.append(k)
+        elif isinstance(obj, DTemplate):
+            update(b'T%d:' % len(obj.text))
+            update(obj.text.encode('utf-8'))
+        else:
+            raise _Uncacheable(type(obj).__name__)
+    return 'auto:{}'.format(digest.hexdigest())
+
+
+def _fragment_get(widget):
+    """ Look widget up in the fragment cache.
+
+    :param widget: widget with caching enabled
+    :type widget: DWidget
+    :return: (key, html); key is None if the widget can not be cached, html is None on a miss
+    :rtype: tuple
+    """
+    try:
+        key = _fragment_key(widget)
+    except _Uncacheable as e:
+        log.debug('widget %s not cached, argument of type %s', type(widget).__name__, e)
+        return None, None
+    return key, fragment_cache().get(key)
+
+
+def _fragment_set(widget, key, html):
+    """ Store widget's rendered html in the fragment cache. """
+    if isinstance(html, basestring):
+        fragment_cache().set(key, html, widget._cache[0])
+    return
+
+
+def render_cached(widget, render):
+    """ Render a widget that overrides DWidget.render, using the fragment cache if the widget is cached.  The
+    render engine does not expand such widgets, so their render methods call this to honor cache and cache_key.
+
+    .. sourcecode:: python
+
+        def render(self):
+            return render_cached(self, self._render)
+
+    :param widget: widget to render
+    :type widget: DWidget
+    :param render: function rendering the widget
+    :type render: callable
+    :return: the rendered widget
+    """
+    if widget._cache is None:
+        return render()
+    key, html = _fragment_get(widget)
+    if html is None:
+        html = render()
+        if key is not None:
+            _fragment_set(widget, key, html)
+    return html
+
+########################################################################################################################
+#
+# Parallel render
+#
+# A widget created with parallel=True renders its children, and the elements of list or tuple children, on a
+# thread pool of settings.DPAGE_RENDER_WORKERS threads.  The results are assembled in order, so the output is
+# that of a sequential render.  At most the request's render budget, see render_budget, of children are in
+# flight at once.  Children rendered on the pool render their own parallel widgets sequentially.
+#
+# .. note:: Python threads overlap waiting, on database queries, Data, and other I/O, not computation.
+#
+########################################################################################################################
+
+_render_state = threading.local()           # budget: request's render budget, worker: True in pool threads
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+
+def _thread_pool():
+    """ Return the process wide render thread pool. """
+    global _render_pool
+    if _render_pool is None:
+        with _render_pool_lock:
+            if _render_pool is None:
+                _render_pool = ThreadPool(getattr(settings, 'DPAGE_RENDER_WORKERS', 8))
+    return _render_pool
+
+
+@contextlib.contextmanager
+def render_budget(budget):
+    """ Limit the number of children rendered concurrently, in this thread, to budget.  DPage sets its
+    render_budget for each request.
+
+    .. sourcecode:: python
+
+        with render_budget(2):
+            content = WList(*panels, parallel=True).render()
+
+    :param budget: max children in flight, None for settings.DPAGE_RENDER_BUDGET
+    :type budget: int or None
+    """
+    previous = getattr(_render_state, 'budget', None)
+    _render_state.budget = budget
+    try:
+        yield
+    finally:
+        _render_state.budget = previous
+
+
+def _render_in_worker(content, slots):
+    """ Render content in a pool thread.  Returns (True, rendered) or (False, exc_info) and frees a slot. """
+    _render_state.worker = True
+    try:
+        return True, _render_tree(content)
+    except Exception:
+        return False, sys.exc_info()
+    finally:
+        close_old_connections()
+        slots.release()
+
+
+def _render_parallel(node, key):
+    """ Render node's children on the render pool, then the node itself.
+
+    :param node: widget created with parallel=True
+    :type node: DWidget
+    :param key: node's fragment cache key or None
+    :return: rendered node
+    """
+    budget = getattr(_render_state, 'budget', None) or getattr(settings, 'DPAGE_RENDER_BUDGET', 4)
+    if getattr(_render_state, 'worker', False) or budget < 2:
+        rendered = _render_tree(node, root=True, sequential=True)
+        if key is not None:
+            _fragment_set(node, key, rendered)
+        return rendered
+    slots = threading.Semaphore(budget)
+    pool = _thread_pool()
+    pending = []                        # per child: result, or list/tuple of results for list/tuple children
+
+    def submit(content):
+        if not (_expandable(content) or hasattr(content, 'render')):
+            return _render_leaf(content)
+        slots.acquire()
+        return pool.apply_async(_render_in_worker, (content, slots))
+
+    def result(item):
+        if not isinstance(item, ApplyResult):
+            return item
+        ok, value = item.get()
+        if not ok:
+            raise value[0], value[1], value[2]
+        return value
+
+    for child in _children(node):
+        if type(child) in (list, tuple):
+            pending.append(type(child)(submit(c) for c in child))
+        else:
+            pending.append(submit(child))
+    values = [type(p)(result(r) for r in p) if type(p) in (list, tuple) else result(p) for p in pending]
+    rendered = _finish(node, values)
+    if key is not None:
+        _fragment_set(node, key, rendered)
+    return rendered
+
+########################################################################################################################
+#
+# Render engine
+#
+# The widget tree is rendered by a single iterative post-order walk.  Each pending widget, tuple, or list has a
+# frame on an explicit stack holding an iterator over its children, a list collecting their rendered values, and
+# the widget's fragment cache key if it is cached.  When the children are exhausted the collected values are
+# converted once, into the widget's args tuple or the rendered tuple/list, and handed to the parent frame.  Nothing
+# is rebuilt per child and nothing recurses, so dashboards with thousands of nested Row/Column/Panel widgets render
+# in time linear in the number of nodes.
+#
+########################################################################################################################
+
+_DWIDGET_RENDER = DWidget.__dict__['render']         # the default render, see _expandable
+_EXPANDABLE = {}                                     # type -> True if the engine expands objects of the type
+
+
+def _expandable(content):
+    """ True if the engine expands content in place.  That is, content is a DWidget using the default
+    render, or a tuple or list without a render method of its own.  The answer depends only on the type
+    of content, so it is computed once per type.
+
+    :param content: content to check
+    :type content: varies
+    :rtype: bool
+    """
+    cls = type(content)
+    try:
+        return _EXPANDABLE[cls]
+    except KeyError:
+        if issubclass(cls, DWidget):
+            rtn = getattr(cls.render, '__func__', None) is _DWIDGET_RENDER
+        else:
+            rtn = issubclass(cls, (tuple, list)) and not hasattr(cls, 'render')
+        _EXPANDABLE[cls] = rtn
+        return rtn
+
+
+def _render_leaf(content):
+    """ Render content that the engine does not expand. """
     if isinstance(content, basestring):
         return content
     if hasattr(content, 'render'):
         return content.render()
-    if isinstance(content, (int, long, float)):
-        return content
-    if isinstance(content, tuple):
-        tpl = tuple()
-        for con in content:
-            tpl += (_render(con),)
-        return tpl
-    if isinstance(content, list):
-        lst = list()
-        for con in content:
-            lst.append(_render(con))
-        return lst
     return content
-Render = functools.partial(_render)
+
+
+def _children(node):
+    """ Children of a widget, tuple, or list for the render engine. """
+    if isinstance(node, DWidget):
+        return getattr(node, 'args', ())
+    return node
+
+
+def _finish(node, values):
+    """ Complete a node once all of its children are rendered.
+
+    :param node: widget, tuple, or list being rendered
+    :param values: rendered children of node
+    :type values: list
+    :return: rendered node
+    """
+    if isinstance(node, DWidget):
+        node.args = tuple(values)
+        return node.generate()
+    if isinstance(node, tuple):
+        return tuple(values)
+    return values
+
+
+def _render_tree(content, root=False, sequential=False):
+    """ Render content with the iterative render engine.  Produces exactly the output of a recursive
+    render: strings are returned unchanged, widgets are rendered, tuples and lists are rendered element
+    by element, and anything else is returned as is.
+
+    .. sourcecode:: python
+
+        _render_tree(Row(Column(Panel(MD('Some text')))))
+
+    :param content: content to render
+    :type content: varies
+    :param root: if True, content is a widget whose own render method invoked the engine and must be expanded
+    :type root: bool
+    :param sequential: if True, content is expanded here even if it was created with parallel=True
+    :type sequential: bool
+    :return: the rendered content
+    :rtype: varies
+    """
+    expandable, render_leaf = _expandable, _render_leaf        # locals, this loop runs once per node
+    if not (root or expandable(content)):
+        return render_leaf(content)
+    key = None
+    if getattr(content, '_special', False) and not sequential:
+        if content._cache is not None:
+            key, html = _fragment_get(content)
+            if html is not None:
+                return html
+        if content._parallel:
+            return _render_parallel(content, key)
+    stack = [(content, iter(_children(content)), [], key)]
+    while True:
+        node, children, values, key = stack[-1]
+        for child in children:
+            if expandable(child):
+                child_key = None
+                if getattr(child, '_special', False):         # cached or parallel widget, see DWidget
+                    html = None
+                    if child._cache is not None:
+                        child_key, html = _fragment_get(child)
+                    if html is None and child._parallel:
+                        html = _render_parallel(child, child_key)
+                    if html is not None:
+                        values.append(html)
+                        continue
+                stack.append((child, iter(_children(child)), [], child_key))
+                break
+            values.append(child if type(child) is unicode else render_leaf(child))
+        else:
+            stack.pop()
+            rendered = _finish(node, values)
+            if key is not None:
+                _fragment_set(node, key, rendered)
+            if not stack:
+                return rendered
+            stack[-1][2].append(rendered)
 
 
 # def _renderstr(content):
@@ -33,11 +33,12 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.views import login
 
 from djangopages_demo.views import index, DemoList
-from djangopages.pages.views import DPagesList, DPageView
+from djangopages.pages.views import ChartDataView, DPagesList, DPageView
 from graphpages.views import GraphPageListView
 
 urlpatterns = patterns('',
     url(r'^dpages/$', DPagesList.as_view(), name='DPagesList'),
+    url(r'^dpages/chart_data/([0-9a-f]+)$', ChartDataView.as_view(), name='dpage_chart_data'),
     url(r'^dpages/(.*$)', DPageView.as_view(), name='dpagesview'),
     url(r'^test_data/', include('test_data.urls')),
     url(r'^display_graph_pages$', GraphPageListView.as_view(), name=GraphPageListView),
@@ -27,9 +27,9 @@ from djangopages.widgets.layout import *
 from djangopages.widgets.bootstrap import *
 from djangopages.widgets.texthtml import *
 from djangopages.widgets.graph import *
+from djangopages.widgets.data import Data
 
-from django.db.models import Count
-from test_data.models import VSyslog
+from test_data.models import syslog_counts
 
 ########################################################################################################################
 
@@ -71,8 +71,8 @@ class DemoList(DPage):
         return self
 
 
-class TestBasicGraphs001(DPage):
-    """ Basic test of Graph facility with two graphs in a row. """
+class TestBasicGraphs001(AsyncDPage):
+    """ Basic test of Graph facility with two graphs in a row.  The page's queries run concurrently. """
     title = 'Graphs'
     description = 'Data base query with multiple graphs in a row'
     tags = ['demo', 'graphs']
@@ -82,17 +82,13 @@ class TestBasicGraphs001(DPage):
 
         company = 'BMC_1'
         node = 'A0040CnBPGC1'
-        qs = VSyslog.objects.filter(node__host_name=node,
-                                    node__company__company_name=company)
-
-        # Count all the syslog records
-        all_count_host = qs.count()
-
-        # Get count by type data
-        xqs = qs.values('message_type').annotate(num_results=Count('id'))
+        where = {'node__host_name': node, 'node__company__company_name': company}
 
-        # Format for bar chart
-        count_by_type = map(list, xqs.order_by('message_type').values_list('message_type', 'num_results'))
+        # Count all the syslog records and get count by type formatted for bar chart, both queries at once
+        total, count_by_type = yield (
+            Data(syslog_counts, group_by=(), **where),
+            Data(lambda: map(list, syslog_counts(**where))))
+        all_count_host = total[0][0]
 
         # Create the charts
         # create the column chart and set it's title
@@ -127,7 +123,7 @@ class TestBasicGraphs001(DPage):
                         RC(text_bottom)])
         content = (RC(lnk + linecnt) +
                    Panel(panel_body))
-        return content
+        yield content
 
 
 class TestBasicGraphs002(DPage):
@@ -142,16 +138,9 @@ class TestBasicGraphs002(DPage):
         company = 'BMC_1'
         node = 'A0040CnBPGC1'
 
-        # get data from DB
-        qs = VSyslog.objects.filter(node__host_name=node,
-                                    node__company__company_name=company).values('message_type')
-        all_count = qs.count()
-        qs_by_type = qs.annotate(num_results=Count('id')).\
-            order_by('message_type').\
-            values_list('message_type', 'num_results')
-
-        # turn into GraphCK compatible list
-        count_by_type = map(list, qs_by_type)
+        # get data from DB, count by type from the syslog rollups
+        count_by_type = map(list, syslog_counts(node__host_name=node, node__company__company_name=company))
+        all_count = sum(count for message_type, count in count_by_type)
 
         # make our graphs
         col_graph = GraphCK('column', count_by_type,
@@ -23,6 +23,8 @@ __maintainer__ = "rbell01824"
 __email__ = "rbell01824@gmail.com"
 __status__ = "dev"
 
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import models
 from django_extensions.db.models import TimeStampedModel, TitleSlugDescriptionModel
 
@@ -64,4 +66,88 @@ class GraphPage(TitleSlugDescriptionModel, TimeStampedModel):
 
     def __unicode__(self):
         return u'{}'.format(self.title)
-    pass
+
+    # A page takes each part, form, form_page, query, and graph_page, from the page its *_ref refers to, which may
+    # take it from the page its own *_ref refers to, and so on.
+    REF_KINDS = ('form', 'form_page', 'query', 'graph_page')
+
+    @classmethod
+    def with_refs(cls, *kinds):
+        """
+        Return a queryset that loads pages with their *_ref chains, settings.GRAPHPAGE_REF_DEPTH pages deep,
+        default 4, in the same query.
+
+        :param kinds: the parts whose chains are loaded, default all
+        :type kinds: unicode
+        :rtype: QuerySet
+        """
+        depth = getattr(settings, 'GRAPHPAGE_REF_DEPTH', 4)
+        return cls.objects.select_related(*['__'.join([kind + '_ref'] * depth) for kind in kinds or cls.REF_KINDS])
+
+    def ref_chain(self, kind):
+        """
+        Get the pages a part is taken through: this page, the page its *_ref refers to, and so on.  The chain
+        is found once per loaded page.  Pages beyond those loaded by with_refs are loaded a chain's depth at a
+        time.
+
+        :param kind: 'form', 'form_page', 'query', or 'graph_page'
+        :type kind: unicode
+        :return: the pages, the last has the part's text
+        :rtype: list of GraphPage
+        :raises ValidationError: if the chain refers back to a page in it
+        """
+        chains = self.__dict__.setdefault('_ref_chains', {})
+        if kind not in chains:
+            field = self._meta.get_field(kind + '_ref')
+            chain = [self]
+            page = self
+            while getattr(page, field.attname) is not None:
+                ref_id = getattr(page, field.attname)
+                if ref_id in [p.pk for p in chain]:
+                    raise ValidationError('GraphPage {} {} refers to itself through {}'.format(
+                        self.pk, field.name, ' -> '.join(unicode(pk) for pk in [p.pk for p in chain] + [ref_id])))
+                if hasattr(page, field.get_cache_name()):
+                    page = getattr(page, field.name)
+                else:
+                    page = GraphPage.with_refs(kind).get(pk=ref_id)
+                chain.append(page)
+            chains[kind] = chain
+        return chains[kind]
+
+    def clean(self):
+        """
+        Reject *_ref chains that refer back to a page in them, so they can not be saved.
+
+        :raises ValidationError: for each *_ref whose chain refers back
+        """
+        self.__dict__.pop('_ref_chains', None)
+        errors = {}
+        for kind in self.REF_KINDS:
+            try:
+                self.ref_chain(kind)
+            except ValidationError as e:
+                errors[kind + '_ref'] = e.messages
+        self.__dict__.pop('_ref_chains', None)
+        if errors:
+            raise ValidationError(errors)
+        return
+
+    def ref_page(self, kind):
+        """
+        Get the page a part's text is taken from.
+
+        :param kind: 'form', 'form_page', 'query', or 'graph_page'
+        :type kind: unicode
+        :rtype: GraphPage
+        """
+        return self.ref_chain(kind)[-1]
+
+    def ref_stamp(self, kind):
+        """
+        Get the version of a part: the pk and modified time of each page in its chain.
+
+        :param kind: 'form', 'form_page', 'query', or 'graph_page'
+        :type kind: unicode
+        :rtype: unicode
+        """
+        return ':'.join('{}@{}'.format(p.pk, p.modified.isoformat()) for p in self.ref_chain(kind))
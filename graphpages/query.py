@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+Graphpage queries
+*****************
+
+.. module:: query
+   :synopsis: Compile and run graphpage query text
+
+.. moduleauthor:: Richard Bell <rbell01824@gmail.com>
+
+A graphpage query is Python text whose top level names become the graph page's context.  The text is compiled
+to a code object once per page version and kept in the 'graphpage_query' named cache.  Each run executes the
+code with a fresh copy of a small namespace, see query_namespace, so a query can not change what the next one
+sees.  Compile and run times are recorded per page.
+
+A page with a result timeout reuses its query's results for that many seconds for the same form input, see
+result_timeout and cached_result.  For settings.GRAPHPAGE_RESULT_STALE seconds after that, default 300, the old results
+are still served while the query runs again in a background thread.
+
+When settings.DPAGE_SANDBOX_WORKERS is set, queries run in the worker processes of djangopages.sandbox rather
+than in the web process, see run_query.
+
+.. sourcecode:: python
+
+    code = compile_query(gpg.query, '<graphpage 3 query>', gpg)
+    context = run_query(code, {'number_countries': '10'}, gpg)
+
+    query_timings()
+    # {3: {'title': 'Demo 3', 'compiles': 1, 'compile_seconds': 0.0004, 'runs': 12, 'run_seconds': 0.31,
+    #      'max_run_seconds': 0.05}}
+
+10/17/26 - Initial creation
+
+"""
+
+from __future__ import unicode_literals
+import logging
+
+log = logging.getLogger(__name__)
+
+__author__ = 'rbell01824'
+__date__ = '10/17/26'
+__copyright__ = "Copyright 2014, Richard Bell"
+__credits__ = ['rbell01824']
+__license__ = 'All rights reserved'
+__version__ = '0.1'
+__maintainer__ = 'rbell01824'
+__email__ = 'rbell01824@gmail.com'
+
+import hashlib
+import json
+import threading
+import time
+
+from django import forms
+from django.conf import settings
+from django.db import close_old_connections
+from django.template import Context, Template
+
+from djangopages.cache import named_cache
+from djangopages.sandbox import sandbox_pool
+from graphpages.models import GraphPage
+
+########################################################################################################################
+#
+# Compiled queries
+#
+########################################################################################################################
+
+
+def query_code_cache():
+    """ Return this process's cache of compiled graphpage queries, (GraphPage pk, stamp) -> code object.  The
+    cache holds at most settings.GRAPHPAGE_QUERY_CACHE_SIZE entries, default 100.
+
+    :rtype: djangopages.cache.LRUCache
+    """
+    return named_cache('graphpage_query', max_entries=getattr(settings, 'GRAPHPAGE_QUERY_CACHE_SIZE', 100),
+                       timeout=None)
+
+
+def query_namespace():
+    """ Return the globals a query runs with.  Queries import the models they need, these are the names they
+    could use without importing when they ran with the view module's globals.
+
+    :rtype: dict
+    """
+    return {'__builtins__': __builtins__, '__name__': 'graphpage_query', 'forms': forms, 'settings': settings,
+            'Context': Context, 'Template': Template, 'GraphPage': GraphPage, 'log': log}
+
+_namespace = query_namespace()
+
+
+def compile_query(text, filename, gpg=None):
+    """ Compile query text.  Like the exec it replaces, the code is compiled with unicode_literals.
+
+    :param text: query text
+    :type text: unicode
+    :param filename: name shown in tracebacks, e.g. '<graphpage 3 query>'
+    :type filename: unicode
+    :param gpg: the graphpage, its compile time is recorded when given
+    :type gpg: GraphPage
+    :rtype: code
+    """
+    start = time.time()
+    code = compile(text, filename, 'exec')
+    if gpg is not None:
+        record_timing(gpg, 'compile', time.time() - start)
+    return code
+
+
+def run_query(code, local_context, gpg=None):
+    """ Run a compiled query.  The names it defines are added to local_context.  If the sandbox is enabled the
+    query runs in a sandbox worker, with its time and memory limits, and only the names whose values pickle are
+    added.
+
+    :param code: compiled query
+    :type code: code
+    :param local_context: names given to the query, usually the form's POST values
+    :type local_context: dict
+    :param gpg: the graphpage, its run time is recorded when given
+    :type gpg: GraphPage
+    :return: local_context
+    :rtype: dict
+    :raises djangopages.sandbox.SandboxError: if the query fails or runs too long in the sandbox
+    """
+    pool = sandbox_pool()
+    start = time.time()
+    try:
+        if pool is None:
+            exec (code, dict(_namespace), local_context)
+        else:
+            local_context.update(pool.run(code, local_context, namespace='graphpages.query.query_namespace'))
+    finally:
+        if gpg is not None:
+            record_timing(gpg, 'run', time.time() - start)
+    return local_context
+
+########################################################################################################################
+#
+# Query results
+#
+########################################################################################################################
+
+_refreshing = {}            # result key -> thread running the query again
+_refreshing_lock = threading.Lock()
+
+
+def query_result_cache():
+    """ Return the cache of graphpage query results, result key -> (expires, context).  The results are kept
+    in settings.GRAPHPAGE_RESULT_CACHE, a Django cache alias, when set, otherwise in process for at most
+    settings.GRAPHPAGE_RESULT_CACHE_SIZE entries, default 500.  With an alias the contexts must pickle.
+
+    :rtype: djangopages.cache.LRUCache or djangopages.cache.DjangoCache
+    """
+    return named_cache('graphpage_result', alias=getattr(settings, 'GRAPHPAGE_RESULT_CACHE', None),
+                       max_entries=getattr(settings, 'GRAPHPAGE_RESULT_CACHE_SIZE', 500), timeout=None)
+
+
+def result_timeout(gpg):
+    """ Return the seconds a graphpage's query results are reused for the same form input, 0 to run the query
+    every time.  settings.GRAPHPAGE_RESULT_TIMEOUTS maps GraphPage pks to seconds, other pages use
+    settings.GRAPHPAGE_RESULT_TIMEOUT, default 0.  The timeout is a setting rather than a GraphPage field as the
+    project has no migrations to add the column to existing databases.
+
+    .. sourcecode:: python
+
+        GRAPHPAGE_RESULT_TIMEOUTS = {3: 600}        # in settings.py, cache demo page 3's results 10 minutes
+
+    :param gpg: graphpage
+    :type gpg: GraphPage
+    :rtype: int
+    """
+    timeouts = getattr(settings, 'GRAPHPAGE_RESULT_TIMEOUTS', {})
+    return timeouts.get(gpg.pk, getattr(settings, 'GRAPHPAGE_RESULT_TIMEOUT', 0))
+
+
+def result_key(stamp, local_context):
+    """ Return the result cache key for a query version and its input.  Names in
+    settings.GRAPHPAGE_RESULT_IGNORE, default the CSRF token, are not part of the key.
+
+    .. sourcecode:: python
+
+        result_key('3@2014-05-01T00:00:00', {'number_countries': '10', 'csrfmiddlewaretoken': 'x'})
+
+    :param stamp: the query's version, see GraphPageView.get_page_stamp
+    :type stamp: unicode
+    :param local_context: names given to the query
+    :type local_context: dict
+    :rtype: unicode
+    """
+    ignore = getattr(settings, 'GRAPHPAGE_RESULT_IGNORE', ('csrfmiddlewaretoken',))
+    values = sorted((k, v) for k, v in local_context.items() if k not in ignore)
+    return hashlib.sha1(json.dumps([stamp, values], default=unicode).encode('utf8')).hexdigest()
+
+
+def cached_result(key, timeout, func):
+    """ Return the query results for key, running func to get them when they are not cached.  Results older
+    than timeout are served for settings.GRAPHPAGE_RESULT_STALE more seconds while func runs again in a
+    background thread.  Each call gets its own copy of the context, so rendering can not change the cached one.
+
+    :param key: result key, see result_key
+    :type key: unicode
+    :param timeout: seconds the results are fresh
+    :type timeout: int
+    :param func: function running the query, returns the context
+    :type func: callable
+    :return: the query's context
+    :rtype: dict
+    """
+    cache = query_result_cache()
+    entry = cache.get(key)
+    if entry is None:
+        result = func()
+        _store_result(cache, key, timeout, result)
+    else:
+        expires, result = entry
+        if expires <= time.time():
+            _revalidate(cache, key, timeout, func)
+    return dict(result)
+
+
+def _store_result(cache, key, timeout, result):
+    """ Store fresh results, kept for timeout plus the stale seconds. """
+    cache.set(key, (time.time() + timeout, result), timeout + getattr(settings, 'GRAPHPAGE_RESULT_STALE', 300))
+    return
+
+
+def _revalidate(cache, key, timeout, func):
+    """ Run func again in a background thread unless it is already running for key. """
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        thread = threading.Thread(target=_refresh, args=(cache, key, timeout, func), name='graphpage_result')
+        thread.daemon = True
+        _refreshing[key] = thread
+    thread.start()
+    return
+
+
+def _refresh(cache, key, timeout, func):
+    """ Refresh stale results.  On error the stale results are kept until they expire. """
+    try:
+        _store_result(cache, key, timeout, func())
+    except Exception:
+        log.exception('graphpage query refresh failed')
+    finally:
+        close_old_connections()
+        with _refreshing_lock:
+            _refreshing.pop(key, None)
+    return
+
+########################################################################################################################
+#
+# Timings
+#
+########################################################################################################################
+
+_timings = {}
+_timings_lock = threading.Lock()
+
+
+def record_timing(gpg, phase, seconds):
+    """ Record a compile or run of a graphpage's query.  Runs slower than settings.GRAPHPAGE_SLOW_QUERY seconds,
+    default 1, are logged as warnings.
+
+    :param gpg: graphpage
+    :type gpg: GraphPage
+    :param phase: 'compile' or 'run'
+    :type phase: unicode
+    :param seconds: elapsed time
+    :type seconds: float
+    """
+    with _timings_lock:
+        timing = _timings.setdefault(gpg.pk, {'compiles': 0, 'compile_seconds': 0.0, 'runs': 0, 'run_seconds': 0.0,
+                                              'max_run_seconds': 0.0})
+        timing['title'] = gpg.title
+        timing[phase + 's'] += 1
+        timing[phase + '_seconds'] += seconds
+        if phase == 'run':
+            timing['max_run_seconds'] = max(timing['max_run_seconds'], seconds)
+    if phase == 'run' and seconds > getattr(settings, 'GRAPHPAGE_SLOW_QUERY', 1):
+        log.warning('graphpage %s "%s" query ran %.3fs', gpg.pk, gpg.title, seconds)
+    else:
+        log.debug('graphpage %s query %s %.4fs', gpg.pk, phase, seconds)
+    return
+
+
+def query_timings():
+    """ Return the recorded compile and run times of graphpage queries, GraphPage pk -> counts and seconds.
+
+    :rtype: dict
+    """
+    with _timings_lock:
+        return dict((pk, dict(timing)) for pk, timing in _timings.items())
+
+
+def reset_query_timings():
+    """ Forget the recorded times. """
+    with _timings_lock:
+        _timings.clear()
+    return
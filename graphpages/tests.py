@@ -0,0 +1,286 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+""" Graph pages tests
+
+10/17/26 - Initial creation
+
+"""
+
+from __future__ import unicode_literals
+import logging
+
+log = logging.getLogger(__name__)
+
+__author__ = 'rbell01824'
+__date__ = '10/17/26'
+__copyright__ = "Copyright 2014, Richard Bell"
+__credits__ = ['rbell01824']
+__license__ = 'All rights reserved'
+__version__ = '0.1'
+__maintainer__ = 'rbell01824'
+__email__ = 'rbell01824@gmail.com'
+
+import os
+import re
+import time
+import unittest
+
+from django.core.exceptions import ValidationError
+from django.http import QueryDict
+from django.test import TestCase
+from django.test.client import RequestFactory
+from django.test.utils import override_settings
+
+from djangopages.sandbox import SandboxPool, SandboxError, set_sandbox_pool
+from graphpages import utilities
+from graphpages.models import GraphPage
+from graphpages import query
+from graphpages.query import query_code_cache, query_result_cache, query_timings, reset_query_timings, result_key
+from graphpages.utilities import pivot, xgraphck_multiple_series
+from graphpages.views import GraphPageView, graphpage_form_cache, graphpage_template_cache
+
+RUNS = []
+
+FORM = '''class GraphForm(forms.Form):
+    title = forms.CharField(max_length=80, label='{}')
+limit = 10
+from graphpages.tests import RUNS
+RUNS.append('form')
+'''
+
+
+class PivotTest(TestCase):
+    rows = [{'host': 'h2', 'type': 'warning', 'n': 8},
+            {'host': 'h1', 'type': 'critical', 'n': 26},
+            {'host': 'h2', 'type': 'critical', 'n': 69},
+            {'host': 'h3', 'type': 'warning', 'n': 3170}]
+
+    def test_first_appearance(self):
+        self.assertEqual(pivot(self.rows, 'type', 'host', 'n'),
+                         [{'name': 'warning', 'data': [['h2', 8], ['h3', 3170]]},
+                          {'name': 'critical', 'data': [['h1', 26], ['h2', 69]]}])
+
+    def test_tuples_and_iterators(self):
+        tuples = [(r['type'], r['host'], r['n']) for r in self.rows]
+        self.assertEqual(pivot(iter(tuples), 0, 1, 2), pivot(self.rows, 'type', 'host', 'n'))
+        self.assertEqual(pivot([], 0, 1, 2), [])
+
+    def test_fill_and_sort(self):
+        self.assertEqual(pivot(self.rows, 'type', 'host', 'n', fill=0, sort=True),
+                         [{'name': 'critical', 'data': [['h1', 26], ['h2', 69], ['h3', 0]]},
+                          {'name': 'warning', 'data': [['h1', 0], ['h2', 8], ['h3', 3170]]}])
+        self.assertEqual(pivot(self.rows, 'type', 'host', 'n', fill=None)[0]['data'],
+                         [['h2', 8], ['h1', None], ['h3', 3170]])
+
+    def test_multiple_series(self):
+        key = lambda s: s['name']
+        legacy = [{'name': t, 'data': [[r['host'], r['n']] for r in self.rows if r['type'] == t]}
+                  for t in set(r['type'] for r in self.rows)]
+        self.assertEqual(sorted(xgraphck_multiple_series(self.rows, 'type', 'host', 'n'), key=key),
+                         sorted(legacy, key=key))
+
+    @unittest.skipIf(utilities.numpy is None, 'NumPy is not installed')
+    def test_numpy_same_as_python(self):
+        rows = self.rows + [{'host': 'h1', 'type': 'critical', 'n': 27}, {'host': 'h4', 'type': 'info', 'n': 'x'}]
+        for sort in (False, True):
+            self.assertEqual(pivot(rows, 'type', 'host', 'n', fill=0, sort=sort, use_numpy=True),
+                             pivot(rows, 'type', 'host', 'n', fill=0, sort=sort))
+        self.assertEqual(pivot(self.rows[:2], 'type', 'host', 'n', fill=0, use_numpy=True),
+                         [{'name': 'warning', 'data': [['h2', 8], ['h1', 0]]},
+                          {'name': 'critical', 'data': [['h2', 0], ['h1', 26]]}])
+
+
+class FormCacheTest(TestCase):
+    def setUp(self):
+        graphpage_form_cache().clear()
+        del RUNS[:]
+        self.view = GraphPageView()
+        self.page = GraphPage.objects.create(title='Form page', form=FORM.format('Title'))
+
+    def form(self, pk):
+        return self.view.get_form_object_and_context(GraphPage.objects.get(pk=pk))
+
+    def test_cached(self):
+        form_class, context = self.form(self.page.pk)
+        self.assertEqual(form_class().fields['title'].label, 'Title')
+        self.assertEqual(context['limit'], 10)
+        self.assertIs(context['self'], self.view)
+        code = graphpage_form_cache().get(self.page.pk)[1]
+        self.form(self.page.pk)
+        self.assertIs(graphpage_form_cache().get(self.page.pk)[1], code)   # compiled once
+        self.assertEqual(RUNS, ['form', 'form'])                            # execed for each request
+        self.page.form = FORM.format('New title')
+        self.page.save()
+        form_class, context = self.form(self.page.pk)
+        self.assertEqual(form_class().fields['title'].label, 'New title')
+
+    def test_form_ref(self):
+        page = GraphPage.objects.create(title='Form ref page', form_ref=self.page)
+        self.form(page.pk)
+        self.form(self.page.pk)
+        self.assertEqual(len(graphpage_form_cache()), 2)
+        self.assertIsNot(graphpage_form_cache().get(page.pk), graphpage_form_cache().get(self.page.pk))
+        self.page.form = FORM.format('New title')
+        self.page.save()
+        self.assertEqual(self.form(page.pk)[0]().fields['title'].label, 'New title')
+
+
+class TemplateCacheTest(TestCase):
+    def setUp(self):
+        graphpage_template_cache().clear()
+        self.view = GraphPageView()
+        self.page = GraphPage.objects.create(title='Graph page', graph_page='{% load chartkick %}<h3>{{ title }}</h3>'
+                                                                            '{% pie_chart data with height=h %}')
+
+    def render(self, pk, **context):
+        html = self.view.build_graph_graph_response(None, GraphPage.objects.get(pk=pk), context)
+        return re.sub(r'chart-\d+', 'chart-n', html)
+
+    def test_cached(self):
+        stats = graphpage_template_cache().stats()
+        first = self.render(self.page.pk, title='One', data=[['a', 1]], h='100px')
+        self.assertIn('<h3>One</h3>', first)
+        self.assertIn('height: 100px', first)
+        second = self.render(self.page.pk, title='Two', data=[['b', 2]], h='200px')
+        self.assertIn('height: 200px', second)
+        self.assertIn('[["b", 2]]', second)
+        self.assertEqual(graphpage_template_cache().stats()['misses'] - stats['misses'], 1)
+        self.assertEqual(graphpage_template_cache().stats()['hits'] - stats['hits'], 1)
+
+    def test_graph_page_ref(self):
+        page = GraphPage.objects.create(title='Graph page ref', graph_page_ref=self.page)
+        self.assertIn('<h3>One</h3>', self.render(page.pk, title='One', data=[], h='1px'))
+        self.page.graph_page = '<h4>{{ title }}</h4>'
+        self.page.save()
+        self.assertIn('<h4>Two</h4>', self.render(page.pk, title='Two'))
+
+
+class QueryTest(TestCase):
+    def setUp(self):
+        query_code_cache().clear()
+        reset_query_timings()
+        self.view = GraphPageView()
+        self.page = GraphPage.objects.create(title='Query page', query='global shared\n'
+                                                                       'seen = shared if "shared" in globals() else 0\n'
+                                                                       'shared = 1\n'
+                                                                       'n = int(number) * 2\n'
+                                                                       'kind = type("")\n')
+
+    def test_compiled_once(self):
+        stats = query_code_cache().stats()
+        for number in ('3', '4'):
+            context = self.view.execute_graphpage_query(None, self.page, QueryDict('number=' + number))
+            self.assertEqual(context['n'], int(number) * 2)
+            self.assertEqual(context['seen'], 0)            # globals are fresh for every run
+            self.assertEqual(context['kind'], unicode)      # compiled with unicode_literals
+        self.assertEqual(query_code_cache().stats()['misses'] - stats['misses'], 1)
+        timing = query_timings()[self.page.pk]
+        self.assertEqual((timing['compiles'], timing['runs'], timing['title']), (1, 2, 'Query page'))
+
+    def test_query_ref(self):
+        page = GraphPage.objects.create(title='Query ref', query_ref=self.page)
+        self.assertEqual(self.view.execute_graphpage_query(None, page, QueryDict('number=1'))['n'], 2)
+        self.page.query = 'n = int(number) * 3'
+        self.page.save()
+        self.assertEqual(self.view.execute_graphpage_query(None, page, QueryDict('number=1'))['n'], 3)
+
+
+@override_settings(GRAPHPAGE_RESULT_TIMEOUT=60)
+class ResultCacheTest(TestCase):
+    def setUp(self):
+        query_result_cache().clear()
+        del RUNS[:]
+        self.view = GraphPageView()
+        self.page = GraphPage.objects.create(title='Cached query',
+                                             query='from graphpages.tests import RUNS\n'
+                                                   'RUNS.append(number)\n'
+                                                   'runs = len(RUNS)\n')
+
+    def run_query(self, post):
+        return self.view.execute_graphpage_query(None, self.page, QueryDict(post))
+
+    def test_cached(self):
+        self.assertEqual(self.run_query('number=1&csrfmiddlewaretoken=a')['runs'], 1)
+        self.assertEqual(self.run_query('csrfmiddlewaretoken=b&number=1')['runs'], 1)
+        self.assertEqual(self.run_query('number=2')['runs'], 2)
+        self.page.save()                                        # a new version of the page misses
+        self.assertEqual(self.run_query('number=2')['runs'], 3)
+        with self.settings(GRAPHPAGE_RESULT_TIMEOUTS={self.page.pk: 0}):
+            self.assertEqual(self.run_query('number=2')['runs'], 4)
+
+    def test_context_copied(self):
+        self.run_query('number=1')['runs'] = 'changed'
+        self.assertEqual(self.run_query('number=1')['runs'], 1)
+
+    def test_stale_while_revalidate(self):
+        self.run_query('number=1')
+        key = result_key(self.view.get_page_stamp(self.page, 'query'), {'number': '1'})
+        cache = query_result_cache()
+        cache.set(key, (time.time() - 1, cache.get(key)[1]))     # expired
+        self.assertEqual(self.run_query('number=1')['runs'], 1)   # stale results, refreshed in the background
+        for thread in list(query._refreshing.values()):
+            thread.join()
+        self.assertEqual(RUNS, ['1', '1'])
+        self.assertEqual(self.run_query('number=1')['runs'], 2)
+
+
+class RefChainTest(TestCase):
+    def setUp(self):
+        self.view = GraphPageView()
+        self.c = GraphPage.objects.create(title='C', query='n = 3', form_page='<p>form page</p>', form='form')
+        self.b = GraphPage.objects.create(title='B', query_ref=self.c, form_page_ref=self.c)
+        self.a = GraphPage.objects.create(title='A', query_ref=self.b, form_page_ref=self.b, graph_page='graph')
+
+    def test_one_query(self):
+        with self.assertNumQueries(1):
+            gpg = GraphPage.with_refs().get(pk=self.a.pk)
+            self.assertEqual(self.view.get_query_text(gpg), 'n = 3')
+            self.assertIn('<p>form page</p>', self.view.get_form_page_text(gpg))
+            self.assertEqual(gpg.ref_page('graph_page'), gpg)
+            self.assertEqual(gpg.ref_stamp('query'), '{}@{}:{}@{}:{}@{}'.format(
+                self.a.pk, self.a.modified.isoformat(), self.b.pk, self.b.modified.isoformat(),
+                self.c.pk, self.c.modified.isoformat()))
+
+    @override_settings(GRAPHPAGE_REF_DEPTH=1)
+    def test_deeper_than_loaded(self):
+        gpg = GraphPage.with_refs().get(pk=self.a.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual([p.title for p in gpg.ref_chain('query')], ['A', 'B', 'C'])
+        self.assertEqual(self.view.execute_graphpage_query(None, gpg, QueryDict('x=1'))['n'], 3)
+
+    def test_cycle(self):
+        self.c.query_ref = self.a
+        self.c.save()
+        gpg = GraphPage.with_refs().get(pk=self.a.pk)
+        self.assertRaises(ValidationError, gpg.ref_chain, 'query')
+        self.assertEqual(len(gpg.ref_chain('form_page')), 3)
+        with self.assertRaises(ValidationError) as error:
+            self.c.clean()
+        self.assertEqual(list(error.exception.message_dict), ['query_ref'])
+        response = GraphPageView.as_view()(RequestFactory().get('/graphpages/graphpage/{}'.format(self.a.pk)),
+                                           graph_pk=str(self.a.pk))
+        self.assertEqual(response.status_code, 500)
+        self.assertIn('refers to itself', response.content.decode('utf8'))
+
+
+@override_settings(DPAGE_SANDBOX_WORKERS=1)
+class SandboxQueryTest(TestCase):
+    def setUp(self):
+        set_sandbox_pool(SandboxPool(1, timeout=1))
+        reset_query_timings()
+        self.view = GraphPageView()
+
+    def tearDown(self):
+        set_sandbox_pool(None)
+
+    def test_query(self):
+        page = GraphPage.objects.create(title='Sandboxed', query='import os\nn = int(number) + 1\npid = os.getpid()')
+        context = self.view.execute_graphpage_query(None, page, QueryDict('number=1'))
+        self.assertEqual((context['n'], context['number']), (2, '1'))
+        self.assertNotEqual(context['pid'], os.getpid())
+        self.assertEqual(query_timings()[page.pk]['runs'], 1)
+
+    def test_runaway(self):
+        page = GraphPage.objects.create(title='Runaway', query='while True: pass')
+        self.assertRaises(SandboxError, self.view.execute_graphpage_query, None, page, QueryDict('number=1'))
@@ -20,6 +20,13 @@ __status__ = "dev"
 
 import markdown
 import collections
+import itertools
+import operator
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 from django.conf import settings
 from django.template import add_to_builtins
@@ -197,6 +204,9 @@ def xgraphck_multiple_series(list_of_dicts, name, data_label, data_value):
             ...
              {'data': [['A0040CnBEPC2', 8], ['A0040CnBPGC1', 3170]], 'name': 'warning'}]
 
+    .. note:: Equivalent to pivot(list_of_dicts, name, data_label, data_value).  Series are in order of
+        first appearance.
+
     :param list_of_dicts: List of dictionary entries to process
     :type list_of_dicts: list of dict
     :param name: dictionary name for the name field
@@ -208,9 +218,114 @@ def xgraphck_multiple_series(list_of_dicts, name, data_label, data_value):
     :return: List of dictionary entries suitable for chartkick multiple series
     :rtype: list of dict
     """
-    names = list(set([x[name] for x in list_of_dicts]))
-    data = []
-    for a_name in names:
-        z = {'name': a_name, 'data': [[x[data_label], x[data_value]] for x in list_of_dicts if x[name] == a_name]}
-        data.append(z)
-    return data
+    return pivot(list_of_dicts, name, data_label, data_value)
+
+_NO_FILL = object()
+
+
+def pivot(rows, name, label, value, fill=_NO_FILL, sort=False, use_numpy=False):
+    """
+    Pivot rows into a chartkick multiple series list in one pass over the rows.
+
+    Rows may be dicts, ex. from QuerySet.values(...), or tuples, ex. from QuerySet.values_list(...), and
+    may be any iterable including a QuerySet iterator.  name, label, and value are the rows' keys or indices.
+
+        pivot(VSyslog.objects.values('node__host_name', 'message_type').annotate(num_results=Count('id')),
+              'message_type', 'node__host_name', 'num_results')
+
+        pivot(qs.values_list('message_type', 'node__host_name').annotate(Count('id')).iterator(), 0, 1, 2,
+              fill=0, sort=True)
+
+    returns
+
+            [{'name': 'critical', 'data': [['A0040CnBEPC1', 26], ['A0040CnBEPC2', 69]]},
+            ...
+             {'name': 'warning', 'data': [['A0040CnBEPC2', 8], ['A0040CnBPGC1', 3170]]}]
+
+    :param rows: rows to pivot
+    :type rows: iterable of dict or tuple
+    :param name: key or index of the series name
+    :type name: unicode or int
+    :param label: key or index of the data label, ex. x value
+    :type label: unicode or int
+    :param value: key or index of the data value
+    :type value: unicode or int
+    :param fill: if given, every series has a point for every label, missing points have value fill.  If a
+        series has several points for a label the last is used.
+    :type fill: varies
+    :param sort: if True, series are sorted by name and points by label, otherwise both are in order of first
+        appearance
+    :type sort: bool
+    :param use_numpy: if True, fill series with NumPy, which must be installed.  The filled series are
+        built in a names x labels matrix rather than in dicts.  See benchmarks.bench_pivot, building the
+        result lists dominates so for most inputs the pure Python pivot is as fast.
+    :type use_numpy: bool
+    :return: List of dictionary entries suitable for chartkick multiple series
+    :rtype: list of dict
+    """
+    if use_numpy and numpy is None:
+        raise ImportError('pivot use_numpy=True requires NumPy')
+    get = operator.itemgetter(name, label, value)
+    if fill is not _NO_FILL:
+        if use_numpy:
+            rows = [get(row) for row in rows]
+            return _pivot_fill_numpy(rows, fill, sort) if rows else []
+        return _pivot_fill(itertools.imap(get, rows), fill, sort)
+    series = collections.OrderedDict()
+    for a_name, a_label, a_value in itertools.imap(get, rows):
+        try:
+            series[a_name].append([a_label, a_value])
+        except KeyError:
+            series[a_name] = [[a_label, a_value]]
+    if sort:
+        return [{'name': a_name, 'data': sorted(series[a_name], key=operator.itemgetter(0))}
+                for a_name in sorted(series)]
+    return [{'name': a_name, 'data': a_data} for a_name, a_data in series.iteritems()]
+
+
+def _pivot_fill(rows, fill, sort):
+    """ pivot with fill for (name, label, value) rows. """
+    series = collections.OrderedDict()
+    labels = {}                                     # label -> order of first appearance
+    for a_name, a_label, a_value in rows:
+        try:
+            series[a_name][a_label] = a_value
+        except KeyError:
+            series[a_name] = {a_label: a_value}
+        if a_label not in labels:
+            labels[a_label] = len(labels)
+    names = sorted(series) if sort else series
+    labels = sorted(labels) if sort else sorted(labels, key=labels.get)
+    return [{'name': a_name, 'data': [[a_label, series[a_name].get(a_label, fill)] for a_label in labels]}
+            for a_name in names]
+
+
+def _pivot_fill_numpy(rows, fill, sort):
+    """ pivot with fill for (name, label, value) rows with NumPy.  Names and labels are coded in one pass and
+    the values scattered into a names x labels matrix initialized to fill.
+    """
+    names, name_codes = _factorize([row[0] for row in rows])
+    labels, label_codes = _factorize([row[1] for row in rows])
+    values = numpy.array([row[2] for row in rows])
+    if values.ndim != 1 or values.dtype.kind not in 'biuf':
+        values = numpy.empty(len(rows), dtype=object)
+        values[:] = [row[2] for row in rows]
+    matrix = numpy.empty((len(names), len(labels)), dtype=numpy.result_type(values, numpy.array([fill])))
+    matrix.fill(fill)
+    matrix[name_codes, label_codes] = values
+    if sort:
+        name_order = sorted(range(len(names)), key=names.__getitem__)
+        label_order = sorted(range(len(labels)), key=labels.__getitem__)
+        names = [names[i] for i in name_order]
+        labels = [labels[i] for i in label_order]
+        matrix = matrix[name_order][:, label_order]
+    return [{'name': a_name, 'data': [[a_label, a_value] for a_label, a_value in zip(labels, row)]}
+            for a_name, row in zip(names, matrix.tolist())]
+
+
+def _factorize(items):
+    """ Return the distinct items in order of first appearance and an array of each item's index into them. """
+    codes = {}
+    setdefault = codes.setdefault
+    indices = numpy.fromiter((setdefault(item, len(codes)) for item in items), dtype=numpy.intp, count=len(items))
+    return sorted(codes, key=codes.get), indices
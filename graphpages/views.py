@@ -19,10 +19,15 @@ __license__ = "All rights reserved"
 __version__ = "0.1"
 __status__ = "dev"
 
+import copy
+
+from chartkick.templatetags.chartkick import ChartNode
 from django.core.exceptions import ValidationError
-from django.http import HttpResponse
+from django.http import HttpResponse, HttpResponseServerError
+from django.utils.html import escape
 from django.shortcuts import get_object_or_404
 from django.template import Context, RequestContext, Template
+from django.template.loader_tags import ConstantIncludeNode
 from django.views.generic.list import ListView
 from django.views.generic import View
 
@@ -31,7 +36,9 @@ from django.views.generic import View
 # noinspection PyUnresolvedReferences
 from django import forms
 
+from djangopages.cache import named_cache
 from graphpages.models import GraphPage
+from graphpages.query import query_code_cache, compile_query, run_query, cached_result, result_key, result_timeout
 
 # noinspection PyUnresolvedReferences
 # from graphpages.utilities import XGraphPage, XGraphRow, XGraphColumn, XGraphCK
@@ -55,6 +62,71 @@ from django.conf import settings
 
 # todo 3: install and use python-markdown2 from https://github.com/trentm/python-markdown2
 
+########################################################################################################################
+#
+# Compiled graphpage caches
+#
+########################################################################################################################
+
+
+def graphpage_form_cache():
+    """ Return this process's cache of compiled graphpage forms, GraphPage pk -> (stamp, code, form text).
+    The cache holds at most settings.GRAPHPAGE_FORM_CACHE_SIZE entries, default 100, least recently used are
+    evicted.  An entry is stale, and replaced, when its stamp differs from the page's, see get_form_stamp.
+
+    :rtype: djangopages.cache.LRUCache
+    """
+    return named_cache('graphpage_form', max_entries=getattr(settings, 'GRAPHPAGE_FORM_CACHE_SIZE', 100),
+                       timeout=None)
+
+
+def graphpage_template_cache():
+    """ Return this process's cache of compiled graphpage templates, (kind, GraphPage pk, stamp) -> Template.
+    The stamp is the pks and modified times of the pages the template is taken through, so an edited page misses
+    and its old entries are evicted as least recently used.  The cache holds at most
+    settings.GRAPHPAGE_TEMPLATE_CACHE_SIZE entries, default 200.  Hits and misses are reported by stats() and
+    djangopages.cache.cache_stats().
+
+    :rtype: djangopages.cache.LRUCache
+    """
+    return named_cache('graphpage_template', max_entries=getattr(settings, 'GRAPHPAGE_TEMPLATE_CACHE_SIZE', 200),
+                       timeout=None)
+
+
+class _ReentrantChartNode(ChartNode):
+    """ ChartNode that may render repeatedly and concurrently.  ChartNode.render replaces option variables
+    with their values, so a cached template would keep the values of its first render.
+    """
+    def render(self, context):
+        node = copy.copy(self)
+        node.options = dict(self.options)
+        return super(_ReentrantChartNode, node).render(context)
+
+
+def compile_template(text):
+    """ Compile template text for reuse across requests.  The chart tags of the template and of templates it
+    includes by name are made reentrant.
+
+    :param text: template text
+    :type text: unicode
+    :rtype: Template
+    """
+    template = Template(text)
+    nodelists = [template.nodelist]
+    while nodelists:
+        nodelist = nodelists.pop()
+        for node in nodelist.get_nodes_by_type(ChartNode):
+            node.__class__ = _ReentrantChartNode
+        nodelists.extend(node.template.nodelist for node in nodelist.get_nodes_by_type(ConstantIncludeNode)
+                         if node.template)
+    return template
+
+########################################################################################################################
+#
+# Display graphpages
+#
+########################################################################################################################
+
 
 class GraphPageView(View):
     """
@@ -62,6 +134,18 @@ class GraphPageView(View):
     process form response, run graphpage query, and display resulting graphapage graphs.
     """
 
+    def dispatch(self, request, *args, **kwargs):
+        """
+        Answer a page that can not be built, e.g. one whose *_ref chain refers back to itself, with an error
+        page naming the problem rather than an unhandled exception.
+        """
+        try:
+            return super(GraphPageView, self).dispatch(request, *args, **kwargs)
+        except ValidationError as e:
+            log.error('graphpage %s: %s', kwargs.get('graph_pk'), '; '.join(e.messages))
+            return HttpResponseServerError('<h1>Graphpage {} can not be shown</h1><p>{}</p>'.format(
+                escape(kwargs.get('graph_pk')), '<br>'.join(escape(m) for m in e.messages)))
+
     # noinspection PyMethodMayBeStatic
     def get(self, request, graph_pk):
         """
@@ -74,7 +158,7 @@ class GraphPageView(View):
         :param graph_pk: Primary key for graphpage
         """
 
-        gpg = get_object_or_404(GraphPage, pk=graph_pk)
+        gpg = get_object_or_404(GraphPage.with_refs(), pk=graph_pk)
 
         if self.page_has_form(gpg):         # process form if present
             return HttpResponse(self.build_display_form_response(request, gpg))
@@ -90,15 +174,14 @@ class GraphPageView(View):
         :param graph_pk: Primary key for graphpage
         """
         # validate the form
-        gpg = GraphPage.objects.get(pk=graph_pk)
+        gpg = GraphPage.with_refs().get(pk=graph_pk)
         form_class_obj, context = self.get_form_object_and_context(gpg)
         form = form_class_obj(request.POST)
         if form.is_valid():
             return HttpResponse(self.build_graph_graph_response(request, gpg, request.POST))
 
         # form not valid, so redisplay form with errors
-        form_page = self.get_form_page_text(gpg)
-        t = Template(form_page)
+        t = self.get_template(gpg, 'form_page')
         c = RequestContext(request, {'graph_pk': str(gpg.pk), 'graphform': form})
         return HttpResponse(t.render(c))
 
@@ -110,7 +193,7 @@ class GraphPageView(View):
         :param gpg: Graph page object
         :type gpg: GraphPage
         """
-        return gpg.form or gpg.form_ref
+        return gpg.form or gpg.form_ref_id
 
     def build_display_form_response(self, request, gpg):
         """
@@ -122,35 +205,69 @@ class GraphPageView(View):
 
         # get the form and form_page
         form_class_obj, context = self.get_form_object_and_context(gpg)
-        form_page = self.get_form_page_text(gpg)
+        t = self.get_template(gpg, 'form_page')
 
         # create unbound form object
         graphform = form_class_obj()
 
         # render response
-        t = Template(form_page)
         c = RequestContext(request, {'graph_pk': str(gpg.pk), 'graphform': graphform, 'form_context': context})
         return t.render(c)
 
-    # noinspection PyUnresolvedReferences
     def get_form_object_and_context(self, gpg):
         """
         Get the forms.form object and any context defined with the form.
         Note, a graphpage form may contain arbitrary python code.  This code is execed and available
         as context when the graphpage query is run and the graphpage graphs displayed.
 
+        The form text is compiled once per process and page version, then taken from graphpage_form_cache.  It
+        is execed for each request, so initial values and choices it computes, ex. dates or querysets, are current.
+
         :param gpg: graphpage object
         :type gpg: GraphPage
-        :return:  # fixme
-        :rtype:
+        :return: the GraphForm class and the names the form text defines
+        :rtype: tuple
         """
+        cache = graphpage_form_cache()
+        stamp = self.get_form_stamp(gpg)
+        entry = cache.get(gpg.pk)
+        if entry is None or entry[0] != stamp:
+            form_text = self.get_form_text(gpg)
+            entry = (stamp, compile(form_text, '<graphpage {} form>'.format(gpg.pk), 'exec'), form_text)
+            cache.set(gpg.pk, entry)
+        stamp, code, form_text = entry
+        return self.exec_form(gpg, code, form_text)
 
-        # get the form definition
-        form_text = self.get_form_text(gpg)
+    # noinspection PyUnresolvedReferences
+    def exec_form(self, gpg, code, form_text):
+        """
+        Exec the compiled form text of a graphpage.
+
+        :param gpg: graphpage object
+        :type gpg: GraphPage
+        :param code: the compiled form text
+        :type code: code
+        :param form_text: the form text
+        :type form_text: unicode
+        :return: the GraphForm class and the names the form text defines
+        :rtype: tuple
+        """
 
         # create the form object
-        exec (form_text, globals(), locals())
-        return GraphForm, locals()
+        context = {'self': self, 'gpg': gpg, 'form_text': form_text}
+        exec (code, globals(), context)
+        return context['GraphForm'], context
+
+    @staticmethod
+    def get_form_stamp(gpg):
+        """
+        Get the version of a graphpage's form, see GraphPage.ref_stamp.
+
+        :param gpg: graphpage object
+        :type gpg: GraphPage
+        :rtype: unicode
+        """
+        return gpg.ref_stamp('form')
 
     @staticmethod
     def get_form_text(gpg):
@@ -162,10 +279,7 @@ class GraphPageView(View):
         :return: text of for
         :rtype: unicode
         """
-        if gpg.form_ref:
-            form = gpg.form_ref.form.strip()
-        else:
-            form = gpg.form.strip()
+        form = gpg.ref_page('form').form.strip()
 
         # todo: here could run through template processor
 
@@ -185,13 +299,8 @@ class GraphPageView(View):
         :rtype: unicode
         """
 
-        # get the form page definition
-        if gpg.form_page_ref:
-            # Note: here is where multiple indirections would need to be dealt with for forms.
-            # For the moment just 1 level.
-            page = gpg.form_page_ref.form.strip()
-        else:
-            page = gpg.form_page.strip()
+        # get the form page definition, following form_page_ref as far as it goes
+        page = gpg.ref_page('form_page').form_page.strip()
 
         # todo: here could run through template processor
 
@@ -223,11 +332,58 @@ class GraphPageView(View):
         _context = Context(context)
 
         # get the template and render
-        gp_text = self.get_graph_page_text(gpg)
-        template = Template(gp_text)
+        template = self.get_template(gpg, 'graph_page')
         response = template.render(_context)
         return response
 
+    def get_template(self, gpg, kind):
+        """
+        Get the compiled form page or graph page template of a graphpage from graphpage_template_cache.
+
+        :param gpg: graphpage object
+        :type gpg: GraphPage
+        :param kind: 'form_page' or 'graph_page'
+        :type kind: unicode
+        :rtype: Template
+        """
+        key = '{}:{}'.format(kind, self.get_page_stamp(gpg, kind))
+        cache = graphpage_template_cache()
+        template = cache.get(key)
+        if template is None:
+            text = self.get_form_page_text(gpg) if kind == 'form_page' else self.get_graph_page_text(gpg)
+            template = compile_template(text)
+            cache.set(key, template)
+        return template
+
+    @staticmethod
+    def get_page_stamp(gpg, kind):
+        """
+        Get the version of one part of a graphpage, see GraphPage.ref_stamp.
+
+        :param gpg: graphpage object
+        :type gpg: GraphPage
+        :param kind: 'form_page', 'query', or 'graph_page'
+        :type kind: unicode
+        :rtype: unicode
+        """
+        return gpg.ref_stamp(kind)
+
+    def get_query_code(self, gpg):
+        """
+        Get the compiled query of a graphpage from graphpages.query.query_code_cache.
+
+        :param gpg: graphpage object
+        :type gpg: GraphPage
+        :rtype: code
+        """
+        key = self.get_page_stamp(gpg, 'query')
+        cache = query_code_cache()
+        code = cache.get(key)
+        if code is None:
+            code = compile_query(self.get_query_text(gpg), '<graphpage {} query>'.format(gpg.pk), gpg)
+            cache.set(key, code)
+        return code
+
     @staticmethod
     def page_has_query(gpg):
         """
@@ -238,13 +394,14 @@ class GraphPageView(View):
         :return: True if the graphpage has a query
         :rtype: bool
         """
-        return gpg.query or gpg.query_ref
+        return gpg.query or gpg.query_ref_id
 
     # noinspection PyUnusedLocal
     def execute_graphpage_query(self, request, gpg, form_context=None):
         """
         Execute a grasph form query.  This creates a context that is used by the graph page
-        to actually display the graph.
+        to actually display the graph.  The query runs with the small namespace of graphpages.query, not this
+        module's globals.
 
         :param request: The request object.
         :type request: WSGIRequest
@@ -258,9 +415,6 @@ class GraphPageView(View):
 
         # todo 2: make exec safe
 
-        # Save the global context before it gets altered.
-        global_context = dict(globals())
-
         # get the query if there is one, otherwise just return an empty list
         query_text = self.get_query_text(gpg)
         if len(query_text) <= 0:
@@ -272,11 +426,30 @@ class GraphPageView(View):
             # noinspection PyUnresolvedReferences
             local_context = form_context.dict()
 
-        # Execute the query.
-            exec (query_text, global_context, local_context)
+        # Execute the query, compiled once per page version, see graphpages.query.
+            local_context = self.run_cached_query(gpg, local_context)
 
         return local_context
 
+    def run_cached_query(self, gpg, local_context):
+        """
+        Run the graphpage query.  If the page has a result timeout, the results are reused for the same input,
+        see graphpages.query.result_timeout and cached_result.
+
+        :param gpg: Graphpage object
+        :type gpg: GraphPage
+        :param local_context: names given to the query
+        :type local_context: dict
+        :return: context dictionary with the results of the query
+        :rtype: dict
+        """
+        code = self.get_query_code(gpg)
+        timeout = result_timeout(gpg)
+        if not timeout:
+            return run_query(code, local_context, gpg)
+        key = result_key(self.get_page_stamp(gpg, 'query'), local_context)
+        return cached_result(key, timeout, lambda: run_query(code, dict(local_context), gpg))
+
     @staticmethod
     def get_query_text(gpg):
         """
@@ -298,13 +471,8 @@ class GraphPageView(View):
         # If it becomes necessary to support markdown this is where it shold be processed.
         #
 
-        # get the query text
-        if gpg.query_ref:
-            # Note: here is where multiple indirections would need to be dealt with for query.
-            # For the moment just 1 level.
-            page = gpg.query_ref.query
-        else:
-            page = gpg.query
+        # get the query text, following query_ref as far as it goes
+        page = gpg.ref_page('query').query
 
         # todo: here could run through template processor
 
@@ -322,12 +490,8 @@ class GraphPageView(View):
         :rtype: unicode
         """
 
-        # get the graph page text
-        if gpg.graph_page_ref:
-            page = gpg.graph_page_ref.graph_page
-        else:
-            page = gpg.graph_page
-        page = page.strip()
+        # get the graph page text, following graph_page_ref as far as it goes
+        page = gpg.ref_page('graph_page').graph_page.strip()
 
         # todo: here could run through template processor
 
@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+Syslog ingestion
+****************
+
+.. module:: ingest
+   :synopsis: Bulk load raw syslog files into VSyslog
+
+.. moduleauthor:: Richard Bell <rbell01824@gmail.com>
+
+Raw syslog lines are parsed into time, message_text, message_type, and message_error on a process pool, the
+sending host is resolved to a VNode by IP address or host name from an in-memory map, and the records are
+written with bulk_create, one transaction per chunk of lines.  The syslog rollups are updated in the same
+transaction.
+
+.. sourcecode:: python
+
+    stats = ingest_syslog(['/var/log/remote/node1.log', '/var/log/remote/node2.log.gz'], company='BMC_1')
+    stats['lines_per_second']
+
+Lines are expected in BSD syslog form with the message type, usually the severity, following the message text:
+
+.. sourcecode:: text
+
+    <187>May  1 00:10:00 10.1.2.3 sessctrl 8855 critical: session table full
+    2014-05-01T00:10:00Z A0040CnBPGC1 cli 30051 trace
+
+10/17/26 - Initial creation
+
+"""
+
+from __future__ import unicode_literals
+import logging
+
+log = logging.getLogger(__name__)
+
+__author__ = 'rbell01824'
+__date__ = '10/17/26'
+__copyright__ = "Copyright 2014, Richard Bell"
+__credits__ = ['rbell01824']
+__license__ = 'All rights reserved'
+__version__ = '0.1'
+__maintainer__ = 'rbell01824'
+__email__ = 'rbell01824@gmail.com'
+
+import collections
+import datetime
+import gzip
+import itertools
+import multiprocessing
+import re
+import sys
+import time
+
+from django.db import transaction
+from django.utils import timezone
+
+from test_data.models import VSyslog, MAX_SYSLOG_MESSAGE_LENGTH, MAX_SYSLOG_MESSAGE_TYPE, MAX_SYSLOG_ERROR_MESSAGE, \
+    syslog_lookup, syslog_rollup_add
+
+########################################################################################################################
+#
+# Parsing
+#
+########################################################################################################################
+
+SEVERITIES = ('emerg', 'alert', 'crit', 'err', 'warning', 'notice', 'info', 'debug')
+MESSAGE_TYPES = ('emergency', 'emerg', 'alert', 'critical', 'crit', 'error', 'err', 'warning', 'warn', 'notice',
+                 'info', 'debug', 'trace')
+MONTHS = dict((m, n) for n, m in enumerate(('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+                                            'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'), 1))
+
+_HEADER = re.compile(r'^(?:<(?P<pri>\d{1,3})>)?\s*'
+                     r'(?:(?P<month>[A-Z][a-z]{2})\s+(?P<day>\d{1,2})\s+(?P<hms>\d\d:\d\d:\d\d)'
+                     r'|(?P<iso>\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(?:\.\d+)?(?P<offset>Z|[+-]\d\d:?\d\d)?)'
+                     r'\s+(?P<host>\S+)\s+(?P<message>.*?)\s*$')
+_MESSAGE = re.compile(r'^(?P<text>.*?)\s*\b(?P<type>{})\b:?\s*(?P<error>.*)$'.format('|'.join(MESSAGE_TYPES)),
+                      re.IGNORECASE)
+
+
+def parse_line(line, year):
+    """
+    Parse a raw syslog line.
+
+    .. sourcecode:: python
+
+        parse_line('<187>May  1 00:10:00 10.1.2.3 sessctrl 8855 critical: session table full', 2014)
+        # ('10.1.2.3', datetime(2014, 5, 1, 0, 10, tzinfo=utc), 'sessctrl 8855', 'critical',
+        #  'session table full', '<187>May  1 00:10:00 10.1.2.3 sessctrl 8855 critical: session table full')
+
+    :param line: the raw line
+    :type line: unicode
+    :param year: year for timestamps that have none
+    :type year: int
+    :return: (host, time, message_text, message_type, message_error, line) or None if line is not syslog
+    :rtype: tuple or None
+    """
+    line = line.rstrip('\r\n')
+    header = _HEADER.match(line)
+    if not header:
+        return None
+    try:
+        if header.group('iso'):
+            t = datetime.datetime.strptime(header.group('iso'), '%Y-%m-%dT%H:%M:%S')
+            offset = header.group('offset')
+            if offset and offset != 'Z':
+                sign = -1 if offset[0] == '-' else 1
+                t -= sign * datetime.timedelta(hours=int(offset[1:3]), minutes=int(offset[-2:]))
+        else:
+            hour, minute, second = map(int, header.group('hms').split(':'))
+            t = datetime.datetime(year, MONTHS[header.group('month')], int(header.group('day')), hour, minute, second)
+    except (KeyError, ValueError):
+        return None
+    message = header.group('message')
+    found = _MESSAGE.match(message)
+    if found:
+        text, message_type, error = found.group('text', 'type', 'error')
+        message_type = message_type.lower()
+    else:
+        text, error = message, ''
+        pri = header.group('pri')
+        message_type = SEVERITIES[int(pri) & 7] if pri else ''
+    return (header.group('host'), t.replace(tzinfo=timezone.utc), text[:MAX_SYSLOG_MESSAGE_LENGTH],
+            message_type[:MAX_SYSLOG_MESSAGE_TYPE], error[:MAX_SYSLOG_ERROR_MESSAGE], line)
+
+
+def _parse_chunk(args):
+    """ Parse a chunk of raw lines in a pool process.
+
+    :return: the parsed lines and the number of lines that were not syslog
+    :rtype: tuple
+    """
+    lines, year = args
+    parsed = []
+    for line in lines:
+        record = parse_line(line.decode('utf8', 'replace'), year)
+        if record:
+            parsed.append(record)
+    return parsed, len(lines) - len(parsed)
+
+########################################################################################################################
+#
+# Node resolution
+#
+########################################################################################################################
+
+
+class NodeMap(object):
+    """
+    Map of IP address and host name to VNode id, built from syslog_lookup.  Host names are matched case
+    insensitively.
+
+    .. sourcecode:: python
+
+        nodes = NodeMap(company='BMC_1')
+        nodes.get('10.1.2.3')           # node id or None
+
+    :param company: if given, only nodes of this company, name or VCompany
+    :type company: unicode or VCompany
+    """
+    def __init__(self, company=None):
+        if isinstance(company, basestring):
+            company = syslog_lookup.company_id(company)
+        elif company:
+            company = company.pk
+        self.nodes = {}
+        for node_id, company_id, host_name, node_ip in reversed(syslog_lookup.node_values()):
+            if company and company_id != company:
+                continue
+            if host_name:
+                self.nodes[host_name.lower()] = node_id
+            if node_ip:
+                self.nodes[node_ip] = node_id
+        return
+
+    def get(self, host):
+        """ Return the id of the node with address or name host, or None. """
+        return self.nodes.get(host) or self.nodes.get(host.lower())
+
+########################################################################################################################
+#
+# Ingestion
+#
+########################################################################################################################
+
+
+def _open(path):
+    """ Open a syslog file for binary reading, '-' is stdin and gzip files are decompressed. """
+    if path == '-':
+        return sys.stdin
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def _chunks(paths, chunk_size):
+    """ Yield lists of chunk_size raw lines read lazily from the files. """
+    for path in paths:
+        f = _open(path)
+        try:
+            while True:
+                lines = list(itertools.islice(f, chunk_size))
+                if not lines:
+                    break
+                yield lines
+        finally:
+            if f is not sys.stdin:
+                f.close()
+
+
+def _parse_chunks(chunks, year, processes):
+    """ Yield the parse of each chunk, in order.  At most twice processes chunks are in flight. """
+    if processes <= 1:
+        for lines in chunks:
+            yield _parse_chunk((lines, year))
+        return
+    pool = multiprocessing.Pool(processes)
+    try:
+        pending = collections.deque()
+        for lines in chunks:
+            pending.append(pool.apply_async(_parse_chunk, ((lines, year),)))
+            if len(pending) >= 2 * processes:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def ingest_syslog(paths, company=None, year=None, processes=None, chunk_size=10000, batch_size=500):
+    """
+    Load raw syslog files into VSyslog.  Each chunk of lines is written in its own transaction, so an error
+    leaves the chunks before it loaded.
+
+    .. sourcecode:: python
+
+        ingest_syslog(['node1.log'], company='BMC_1', processes=4)
+        # {'lines': 1000000, 'records': 999812, 'skipped': 188, 'unresolved': 0, 'seconds': 41.2,
+        #  'lines_per_second': 24271.8}
+
+    :param paths: syslog file paths, '-' for stdin, files ending .gz are decompressed
+    :type paths: list of unicode
+    :param company: if given, only resolve hosts to nodes of this company
+    :type company: unicode or VCompany
+    :param year: year for timestamps that have none, default the current year
+    :type year: int
+    :param processes: parser processes, default the number of CPUs, 1 parses in this process
+    :type processes: int
+    :param chunk_size: lines parsed and written per chunk
+    :type chunk_size: int
+    :param batch_size: records per insert statement
+    :type batch_size: int
+    :return: counts of lines read, records written, lines skipped as not syslog, records whose host is not a
+        known node, elapsed seconds, and lines per second
+    :rtype: dict
+    """
+    start = time.time()
+    nodes = NodeMap(company)
+    year = year or timezone.now().year
+    processes = processes or multiprocessing.cpu_count()
+    stats = collections.Counter()
+    for parsed, skipped in _parse_chunks(_chunks(paths, chunk_size), year, processes):
+        records = []
+        for host, t, text, message_type, error, line in parsed:
+            node_id = nodes.get(host)
+            if node_id is None:
+                stats['unresolved'] += 1
+            records.append(VSyslog(node_id=node_id, time=t, message_text=text, message_type=message_type,
+                                   message_error=error, line=line))
+        with transaction.atomic():
+            VSyslog.objects.bulk_create(records, batch_size=batch_size)
+            syslog_rollup_add(records)
+        stats['lines'] += len(parsed) + skipped
+        stats['records'] += len(records)
+        stats['skipped'] += skipped
+        log.debug('ingest_syslog %s lines', stats['lines'])
+    seconds = time.time() - start
+    return {'lines': stats['lines'], 'records': stats['records'], 'skipped': stats['skipped'],
+            'unresolved': stats['unresolved'], 'seconds': seconds,
+            'lines_per_second': stats['lines'] / seconds if seconds else 0.0}
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+Syslog ingest command
+*********************
+
+Load raw syslog files into VSyslog, see test_data.ingest.
+
+    python manage.py syslog_ingest --company BMC_1 --processes 4 node1.log node2.log.gz
+    zcat archive.gz | python manage.py syslog_ingest -
+
+10/17/26 - Initial creation
+
+"""
+
+from __future__ import unicode_literals
+import logging
+
+log = logging.getLogger(__name__)
+
+__author__ = 'rbell01824'
+__date__ = '10/17/26'
+__copyright__ = "Copyright 2014, Richard Bell"
+__credits__ = ['rbell01824']
+__license__ = 'All rights reserved'
+__version__ = '0.1'
+__maintainer__ = 'rbell01824'
+__email__ = 'rbell01824@gmail.com'
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from test_data.ingest import ingest_syslog
+
+
+class Command(BaseCommand):
+    args = '<file file ...>'
+    help = 'Load raw syslog files into VSyslog.  Use - to read stdin.'
+    option_list = BaseCommand.option_list + (
+        make_option('--company', dest='company', default=None,
+                    help='Only resolve hosts to nodes of this company.'),
+        make_option('--year', dest='year', type='int', default=None,
+                    help='Year for timestamps that have none, default the current year.'),
+        make_option('--processes', dest='processes', type='int', default=None,
+                    help='Parser processes, default the number of CPUs.'),
+        make_option('--chunk-size', dest='chunk_size', type='int', default=10000,
+                    help='Lines parsed and written per transaction, default 10000.'),
+        make_option('--batch-size', dest='batch_size', type='int', default=500,
+                    help='Records per insert, default 500.'),
+    )
+
+    def handle(self, *args, **options):
+        if not args:
+            raise CommandError('Give one or more syslog files, or - for stdin.')
+        try:
+            stats = ingest_syslog(args, company=options['company'], year=options['year'],
+                                  processes=options['processes'], chunk_size=options['chunk_size'],
+                                  batch_size=options['batch_size'])
+        except IOError as e:
+            raise CommandError(e)
+        self.stdout.write('{lines} lines, {records} records, {skipped} skipped, {unresolved} unresolved hosts'.
+                          format(**stats))
+        self.stdout.write('{seconds:.1f}s, {lines_per_second:.0f} lines/s'.format(**stats))
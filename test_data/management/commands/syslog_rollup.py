@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+"""
+Syslog rollup command
+*********************
+
+Rebuild the syslog rollups, VSyslogDay and VSyslogHour, from VSyslog.  Run once after the rollup tables are
+created, e.g. on a database loaded before the rollups were added, and after loading syslog records with
+bulk_create or raw SQL.  Until it is run syslog_counts counts the syslog records themselves, which is slow.
+
+    python manage.py syslog_rollup
+
+10/17/26 - Initial creation
+
+"""
+
+from __future__ import unicode_literals
+import logging
+
+log = logging.getLogger(__name__)
+
+__author__ = 'rbell01824'
+__date__ = '10/17/26'
+__copyright__ = "Copyright 2014, Richard Bell"
+__credits__ = ['rbell01824']
+__license__ = 'All rights reserved'
+__version__ = '0.1'
+__maintainer__ = 'rbell01824'
+__email__ = 'rbell01824@gmail.com'
+
+import time
+
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+from test_data.models import SYSLOG_ROLLUPS, syslog_rollup_rebuild
+
+
+class Command(NoArgsCommand):
+    help = 'Rebuild the syslog rollup tables from VSyslog.  Run once on databases loaded before the rollups.'
+    option_list = NoArgsCommand.option_list + (
+        make_option('--batch-size', dest='batch_size', type='int', default=500,
+                    help='Rollup rows per insert, default 500.'),
+    )
+
+    def handle_noargs(self, **options):
+        start = time.time()
+        sizes = syslog_rollup_rebuild(batch_size=options['batch_size'])
+        for model, size in zip(SYSLOG_ROLLUPS, sizes):
+            self.stdout.write('{}: {} rows'.format(model._meta.verbose_name_plural, size))
+        self.stdout.write('Rebuilt in {:.1f}s'.format(time.time() - start))
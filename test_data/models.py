@@ -20,8 +20,27 @@ __maintainer__ = "rbell01824"
 __email__ = "rbell01824@gmail.com"
 __status__ = "dev"
 
-from django.db import models
-from django.db.models import Count
+import calendar
+import collections
+import datetime
+import hashlib
+import threading
+import time
+
+try:
+    import numpy
+except ImportError:                                 # the histogram fill falls back to Python
+    numpy = None
+
+from django.conf import settings
+from django.core.cache import get_cache
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from djangopages.cache import named_cache
 
 # from djangopages.widgets.graph import GraphCK
 
@@ -181,11 +200,382 @@ class VSyslog(models.Model):
     class Meta:
         verbose_name = 'Syslog'
         verbose_name_plural = 'Syslog'
+        # syslog_query access paths: node and time range, then message type.  syncdb does not add indexes to an
+        # existing table, see manage.py sqlindexes test_data
+        index_together = [('node', 'time'),
+                          ('node', 'message_type', 'time')]
 
     def __unicode__(self):
         return u'{}:{}:{}:{}:{}'.format(self.node, self.time,
                                         self.message_text, self.message_type, self.message_error)
 
+########################################################################################################################
+#
+# Syslog rollups
+#
+########################################################################################################################
+
+
+class VSyslogRollup(models.Model):
+    """
+    Count of syslog records per node, message type, and time bucket.  Buckets are UTC.  Records without a time
+    are counted in the bucket with time None.
+
+    Rollups are kept current as VSyslog records are saved or deleted.  A saved record whose node, message type,
+    or time changed moves from its old bucket to its new one.  Records added with bulk_create or changed with
+    QuerySet.update send no signals, use syslog_rollup_add for them or rebuild with manage.py syslog_rollup.
+    """
+    node = models.ForeignKey(VNode,
+                             null=True,
+                             related_name='+',
+                             verbose_name='Node')
+    message_type = models.CharField(max_length=MAX_SYSLOG_MESSAGE_TYPE,
+                                    verbose_name='Message type')
+    time = models.DateTimeField(null=True,
+                                verbose_name='Bucket start time')
+    count = models.IntegerField(default=0,
+                                verbose_name='Record count')
+
+    period = None                               # bucket length
+    truncate = ()                               # datetime fields zeroed to get a bucket's start
+
+    class Meta:
+        abstract = True
+        unique_together = ('node', 'message_type', 'time')
+
+    def __unicode__(self):
+        return u'{}:{}:{}:{}'.format(self.node_id, self.message_type, self.time, self.count)
+
+    @classmethod
+    def floor(cls, t):
+        """ Return the start of the bucket holding time t. """
+        if t is None:
+            return None
+        if timezone.is_aware(t):
+            t = t.astimezone(timezone.utc)
+        return t.replace(**dict.fromkeys(cls.truncate, 0))
+
+    @classmethod
+    def ceil(cls, t):
+        """ Return the start of the first bucket starting at or after time t. """
+        start = cls.floor(t)
+        return start if start == t else start + cls.period
+
+    @classmethod
+    def add(cls, node_id, message_type, time, count):
+        """ Add count, which may be negative, to a bucket. """
+        bucket = cls.objects.filter(node_id=node_id, message_type=message_type, time=time)
+        if bucket.update(count=F('count') + count) or count <= 0:
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(node_id=node_id, message_type=message_type, time=time, count=count)
+        except IntegrityError:                  # created concurrently
+            bucket.update(count=F('count') + count)
+        return
+
+    @classmethod
+    def add_many(cls, buckets, batch_size=500):
+        """ Add counts to buckets with a few statements: one to find the existing buckets, one update per
+        distinct count, and a bulk insert of the new buckets.
+
+        :param buckets: (node_id, message_type, time) -> count, which may be negative
+        :type buckets: dict
+        """
+        times = [t for node_id, message_type, t in buckets if t is not None]
+        in_range = models.Q(time__range=(min(times), max(times))) if times else models.Q(pk__in=[])
+        if len(times) < len(buckets):
+            in_range |= models.Q(time__isnull=True)
+        existing = dict(((node_id, message_type, t), pk) for pk, node_id, message_type, t in
+                        cls.objects.filter(in_range, message_type__in=set(key[1] for key in buckets)).
+                        values_list('id', 'node_id', 'message_type', 'time'))
+        updates = collections.defaultdict(list)             # count -> ids of buckets to add it to
+        created = []
+        for (node_id, message_type, t), count in buckets.iteritems():
+            if not count:
+                continue
+            if (node_id, message_type, t) in existing:
+                updates[count].append(existing[(node_id, message_type, t)])
+            elif count > 0:
+                created.append(cls(node_id=node_id, message_type=message_type, time=t, count=count))
+        for count, ids in updates.iteritems():
+            for n in range(0, len(ids), batch_size):
+                cls.objects.filter(id__in=ids[n:n + batch_size]).update(count=F('count') + count)
+        try:
+            with transaction.atomic():
+                cls.objects.bulk_create(created, batch_size=batch_size)
+        except IntegrityError:                  # some created concurrently
+            for bucket in created:
+                cls.add(bucket.node_id, bucket.message_type, bucket.time, bucket.count)
+        return
+
+
+class VSyslogHour(VSyslogRollup):
+    """
+    Syslog record counts per node, message type, and hour.
+    """
+    period = datetime.timedelta(hours=1)
+    truncate = ('minute', 'second', 'microsecond')
+
+    class Meta(VSyslogRollup.Meta):
+        verbose_name = 'Syslog hourly count'
+        verbose_name_plural = 'Syslog hourly counts'
+
+
+class VSyslogDay(VSyslogRollup):
+    """
+    Syslog record counts per node, message type, and day.
+    """
+    period = datetime.timedelta(days=1)
+    truncate = ('hour', 'minute', 'second', 'microsecond')
+
+    class Meta(VSyslogRollup.Meta):
+        verbose_name = 'Syslog daily count'
+        verbose_name_plural = 'Syslog daily counts'
+
+SYSLOG_ROLLUPS = (VSyslogDay, VSyslogHour)          # coarsest first
+
+
+def syslog_rollup_add(records, sign=1):
+    """
+    Add syslog records to the rollups, or with sign=-1 remove them.  Use after VSyslog.objects.bulk_create.
+
+    :param records: VSyslog records or (node_id, message_type, time) tuples
+    :type records: iterable
+    :param sign: 1 to add the records, -1 to remove them
+    :type sign: int
+    """
+    counts = collections.Counter(r if isinstance(r, tuple) else (r.node_id, r.message_type, r.time)
+                                 for r in records)
+    if not counts:
+        return
+    with transaction.atomic():
+        for model in SYSLOG_ROLLUPS:
+            buckets = collections.Counter()
+            for (node_id, message_type, time), count in counts.iteritems():
+                buckets[(node_id, message_type, model.floor(time))] += count
+            model.add_many(dict((key, sign * count) for key, count in buckets.iteritems()))
+    return
+
+
+def syslog_rollup_rebuild(batch_size=500):
+    """
+    Rebuild the rollups from VSyslog in one pass over its records.
+
+    :param batch_size: rollup rows per insert
+    :type batch_size: int
+    :return: number of rows in each rollup, coarsest first
+    :rtype: list of int
+    """
+    finest = SYSLOG_ROLLUPS[-1]
+    counts = collections.Counter((node_id, message_type, finest.floor(time)) for node_id, message_type, time in
+                                 VSyslog.objects.values_list('node_id', 'message_type', 'time').iterator())
+    sizes = []
+    with transaction.atomic():
+        for model in reversed(SYSLOG_ROLLUPS):
+            if model is not finest:
+                coarser = collections.Counter()
+                for (node_id, message_type, time), count in counts.iteritems():
+                    coarser[(node_id, message_type, model.floor(time))] += count
+                counts = coarser
+            model.objects.all().delete()
+            model.objects.bulk_create((model(node_id=node_id, message_type=message_type, time=time, count=count)
+                                       for (node_id, message_type, time), count in counts.iteritems()),
+                                      batch_size=batch_size)
+            sizes.insert(0, len(counts))
+    return sizes
+
+
+# noinspection PyUnusedLocal
+@receiver(pre_save, sender=VSyslog, dispatch_uid='syslog_rollup_pre_save')
+def _syslog_rollup_pre_save(sender, instance, **kwargs):
+    """ Remember the bucket of a saved record's row so its move to another bucket can be counted. """
+    if instance.pk is not None:
+        instance._syslog_rollup_old = VSyslog.objects.filter(pk=instance.pk).values_list(
+            'node_id', 'message_type', 'time').first()
+
+
+# noinspection PyUnusedLocal
+@receiver(post_save, sender=VSyslog, dispatch_uid='syslog_rollup_save')
+def _syslog_rollup_save(sender, instance, created, **kwargs):
+    old = instance.__dict__.pop('_syslog_rollup_old', None)
+    new = (instance.node_id, instance.message_type, instance.time)
+    if created or old is None:
+        syslog_rollup_add([new])
+    elif old != new:
+        with transaction.atomic():
+            syslog_rollup_add([old], sign=-1)
+            syslog_rollup_add([new])
+
+
+# noinspection PyUnusedLocal
+@receiver(post_delete, sender=VSyslog, dispatch_uid='syslog_rollup_delete')
+def _syslog_rollup_delete(sender, instance, **kwargs):
+    syslog_rollup_add([instance], sign=-1)
+
+########################################################################################################################
+#
+# Company and node lookup cache
+#
+########################################################################################################################
+
+
+class SyslogLookup(object):
+    """
+    In-process cache of the companies and nodes: company name to id, company id to its nodes, and host name to
+    node ids.  Each table has a version, and is reloaded, in one query, when its version changes.  Saving or
+    deleting a VCompany increments the companies' version, a VNode the nodes'.
+
+    The versions are kept in the Django cache settings.SYSLOG_LOOKUP_CACHE, default 'default'.  Use a cache that
+    all worker processes share, ex. memcached or the database cache, so changes made in one process are seen by
+    the others on their next lookup.  With a per-process cache, ex. the default LocMemCache, other processes
+    see a change when a lookup misses or when their copy of the table is older than
+    settings.SYSLOG_LOOKUP_TIMEOUT seconds, default 60, None to keep it until its version changes.
+
+    .. sourcecode:: python
+
+        syslog_lookup.company_id('BMC_1')                    # 1
+        syslog_lookup.node_id('BMC_1', 'A0040CnBPGC1')       # 3
+    """
+    version_key = 'test_data:syslog_lookup:version'
+    tables = ('companies', 'nodes')
+
+    def __init__(self):
+        self.versions = {}                                  # table -> version loaded
+        self.loaded = {}                                    # table -> time loaded
+        self.companies = collections.OrderedDict()          # name -> id, in id order
+        self.nodes = collections.OrderedDict()              # id -> (company_id, host_name, node_ip), in id order
+        self.hosts = {}                                     # (company_id, host_name) -> [node id, ...]
+        self._lock = threading.Lock()
+        return
+
+    @staticmethod
+    def _backend():
+        return get_cache(getattr(settings, 'SYSLOG_LOOKUP_CACHE', 'default'))
+
+    def _key(self, table):
+        return '{}:{}'.format(self.version_key, table)
+
+    def _current_versions(self):
+        backend = self._backend()
+        found = backend.get_many([self._key(table) for table in self.tables])
+        versions = {}
+        for table in self.tables:
+            version = found.get(self._key(table))
+            if version is None:                             # never set or evicted, start from a new value
+                backend.add(self._key(table), self._new_version(), None)
+                version = backend.get(self._key(table))
+            versions[table] = version
+        return versions
+
+    @staticmethod
+    def _new_version():
+        return int(time.time() * 1000000)
+
+    def invalidate(self, table=None):
+        """ Increment a table's version, default both, every process reloads it on its next lookup.
+
+        :param table: 'companies', 'nodes', or None for both
+        """
+        backend = self._backend()
+        for table in (table,) if table else self.tables:
+            try:
+                backend.incr(self._key(table))
+            except ValueError:                              # never set or evicted
+                backend.set(self._key(table), self._new_version(), None)
+            self.versions.pop(table, None)
+        return
+
+    def _load(self, reload=()):
+        """ Reload the tables whose version has changed, whose copy is older than settings.SYSLOG_LOOKUP_TIMEOUT,
+        or that are in reload.
+        """
+        versions = self._current_versions()
+        now = time.time()
+        timeout = getattr(settings, 'SYSLOG_LOOKUP_TIMEOUT', 60)
+        stale = [table for table in self.tables if table in reload or versions[table] != self.versions.get(table) or
+                 (timeout is not None and now - self.loaded.get(table, 0) > timeout)]
+        if not stale:
+            return
+        with self._lock:
+            if 'companies' in stale:
+                self.companies = collections.OrderedDict(VCompany.objects.order_by('id').values_list('company_name',
+                                                                                                     'id'))
+            if 'nodes' in stale:
+                nodes = collections.OrderedDict((node_id, (company_id, host_name, node_ip)) for
+                                                node_id, company_id, host_name, node_ip in
+                                                VNode.objects.order_by('id').values_list('id', 'company_id',
+                                                                                         'host_name', 'node_ip'))
+                hosts = collections.defaultdict(list)
+                for node_id, (company_id, host_name, node_ip) in nodes.iteritems():
+                    hosts[(company_id, host_name)].append(node_id)
+                self.nodes, self.hosts = nodes, dict(hosts)
+            for table in stale:
+                self.versions[table], self.loaded[table] = versions[table], now
+        return
+
+    def company_id(self, name):
+        """ Return the id of the company called name.
+
+        :raises VCompany.DoesNotExist: if there is no such company
+        """
+        self._load()
+        if name not in self.companies:
+            self._load(('companies',))
+            if name not in self.companies:
+                raise VCompany.DoesNotExist('VCompany matching query does not exist.')
+        return self.companies[name]
+
+    def node_id(self, company, host_name):
+        """ Return the id of company's node host_name.  company is a name, id, or VCompany.
+
+        :raises VNode.DoesNotExist: if there is no such node
+        :raises VNode.MultipleObjectsReturned: if company has several nodes called host_name
+        """
+        if isinstance(company, basestring):
+            company = self.company_id(company)
+        elif isinstance(company, VCompany):
+            company = company.pk
+        self._load()
+        key = (company, host_name)
+        if key not in self.hosts:
+            self._load(('nodes',))
+            if key not in self.hosts:
+                raise VNode.DoesNotExist('VNode matching query does not exist.')
+        ids = self.hosts[key]
+        if len(ids) > 1:
+            raise VNode.MultipleObjectsReturned('get() returned more than one VNode -- it returned {}!'.
+                                                format(len(ids)))
+        return ids[0]
+
+    def company_names(self):
+        """ Return the company names in id order. """
+        self._load()
+        return list(self.companies)
+
+    def host_names(self, company):
+        """ Return the host names of the company called company, in node id order. """
+        self._load()
+        company_id = self.companies.get(company)
+        return [host_name for node_company_id, host_name, node_ip in self.nodes.itervalues()
+                if node_company_id == company_id]
+
+    def node_values(self):
+        """ Return (id, company_id, host_name, node_ip) of every node in id order. """
+        self._load()
+        return [(node_id, ) + values for node_id, values in self.nodes.iteritems()]
+
+syslog_lookup = SyslogLookup()
+
+
+# noinspection PyUnusedLocal
+@receiver(post_save, sender=VCompany, dispatch_uid='syslog_lookup_company_save')
+@receiver(post_delete, sender=VCompany, dispatch_uid='syslog_lookup_company_delete')
+@receiver(post_save, sender=VNode, dispatch_uid='syslog_lookup_node_save')
+@receiver(post_delete, sender=VNode, dispatch_uid='syslog_lookup_node_delete')
+def _syslog_lookup_invalidate(sender, **kwargs):
+    syslog_lookup.invalidate('companies' if sender is VCompany else 'nodes')
+
 ########################################################################################################################
 #
 # Helper for Matrix query and graph experiments
@@ -222,18 +612,7 @@ def syslog_query(company=None, node=None, start_time=None, end_time=None):
     # Syslog.objects.filter(node__company__company_name='TestCo_1', node__host_name='A0040CnBEPC1')
     #
 
-    # make sure company and node are objects
-    if isinstance(company, basestring):
-        company = VCompany.objects.get(company_name=company)
-    if company and isinstance(node, basestring):
-        node = VNode.objects.get(company=company, host_name=node)
-
-    if node:                    # if we have a node, use it to subset the syslog records
-        qs = VSyslog.objects.filter(node=node)
-    elif company:               # if we have a company, use it to subset the syslog records
-        qs = VSyslog.objects.filter(node__company=company)
-    else:                       # work with all companies, all nodes
-        qs = VSyslog.objects.all()
+    qs = VSyslog.objects.filter(**_syslog_node_filter(company, node))
     if start_time:
         qs = qs.filter(time__gte=start_time)
     if end_time:
@@ -241,6 +620,316 @@ def syslog_query(company=None, node=None, start_time=None, end_time=None):
     return qs
 
 
+def syslog_query_keyset(company=None, node=None, start_time=None, end_time=None, after=None, limit=1000,
+                        **filters):
+    """
+    Return a page of the syslog records syslog_query(company, node, start_time, end_time).filter(\*\*filters)
+    selects, ordered by time then id.  Pages are found by keyset: the next page starts after the (time, id) of
+    the last record of this page, so deep pages cost the same as the first where an offset scans every record
+    before the page.  With node, the (node, time) index gives the order without sorting.  Records without a
+    time are not returned.
+
+    .. sourcecode:: python
+
+        page = list(syslog_query_keyset('BMC_1', 'A0040CnBPGC1', message_type='critical'))
+        while page:
+            ...
+            page = list(syslog_query_keyset('BMC_1', 'A0040CnBPGC1', message_type='critical',
+                                            after=(page[-1].time, page[-1].id)))
+
+    :param company: A company
+    :param node: A node
+    :param start_time: start time for syslog records
+    :param end_time: end time for syslog records
+    :param after: (time, id) of the last record of the previous page, None for the first page
+    :type after: tuple
+    :param limit: page size
+    :type limit: int
+    :param filters: further filters, ex. message_type='critical'
+    :return: the page's records
+    :rtype: QuerySet
+    """
+    qs = syslog_query(company, node, start_time, end_time).filter(time__isnull=False, **filters)
+    if after:
+        after_time, after_id = after
+        qs = qs.filter(time__gte=after_time).exclude(time=after_time, id__lte=after_id)
+    return qs.order_by('time', 'id')[:limit]
+
+
+def syslog_scan(company=None, node=None, start_time=None, end_time=None, page_size=1000, **filters):
+    """
+    Iterate over the records syslog_query_keyset selects, page by page.
+
+    :return: generator of VSyslog
+    """
+    page = list(syslog_query_keyset(company, node, start_time, end_time, limit=page_size, **filters))
+    while page:
+        for record in page:
+            yield record
+        if len(page) < page_size:
+            return
+        page = list(syslog_query_keyset(company, node, start_time, end_time, after=(page[-1].time, page[-1].id),
+                                        limit=page_size, **filters))
+
+
+def _syslog_node_filter(company, node):
+    """
+    Return the filter kwargs selecting the syslog records of company and node, see syslog_query.
+    """
+    # names are resolved from the lookup cache, so the query is a single SQL statement
+    if company and isinstance(node, basestring):
+        node = syslog_lookup.node_id(company, node)
+    elif isinstance(company, basestring):
+        company = syslog_lookup.company_id(company)
+
+    if node:                    # if we have a node, use it to subset the syslog records
+        return {'node': node}
+    elif company:               # if we have a company, use it to subset the syslog records
+        return {'node__company': company}
+    return {}                   # work with all companies, all nodes
+
+
+def syslog_counts(company=None, node=None, start_time=None, end_time=None, group_by=('message_type',),
+                  **filters):
+    """
+    Count the syslog records syslog_query(company, node, start_time, end_time).filter(\*\*filters) selects,
+    grouped by the group_by fields.  The counts are summed from the rollups: whole days from VSyslogDay, whole
+    hours at the ends of the range from VSyslogHour, and only the partial hours at the very ends from VSyslog.
+    While the rollups are empty, e.g. on a database loaded before they were added, the counts are taken from
+    VSyslog and a warning says to run manage.py syslog_rollup.
+
+    .. sourcecode:: python
+
+        syslog_counts('BMC_1', group_by=('node__host_name',), message_type='critical')
+        # [(u'A0040CnBEPC1', 26), (u'A0040CnBEPC2', 69), ...]
+
+    :param company: A company
+    :param node: A node
+    :param start_time: start time for syslog records
+    :param end_time: end time for syslog records, inclusive
+    :param group_by: fields to group by, fields of node and message_type, ex. 'node__host_name', or () for
+        the total count
+    :type group_by: tuple
+    :param filters: further filters on fields of node and message_type, ex. message_type='critical'
+    :return: (group_by values..., count) tuples ordered by group_by values
+    :rtype: list of tuple
+    """
+    filters.update(_syslog_node_filter(company, node))
+    rollups = SYSLOG_ROLLUPS if _syslog_rollups_built() else ()
+    if not (start_time or end_time):
+        segments = [((rollups or (VSyslog,))[0], {})]
+    else:
+        segments = _syslog_segments(start_time or None, end_time or None, True, rollups)
+    group_by = tuple(group_by)
+    counts = collections.Counter()
+    for source, time_filter in segments:
+        qs = source.objects.filter(**filters).filter(**time_filter).order_by()
+        num_records = Count('id') if source is VSyslog else Sum('count')
+        if group_by:
+            rows = qs.values(*group_by).annotate(num_records=num_records).values_list(*(group_by + ('num_records',)))
+        else:
+            rows = [(qs.aggregate(num_records=num_records)['num_records'] or 0,)]
+        for row in rows:
+            counts[row[:-1]] += row[-1]
+    if not group_by:
+        return [(counts[()],)]
+    return sorted(group + (count,) for group, count in counts.iteritems() if count)
+
+
+def _syslog_rollups_built():
+    """
+    Return True if the rollups hold counts, or there are no syslog records to count.  Otherwise log a warning,
+    once per process, that the rollups need to be built.
+
+    :rtype: bool
+    """
+    global _syslog_rollup_warned
+    if SYSLOG_ROLLUPS[-1].objects.exists() or not VSyslog.objects.exists():
+        return True
+    if not _syslog_rollup_warned:
+        _syslog_rollup_warned = True
+        log.warning('syslog rollups are empty, counting syslog records instead, run manage.py syslog_rollup')
+    return False
+
+_syslog_rollup_warned = False
+
+
+def _syslog_segments(start, end, end_inclusive, rollups):
+    """
+    Cover the time range start to end with whole buckets of the coarsest rollup possible, the rest with raw
+    records.  A start or end of None is unbounded.
+
+    :return: (model, time filter kwargs) pairs
+    :rtype: list of tuple
+    """
+    if not rollups:
+        time_filter = {}
+        if start is not None:
+            time_filter['time__gte'] = start
+        if end is not None:
+            time_filter['time__lte' if end_inclusive else 'time__lt'] = end
+        return [(VSyslog, time_filter)]
+    model, finer = rollups[0], rollups[1:]
+    lo = None if start is None else model.ceil(start)
+    hi = None if end is None else model.floor(end)
+    if lo is not None and hi is not None and lo >= hi:          # no whole bucket
+        return _syslog_segments(start, end, end_inclusive, finer)
+    time_filter = {}
+    if lo is not None:
+        time_filter['time__gte'] = lo
+    if hi is not None:
+        time_filter['time__lt'] = hi
+    segments = [(model, time_filter)]
+    if start is not None and start != lo:
+        segments += _syslog_segments(start, lo, False, finer)
+    if end is not None and (end_inclusive or end != hi):
+        segments += _syslog_segments(hi, end, end_inclusive, finer)
+    return segments
+
+
+SYSLOG_BUCKETS = {'minute': 60, 'hour': 3600, 'day': 86400}
+
+_EPOCH_SQL = {'sqlite': 'CAST(strftime(%s, {column}) AS INTEGER) / {width} * {width}',
+              'postgresql': 'CAST(FLOOR(EXTRACT(EPOCH FROM {column}) / {width}) AS BIGINT) * {width}',
+              'mysql': 'FLOOR(UNIX_TIMESTAMP({column}) / {width}) * {width}'}
+_EPOCH_PARAMS = {'sqlite': ['%s']}
+
+
+def syslog_histogram(company=None, node=None, start_time=None, end_time=None, bucket='hour', group_by=(), fill=True,
+                     **filters):
+    """
+    Count the syslog records syslog_query(company, node, start_time, end_time).filter(\*\*filters) selects per
+    time bucket, for GraphCK line and area charts.  The database truncates each record's time to its bucket and
+    counts, so one row per bucket and group is returned whatever the number of records.  Buckets are UTC and
+    aligned to the Unix epoch, so day buckets start at midnight UTC.
+
+    Empty buckets between start_time and end_time, or between the first and last record when the range is open,
+    are filled with 0 so the chart's time axis is continuous.  Results are cached in the named cache
+    'syslog_histogram' for settings.SYSLOG_HISTOGRAM_CACHE_TIMEOUT seconds, default 60, keyed by the arguments.
+    Results are shared, do not modify them.
+
+    .. sourcecode:: python
+
+        syslog_histogram('BMC_1', start_time=start, end_time=end, bucket='hour')
+        # [['2014-05-01T00:00:00+00:00', 712], ['2014-05-01T01:00:00+00:00', 0], ...]
+
+        GraphCK('line', syslog_histogram('BMC_1', bucket=datetime.timedelta(minutes=15), group_by=('message_type',)))
+        # data [{'name': 'critical', 'data': [['2014-05-01T00:00:00+00:00', 26], ...]}, ...]
+
+    :param company: A company
+    :param node: A node
+    :param start_time: start time for syslog records
+    :param end_time: end time for syslog records, inclusive
+    :param bucket: bucket width, 'minute', 'hour', 'day', a timedelta, or seconds
+    :type bucket: unicode or timedelta or int
+    :param group_by: fields to group by, one series per group, ex. ('message_type',) or ('node__host_name',)
+    :type group_by: tuple
+    :param fill: if True fill empty buckets with 0
+    :type fill: bool
+    :param filters: further filters, ex. message_type='critical'
+    :return: [[bucket, count], ...] without group_by, else [{'name': group, 'data': [[bucket, count], ...]}, ...]
+        ordered by group; buckets are ISO 8601 strings in time order
+    :rtype: list
+    """
+    width = _syslog_bucket_width(bucket)
+    group_by = tuple(group_by)
+    timeout = getattr(settings, 'SYSLOG_HISTOGRAM_CACHE_TIMEOUT', 60)
+    cache = named_cache('syslog_histogram', alias=getattr(settings, 'SYSLOG_HISTOGRAM_CACHE', None), timeout=timeout)
+    key = _syslog_histogram_key(company, node, start_time, end_time, width, group_by, fill, filters)
+    if timeout:
+        histogram = cache.get(key)
+        if histogram is not None:
+            return histogram
+
+    column = '{}.{}'.format(connection.ops.quote_name(VSyslog._meta.db_table), connection.ops.quote_name('time'))
+    select = _EPOCH_SQL[connection.vendor].format(column=column, width=width)
+    qs = syslog_query(company, node, start_time, end_time).filter(time__isnull=False, **filters).order_by()
+    rows = list(qs.extra(select={'bucket': select}, select_params=_EPOCH_PARAMS.get(connection.vendor, [])).
+                values_list(*(('bucket',) + group_by)).annotate(num_records=Count('id')))
+
+    # bucket numbers, in width from the first bucket
+    if start_time is not None:
+        first = _syslog_epoch(start_time) // width
+    else:
+        first = min(int(row[0]) for row in rows) // width if rows else 0
+    if end_time is not None:
+        last = _syslog_epoch(end_time) // width
+    else:
+        last = max(int(row[0]) for row in rows) // width if rows else -1
+    groups = sorted(set(row[1:-1] for row in rows))
+    series = dict((group, n) for n, group in enumerate(groups))
+    buckets = [int(row[0]) // width - first for row in rows]
+    counts = _syslog_histogram_fill([series[row[1:-1]] for row in rows], buckets, [row[-1] for row in rows],
+                                    len(groups), last - first + 1)
+
+    labels = [datetime.datetime.utcfromtimestamp((first + n) * width).replace(tzinfo=timezone.utc).isoformat()
+              for n in range(last - first + 1)]
+    histogram = []
+    for group, group_counts in zip(groups, counts):
+        data = [[label, count] for label, count in zip(labels, group_counts) if fill or count]
+        histogram.append({'name': ' '.join('{}'.format(value) for value in group), 'data': data})
+    if not group_by:
+        histogram = histogram[0]['data'] if histogram else [[label, 0] for label in labels if fill]
+    if timeout:
+        cache.set(key, histogram)
+    return histogram
+
+
+def _syslog_bucket_width(bucket):
+    """ Return the bucket width in whole seconds. """
+    if isinstance(bucket, basestring):
+        width = SYSLOG_BUCKETS[bucket]
+    elif isinstance(bucket, datetime.timedelta):
+        width = bucket.days * 86400 + bucket.seconds
+    else:
+        width = int(bucket)
+    if width <= 0:
+        raise ValueError('bucket must be at least one second')
+    return width
+
+
+def _syslog_epoch(t):
+    """ Return time t in whole seconds since the Unix epoch.  Naive times are in the current time zone. """
+    if settings.USE_TZ and timezone.is_naive(t):
+        t = timezone.make_aware(t, timezone.get_current_timezone())
+    if timezone.is_aware(t):
+        return calendar.timegm(t.utctimetuple())
+    return calendar.timegm(t.timetuple())
+
+
+def _syslog_histogram_key(*args):
+    """ Return the cache key of syslog_histogram arguments.  Model instances are keyed by primary key. """
+    def normal(value):
+        if isinstance(value, models.Model):
+            return value._meta.db_table, value.pk
+        if isinstance(value, datetime.datetime):
+            return _syslog_epoch(value), value.microsecond
+        if isinstance(value, dict):
+            return sorted((k, normal(v)) for k, v in value.iteritems())
+        if isinstance(value, (list, tuple)):
+            return [normal(v) for v in value]
+        return value
+    return hashlib.sha1(repr(normal(args)).encode('utf8')).hexdigest()
+
+
+def _syslog_histogram_fill(series, buckets, counts, num_series, num_buckets):
+    """ Scatter counts into a num_series by num_buckets zero filled matrix at (series, buckets).  NumPy does the
+    scatter in one step when available.
+
+    :return: rows of counts, one per series
+    :rtype: list of list of int
+    """
+    if numpy is not None:
+        matrix = numpy.zeros((num_series, num_buckets), dtype=numpy.int64)
+        numpy.add.at(matrix, (numpy.asarray(series, dtype=numpy.intp), numpy.asarray(buckets, dtype=numpy.intp)),
+                     numpy.asarray(counts, dtype=numpy.int64))
+        return matrix.tolist()
+    matrix = [[0] * num_buckets for _ in range(num_series)]
+    for s, b, count in zip(series, buckets, counts):
+        matrix[s][b] += count
+    return matrix
+
+
 def syslog_companies():
     """
     Get list of companies.
@@ -248,8 +937,7 @@ def syslog_companies():
     ###################
     # Get companies
     ###################
-    companies = [n[0] for n in VCompany.objects.all().values_list('company_name')]
-    return companies
+    return syslog_lookup.company_names()
 
 
 def syslog_hosts(company):
@@ -260,8 +948,7 @@ def syslog_hosts(company):
     ###################
     # Get hosts for this company
     ###################
-    hosts = [n[0] for n in VNode.objects.filter(company__company_name=company).values_list('host_name')]
-    return hosts
+    return syslog_lookup.host_names(company)
 
 
 def syslog_event_graph(company=None, node=None, graph='column', message_type='critical', qs=None):
@@ -1,3 +1,294 @@
+#!/usr/bin/env python
+# coding=utf-8
+
+""" Test data tests
+
+10/17/26 - Initial creation
+
+"""
+
+from __future__ import unicode_literals
+import logging
+
+log = logging.getLogger(__name__)
+
+__author__ = 'rbell01824'
+__date__ = '10/17/26'
+__copyright__ = "Copyright 2014, Richard Bell"
+__credits__ = ['rbell01824']
+__license__ = 'All rights reserved'
+__version__ = '0.1'
+__maintainer__ = 'rbell01824'
+__email__ = 'rbell01824@gmail.com'
+
+import datetime
+import os
+import random
+import shutil
+import StringIO
+import tempfile
+import time
+
+from django.core.management import call_command
+from django.db.models import Count
 from django.test import TestCase
+from django.utils import timezone
+
+from djangopages.cache import set_named_cache
+from test_data import models
+from test_data.ingest import ingest_syslog, parse_line
+from test_data.models import VCompany, VNode, VSyslog, VSyslogDay, VSyslogHour, SyslogLookup, syslog_companies, \
+    syslog_counts, syslog_histogram, syslog_hosts, syslog_lookup, syslog_query, syslog_query_keyset, \
+    syslog_rollup_add, syslog_rollup_rebuild, syslog_scan
+
+START = datetime.datetime(2014, 5, 1, tzinfo=timezone.utc)
+
+
+def raw_counts(start_time=None, end_time=None, group_by=('message_type',), **filters):
+    qs = syslog_query(None, None, start_time, end_time).filter(**filters)
+    if not group_by:
+        return [(qs.count(),)]
+    qs = qs.values(*group_by).annotate(num_records=Count('id')).order_by()
+    return sorted(qs.values_list(*(group_by + ('num_records',))))
+
+
+class RollupTest(TestCase):
+    def setUp(self):
+        company = VCompany.objects.create(company_name='BMC_1')
+        self.nodes = [VNode.objects.create(company=company, host_name='host{}'.format(n)) for n in range(3)]
+        rnd = random.Random(0)
+        for n in range(300):
+            VSyslog.objects.create(node=rnd.choice(self.nodes + [None]),
+                                   time=START + datetime.timedelta(minutes=rnd.randint(0, 4 * 24 * 60)),
+                                   message_type=rnd.choice(['critical', 'warning', 'info']))
+        VSyslog.objects.create(node=self.nodes[0], time=None, message_type='info')
+        VSyslog.objects.create(node=self.nodes[0], time=START + datetime.timedelta(days=2), message_type='info')
+
+    def test_counts_match_raw(self):
+        day, hour = datetime.timedelta(days=1), datetime.timedelta(hours=1)
+        ranges = [(None, None), (START, None), (None, START + 2 * day),
+                  (START + 2 * day, START + 2 * day), (START + 5 * hour, START + 7 * hour),
+                  (START + day + 90 * datetime.timedelta(seconds=61), START + 3 * day - 1 * hour)]
+        for start_time, end_time in ranges:
+            for group_by in (('message_type',), ('node__host_name', 'message_type'), ()):
+                self.assertEqual(syslog_counts(None, None, start_time, end_time, group_by),
+                                 raw_counts(start_time, end_time, group_by))
+        self.assertEqual(syslog_counts('BMC_1', 'host1', message_type='critical'),
+                         raw_counts(node=self.nodes[1], message_type='critical'))
+
+    def test_delete(self):
+        VSyslog.objects.filter(message_type='warning').delete()
+        self.assertEqual(syslog_counts(group_by=('node', 'message_type')),
+                         raw_counts(group_by=('node', 'message_type')))
+
+    def test_update(self):
+        for record in VSyslog.objects.filter(message_type='warning')[:20]:
+            record.time += datetime.timedelta(hours=5)
+            record.node = self.nodes[2]
+            record.message_type = 'critical'
+            record.save()
+        record.save()                                   # unchanged
+        self.assertEqual(syslog_counts(group_by=('node', 'message_type')),
+                         raw_counts(group_by=('node', 'message_type')))
+        rollups = [set(model.objects.exclude(count=0).values_list('node', 'message_type', 'time', 'count'))
+                   for model in (VSyslogDay, VSyslogHour)]
+        syslog_rollup_rebuild()
+        self.assertEqual(rollups, [set(model.objects.values_list('node', 'message_type', 'time', 'count'))
+                                   for model in (VSyslogDay, VSyslogHour)])
+
+    def test_bulk_and_rebuild(self):
+        records = [VSyslog(node=self.nodes[2], time=START + datetime.timedelta(hours=n), message_type='debug')
+                   for n in range(30)]
+        VSyslog.objects.bulk_create(records)
+        syslog_rollup_add(records)
+        counts = syslog_counts(None, None, START, START + datetime.timedelta(days=3), ('node__host_name',))
+        self.assertEqual(counts, raw_counts(START, START + datetime.timedelta(days=3), ('node__host_name',)))
+        hours = set(VSyslogHour.objects.values_list('node', 'message_type', 'time', 'count'))
+        self.assertEqual(syslog_rollup_rebuild(), [VSyslogDay.objects.count(), VSyslogHour.objects.count()])
+        self.assertEqual(set(VSyslogHour.objects.values_list('node', 'message_type', 'time', 'count')), hours)
+        self.assertEqual(syslog_counts(None, None, START, START + datetime.timedelta(days=3), ('node__host_name',)),
+                         counts)
+
+    def test_keyset(self):
+        node = self.nodes[1]
+        expected = list(syslog_query(None, node).filter(time__isnull=False).order_by('time', 'id'))
+        VSyslog.objects.create(node=node, time=expected[5].time, message_type='info')       # a duplicate time
+        expected = list(syslog_query(None, node).filter(time__isnull=False).order_by('time', 'id'))
+        self.assertEqual(list(syslog_scan(None, node, page_size=7)), expected)
+        page = list(syslog_query_keyset(None, node, after=(expected[5].time, expected[5].id), limit=3))
+        self.assertEqual(page, expected[6:9])
+        self.assertEqual(list(syslog_scan('BMC_1', 'host1', START + datetime.timedelta(days=1), page_size=4,
+                                          message_type='critical')),
+                         [r for r in expected if r.time >= START + datetime.timedelta(days=1) and
+                          r.message_type == 'critical'])
+
+    def test_not_built(self):
+        VSyslogDay.objects.all().delete()
+        VSyslogHour.objects.all().delete()              # as on a database loaded before the rollups
+        for start_time, end_time in ((None, None), (START, START + datetime.timedelta(days=2))):
+            self.assertEqual(syslog_counts(None, None, start_time, end_time, ('node__host_name',)),
+                             raw_counts(start_time, end_time, ('node__host_name',)))
+
+    def test_command(self):
+        VSyslogDay.objects.all().delete()
+        out = StringIO.StringIO()
+        call_command('syslog_rollup', stdout=out)
+        self.assertIn('Syslog daily counts:', out.getvalue())
+        self.assertEqual(syslog_counts(), raw_counts())
+
+
+class HistogramTest(TestCase):
+    def setUp(self):
+        set_named_cache('syslog_histogram', None)
+        company = VCompany.objects.create(company_name='BMC_1')
+        self.nodes = [VNode.objects.create(company=company, host_name='host{}'.format(n)) for n in range(2)]
+        rnd = random.Random(1)
+        for n in range(200):
+            VSyslog.objects.create(node=rnd.choice(self.nodes),
+                                   time=START + datetime.timedelta(minutes=rnd.randint(60, 2 * 24 * 60)),
+                                   message_type=rnd.choice(['critical', 'info']))
+        VSyslog.objects.create(node=self.nodes[0], time=None, message_type='info')
+
+    @staticmethod
+    def expected(width, start, end, key, **filters):
+        counts = {}
+        for record in syslog_query(None, None, start, end).filter(time__isnull=False, **filters):
+            label = START + width * int((record.time - START).total_seconds() // width.total_seconds())
+            counts.setdefault(key(record), {}).setdefault(label.isoformat(), 0)
+            counts[key(record)][label.isoformat()] += 1
+        return counts
+
+    def test_totals(self):
+        hour = datetime.timedelta(hours=1)
+        end = START + datetime.timedelta(days=1, minutes=30)
+        histogram = syslog_histogram(None, None, START, end, bucket='hour')
+        self.assertEqual([label for label, count in histogram],
+                         [(START + n * hour).isoformat() for n in range(25)])
+        expected = self.expected(hour, START, end, lambda record: None).get(None, {})
+        self.assertEqual(dict((label, count) for label, count in histogram if count), expected)
+        self.assertEqual(histogram[0], [START.isoformat(), 0])
+        self.assertEqual(syslog_histogram(None, None, START, end, bucket=3600, fill=False),
+                         sorted([label, count] for label, count in expected.items()))
+
+    def test_groups(self):
+        width = datetime.timedelta(minutes=15)
+        histogram = syslog_histogram('BMC_1', None, bucket=width, group_by=('node__host_name', 'message_type'),
+                                     message_type='critical')
+        expected = self.expected(width, None, None, lambda r: '{} {}'.format(r.node.host_name, r.message_type),
+                                 message_type='critical')
+        self.assertEqual([series['name'] for series in histogram], sorted(expected))
+        lengths = set(len(series['data']) for series in histogram)
+        self.assertEqual(len(lengths), 1)
+        for series in histogram:
+            self.assertEqual(dict((label, count) for label, count in series['data'] if count),
+                             expected[series['name']])
+        VCompany.objects.create(company_name='BMC_2')
+        self.assertEqual(syslog_histogram('BMC_2', None, bucket='day', group_by=('message_type',)), [])
+        self.assertEqual(syslog_histogram('BMC_2', None, bucket='day'), [])
+
+    def test_cache(self):
+        end = START + datetime.timedelta(days=3)
+        histogram = syslog_histogram(None, self.nodes[0], START, end, bucket='day')
+        VSyslog.objects.create(node=self.nodes[0], time=START, message_type='info')
+        with self.assertNumQueries(0):
+            self.assertEqual(syslog_histogram(None, self.nodes[0], START, end, bucket='day'), histogram)
+        with self.settings(SYSLOG_HISTOGRAM_CACHE_TIMEOUT=0):
+            self.assertEqual(syslog_histogram(None, self.nodes[0], START, end, bucket='day')[0][1],
+                             histogram[0][1] + 1)
+
+    def test_fill_without_numpy(self):
+        args = [0, 1, 0], [2, 0, 2], [3, 4, 5], 2, 4
+        numpy, models.numpy = models.numpy, None
+        try:
+            self.assertEqual(models._syslog_histogram_fill(*args), [[0, 0, 8, 0], [4, 0, 0, 0]])
+        finally:
+            models.numpy = numpy
+        self.assertEqual(models._syslog_histogram_fill(*args), [[0, 0, 8, 0], [4, 0, 0, 0]])
+
+
+class LookupTest(TestCase):
+    def setUp(self):
+        self.companies = [VCompany.objects.create(company_name=name) for name in ('BMC_2', 'BMC_1')]
+        self.nodes = [VNode.objects.create(company=self.companies[n % 2], host_name='host{}'.format(n // 2))
+                      for n in range(4)]
+
+    def test_lists(self):
+        self.assertEqual(syslog_companies(), ['BMC_2', 'BMC_1'])
+        with self.assertNumQueries(0):
+            self.assertEqual(syslog_hosts('BMC_1'), ['host0', 'host1'])
+            self.assertEqual(syslog_hosts('nobody'), [])
+        VNode.objects.create(company=self.companies[1], host_name='host2')
+        self.assertEqual(syslog_hosts('BMC_1'), ['host0', 'host1', 'host2'])
+
+    def test_query(self):
+        syslog_lookup.company_id('BMC_1')
+        with self.assertNumQueries(1):
+            syslog_query('BMC_1', 'host1').count()
+        with self.assertNumQueries(1):
+            syslog_query('BMC_1').count()
+        self.assertEqual(str(syslog_query('BMC_1', 'host1').query),
+                         str(VSyslog.objects.filter(node=self.nodes[3]).query))
+        self.assertRaises(VCompany.DoesNotExist, syslog_query, 'nobody')
+        self.assertRaises(VNode.DoesNotExist, syslog_query, 'BMC_1', 'host9')
+        VNode.objects.create(company=self.companies[1], host_name='host1')
+        self.assertRaises(VNode.MultipleObjectsReturned, syslog_query, 'BMC_1', 'host1')
+
+    def test_version(self):
+        other = SyslogLookup()                  # another process's lookup, sharing the version
+        self.assertEqual(other.company_id('BMC_1'), self.companies[1].pk)
+        with self.assertNumQueries(0):
+            other.company_id('BMC_1')
+        self.companies[1].company_name = 'BMC_3'
+        self.companies[1].save()
+        with self.assertNumQueries(1):                  # only the companies are reloaded
+            self.assertEqual(other.company_names(), ['BMC_2', 'BMC_3'])
+        VNode.objects.create(company=self.companies[1], host_name='host2')
+        with self.assertNumQueries(1):
+            self.assertEqual(other.host_names('BMC_3'), ['host0', 'host1', 'host2'])
+
+    def test_timeout(self):
+        other = SyslogLookup()
+        self.assertEqual(other.company_names(), ['BMC_2', 'BMC_1'])
+        VCompany.objects.filter(pk=self.companies[1].pk).update(company_name='BMC_3')     # no signal
+        self.assertEqual(other.company_names(), ['BMC_2', 'BMC_1'])
+        with self.settings(SYSLOG_LOOKUP_TIMEOUT=0):
+            time.sleep(0.01)
+            self.assertEqual(other.company_names(), ['BMC_2', 'BMC_3'])
+
+
+class IngestTest(TestCase):
+    lines = ['<187>May  1 00:10:00 10.1.2.3 sessctrl 8855 critical: session table full\n',
+             '2014-05-01T02:10:00+02:00 host1 cli 30051 trace\n',
+             '<14>May  2 03:00:00 HOST1 nothing to see\n',
+             'not a syslog line\n',
+             '2014-05-03T00:00:00Z unknown kernel panic error: oops\n']
+
+    def setUp(self):
+        company = VCompany.objects.create(company_name='BMC_1')
+        self.node = VNode.objects.create(company=company, host_name='host1', node_ip='10.1.2.3')
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'syslog.log')
+        with open(self.path, 'wb') as f:
+            f.write(''.join(self.lines * 50).encode('utf8'))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_parse_line(self):
+        self.assertEqual(parse_line(self.lines[0], 2014),
+                         ('10.1.2.3', datetime.datetime(2014, 5, 1, 0, 10, tzinfo=timezone.utc), 'sessctrl 8855',
+                          'critical', 'session table full', self.lines[0].rstrip()))
+        self.assertEqual(parse_line(self.lines[1], 2014)[1:5],
+                         (START + datetime.timedelta(minutes=10), 'cli 30051', 'trace', ''))
+        self.assertEqual(parse_line(self.lines[2], 2014)[2:5], ('nothing to see', 'info', ''))
+        self.assertIsNone(parse_line(self.lines[3], 2014))
 
-# Create your tests here.
+    def test_ingest(self):
+        for processes in (1, 2):
+            stats = ingest_syslog([self.path], year=2014, processes=processes, chunk_size=7, batch_size=5)
+            self.assertEqual((stats['lines'], stats['records'], stats['skipped'], stats['unresolved']),
+                             (250, 200, 50, 50))
+        self.assertEqual(VSyslog.objects.filter(node=self.node).count(), 300)
+        self.assertEqual(syslog_counts(group_by=('node', 'message_type')),
+                         [(None, 'error', 100), (self.node.pk, 'critical', 100), (self.node.pk, 'info', 100),
+                          (self.node.pk, 'trace', 100)])